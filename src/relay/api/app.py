@@ -21,11 +21,13 @@ from .exchange.resources import (
 from .messaging.resources import PostMessage
 from .pushservice.resources import AddClientToken, DeleteClientToken
 from .resources import (
+    AlternativePaths,
     Balance,
     Block,
     CloseTrustline,
     ContactList,
     DeployIdentity,
+    EthindexQueryPlans,
     EventsNetwork,
     Factories,
     GraphDump,
@@ -35,10 +37,14 @@ from .resources import (
     MetaTransactionFees,
     Network,
     NetworkList,
+    NetworkMetrics,
+    NetworkStatistics,
     Path,
+    PathBatch,
     Relay,
     RelayMetaTransaction,
     RequestEther,
+    SplitPath,
     TransactionInfos,
     Trustline,
     TrustlineList,
@@ -46,6 +52,7 @@ from .resources import (
     UserEvents,
     UserEventsNetwork,
     UserList,
+    UserNetworks,
     Version,
 )
 from .streams.app import MessagingWebSocketRPCHandler, WebSocketRPCHandler
@@ -105,12 +112,20 @@ def ApiApp(trustlines):
         "/networks/<address:network_address>/users/<address:user_address>/events",
     )
     add_resource(Path, "/networks/<address:network_address>/path-info")
+    add_resource(PathBatch, "/networks/<address:network_address>/path-info-batch")
+    add_resource(SplitPath, "/networks/<address:network_address>/split-path-info")
+    add_resource(
+        AlternativePaths, "/networks/<address:network_address>/alternative-paths-info",
+    )
+    add_resource(NetworkMetrics, "/networks/<address:network_address>/metrics")
+    add_resource(NetworkStatistics, "/networks/<address:network_address>/statistics")
     add_resource(
         CloseTrustline, "/networks/<address:network_address>/close-trustline-path-info"
     )
     add_resource(UserEvents, "/users/<address:user_address>/events")
     add_resource(TransactionInfos, "/users/<address:user_address>/txinfos")
     add_resource(Balance, "/users/<address:user_address>/balance")
+    add_resource(UserNetworks, "/users/<address:user_address>/networks")
 
     add_resource(Block, "/blocknumber")
     add_resource(Relay, "/relay")
@@ -125,6 +140,12 @@ def ApiApp(trustlines):
     if trustlines.enable_deploy_identity:
         add_resource(DeployIdentity, "/identities")
 
+    if trustlines.enable_admin_endpoints and trustlines.use_eth_index:
+        add_resource(
+            EthindexQueryPlans,
+            "/networks/<address:network_address>/ethindex-query-plans",
+        )
+
     add_resource(IdentityInfos, "/identities/<address:identity_address>")
     add_resource(Factories, "/factories")
     add_resource(OrderBook, "/exchange/orderbook")
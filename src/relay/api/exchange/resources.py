@@ -9,7 +9,13 @@ from webargs.flaskparser import abort, use_args
 
 from relay.api import fields
 from relay.api.exchange.schemas import OrderSchema
-from relay.api.resources import dump_result_with_schema
+from relay.api.resources import (
+    dump_result_with_schema,
+    events_page_args,
+    get_events_page,
+    get_stream_page_size,
+    stream_events,
+)
 from relay.blockchain.exchange_proxy import ExchangeProxy
 from relay.concurrency_utils import TimeoutException
 from relay.exchange.order import Order
@@ -200,17 +206,26 @@ class UserEventsExchange(Resource):
             validate=validate.OneOf(ExchangeProxy.event_types),
             missing=None,
         ),
+        **events_page_args,
     }
 
     @use_args(args)
-    @dump_result_with_schema(UserExchangeEventSchema(many=True))
     def get(self, args, exchange_address: str, user_address: str):
         abort_if_unknown_exchange(self.trustlines, exchange_address)
         from_block = args["fromBlock"]
         type = args["type"]
         try:
-            return self.trustlines.get_user_exchange_events(
-                exchange_address, user_address, type=type, from_block=from_block
+            return stream_events(
+                lambda page: self.trustlines.get_user_exchange_events(
+                    exchange_address,
+                    user_address,
+                    type=type,
+                    from_block=from_block,
+                    page=page,
+                ),
+                UserExchangeEventSchema(many=True),
+                get_events_page(args),
+                get_stream_page_size(self.trustlines),
             )
         except TimeoutException:
             logger.warning(
@@ -233,16 +248,21 @@ class UserEventsAllExchanges(Resource):
             validate=validate.OneOf(ExchangeProxy.event_types),
             missing=None,
         ),
+        **events_page_args,
     }
 
     @use_args(args)
-    @dump_result_with_schema(UserExchangeEventSchema(many=True))
     def get(self, args, user_address: str):
         from_block = args["fromBlock"]
         type = args["type"]
         try:
-            return self.trustlines.get_all_user_exchange_events(
-                user_address, type=type, from_block=from_block
+            return stream_events(
+                lambda page: self.trustlines.get_all_user_exchange_events(
+                    user_address, type=type, from_block=from_block, page=page
+                ),
+                UserExchangeEventSchema(many=True),
+                get_events_page(args),
+                get_stream_page_size(self.trustlines),
             )
         except TimeoutException:
             logger.warning(
@@ -266,17 +286,22 @@ class EventsExchange(Resource):
             validate=validate.OneOf(ExchangeProxy.event_types),
             missing=None,
         ),
+        **events_page_args,
     }
 
     @use_args(args)
-    @dump_result_with_schema(ExchangeEventSchema(many=True))
     def get(self, args, exchange_address: str):
         abort_if_unknown_exchange(self.trustlines, exchange_address)
         from_block = args["fromBlock"]
         type = args["type"]
         try:
-            return self.trustlines.get_exchange_events(
-                exchange_address, type=type, from_block=from_block
+            return stream_events(
+                lambda page: self.trustlines.get_exchange_events(
+                    exchange_address, type=type, from_block=from_block, page=page
+                ),
+                ExchangeEventSchema(many=True),
+                get_events_page(args),
+                get_stream_page_size(self.trustlines),
             )
         except TimeoutException:
             logger.warning(
@@ -3,6 +3,7 @@ from eth_utils import is_address, to_checksum_address
 from marshmallow import fields
 from webargs import ValidationError
 
+from relay.blockchain.events import decode_event_cursor
 from relay.network_graph.payment_path import FeePayer
 
 
@@ -94,3 +95,15 @@ class FeePayerField(fields.Field):
                 f"Could not parse attribute {attr}: {value} has to be one of "
                 f"{[fee_payer.value for fee_payer in FeePayer]}"
             )
+
+
+class EventCursor(fields.Field):
+    """cursor of an event, deserializes into the key of the event"""
+
+    def _deserialize(self, value, attr, data, **kwargs):
+        if not isinstance(value, str):
+            raise ValidationError(f"{attr} has to be a string")
+        try:
+            return decode_event_cursor(value)
+        except ValueError:
+            raise ValidationError(f"Could not parse attribute {attr}: Invalid cursor")
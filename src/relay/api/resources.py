@@ -1,9 +1,11 @@
+import json
 import logging
 import tempfile
 import time
+from typing import Optional
 
 import wrapt
-from flask import abort, make_response, request, send_file
+from flask import Response, abort, make_response, request, send_file
 from flask.views import MethodView
 from flask_restful import Resource
 from marshmallow import fields as marshmallow_fields, validate
@@ -20,9 +22,13 @@ from relay.blockchain.delegate import (
     InvalidMetaTransactionException,
     UnknownIdentityFactoryException,
 )
+from relay.blockchain.events import EventsPage
 from relay.blockchain.unw_eth_proxy import UnwEthProxy
 from relay.concurrency_utils import TimeoutException
+from relay.network_graph.alg import ExpansionBudgetExceededException, SearchStatistics
+from relay.network_graph.graph import TransferPathRequest
 from relay.network_graph.payment_path import FeePayer, PaymentPath
+from relay.pathfinding_pool import PathfindingWorkerError
 from relay.relay import TrustlinesRelay
 from relay.utils import get_version, sha3
 
@@ -34,16 +40,39 @@ from .schemas import (
     IdentityInfosSchema,
     MetaTransactionFeeSchema,
     MetaTransactionSchema,
+    NetworkMetricsSchema,
+    NetworkStatisticsSchema,
     PaymentPathSchema,
+    SearchStatisticsSchema,
+    SplitPaymentPathSchema,
     TrustlineSchema,
     TxInfosSchema,
     UserCurrencyNetworkEventSchema,
+    UserNetworkSummarySchema,
 )
 
 logger = logging.getLogger("api.resources")
 
 
 TIMEOUT_MESSAGE = "The server could not handle the request in time"
+EXPANSION_BUDGET_MESSAGE = (
+    "The path search needs too much work, try to restrict it with maxHops or maxFees"
+)
+WORKER_STOPPED_MESSAGE = "The path search failed unexpectedly, please try again"
+STREAM_ERROR_MESSAGE = (
+    "The server could not get all events, get the rest after the last event"
+)
+MAX_PATH_BATCH_SIZE = 100
+MAX_SPLIT_PATHS = 10
+MAX_ALTERNATIVE_PATHS = 10
+# the maximum number of events to get at once when streaming events
+STREAM_PAGE_SIZE = 1000
+
+events_page_args = {
+    "toBlock": fields.Int(required=False, missing=None),
+    "limit": fields.Int(required=False, validate=validate.Range(min=1), missing=None),
+    "after": custom_fields.EventCursor(required=False, missing=None),
+}
 
 
 def abort_if_unknown_network(trustlines, network_address):
@@ -72,6 +101,72 @@ def dump_result_with_schema(schema):
     return dump_result
 
 
+def get_events_page(args) -> EventsPage:
+    return EventsPage(
+        after=args["after"], to_block=args["toBlock"], limit=args["limit"]
+    )
+
+
+def get_stream_page_size(trustlines: TrustlinesRelay) -> Optional[int]:
+    # without the ethindex all events are got at once anyway
+    if trustlines.use_eth_index:
+        return STREAM_PAGE_SIZE
+    return None
+
+
+def stream_events(get_events, schema, page: EventsPage, page_size: Optional[int]):
+    """returns a response with the events of page dumped with schema as json list
+
+    The events are got with get_events(page) in pages of at most page_size
+    events, each one after the last event of the previous page, and sent
+    before getting the next page, so that not all events are in memory at once.
+    The first page is got right away so that errors like timeouts can still be
+    reported with the status of the response. Errors getting a later page are
+    reported with an error object ending the list."""
+
+    def get_next_events(after, num_left):
+        limit = num_left
+        if page_size is not None and (limit is None or limit > page_size):
+            limit = page_size
+        next_page = page._replace(after=after, limit=limit)
+        return next_page, get_events(next_page)
+
+    def generate(current_page, events):
+        num_left = page.limit
+        after = page.after
+        separator = ""
+        yield "["
+        try:
+            while True:
+                for event in schema.dump(events):
+                    yield separator + json.dumps(event)
+                    separator = ","
+                if num_left is not None:
+                    num_left -= len(events)
+                if (
+                    current_page.limit is None
+                    or len(events) < current_page.limit
+                    or num_left == 0
+                    or events[-1].key is None
+                ):
+                    break
+                after = events[-1].key
+                current_page, events = get_next_events(after, num_left)
+        except TimeoutException:
+            logger.warning(
+                "Stream events: after=%s. could not get events in time", after
+            )
+            yield separator + json.dumps({"error": TIMEOUT_MESSAGE, "status": 504})
+        except Exception:
+            logger.exception("Stream events: after=%s. could not get events", after)
+            yield separator + json.dumps({"error": STREAM_ERROR_MESSAGE, "status": 500})
+        yield "]"
+
+    return Response(
+        generate(*get_next_events(page.after, page.limit)), mimetype="application/json"
+    )
+
+
 class Version(Resource):
     def get(self):
         return f"relay/v{get_version()}"
@@ -118,6 +213,23 @@ class User(Resource):
         )
 
 
+class UserNetworks(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    @dump_result_with_schema(UserNetworkSummarySchema(many=True))
+    def get(self, user_address: str):
+        timestamp = int(time.time())
+        summaries = []
+        for network_address in self.trustlines.get_networks_of_user(user_address):
+            summary = self.trustlines.currency_network_graphs[
+                network_address
+            ].get_account_sum(user_address, timestamp=timestamp)
+            summary.network_address = network_address
+            summaries.append(summary)
+        return summaries
+
+
 class ContactList(Resource):
     def __init__(self, trustlines: TrustlinesRelay) -> None:
         self.trustlines = trustlines
@@ -183,6 +295,40 @@ class TrustlineList(Resource):
         ]
 
 
+class NetworkMetrics(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    @dump_result_with_schema(NetworkMetricsSchema())
+    def get(self, network_address: str):
+        abort_if_unknown_network(self.trustlines, network_address)
+        return self.trustlines.currency_network_graphs[network_address]
+
+
+class NetworkStatistics(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    @dump_result_with_schema(NetworkStatisticsSchema())
+    def get(self, network_address: str):
+        abort_if_unknown_network(self.trustlines, network_address)
+        return self.trustlines.currency_network_graphs[network_address]
+
+
+class EthindexQueryPlans(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    args = {"user": custom_fields.Address(required=False, missing="0x" + "0" * 40)}
+
+    @use_args(args)
+    def get(self, args, network_address: str):
+        abort_if_unknown_network(self.trustlines, network_address)
+        return self.trustlines.get_ethindex_query_plans(
+            network_address, args["user"], page=EventsPage(limit=STREAM_PAGE_SIZE)
+        )
+
+
 class MaxCapacityPath(Resource):
     def __init__(self, trustlines: TrustlinesRelay) -> None:
         self.trustlines = trustlines
@@ -203,11 +349,29 @@ class MaxCapacityPath(Resource):
 
         timestamp = int(time.time())
 
-        capacity, path = self.trustlines.currency_network_graphs[
-            network_address
-        ].find_maximum_capacity_path(
-            source=source, target=target, max_hops=max_hops, timestamp=timestamp
-        )
+        try:
+            capacity, path = self.trustlines.currency_network_graphs[
+                network_address
+            ].find_maximum_capacity_path(
+                source=source,
+                target=target,
+                max_hops=max_hops,
+                timestamp=timestamp,
+                exact=True,
+                deadline=time.monotonic()
+                + self.trustlines.get_path_query_timeout(network_address),
+            )
+        except TimeoutException:
+            logger.warning(
+                "Max capacity path: from=%s to=%s. could not find path in time",
+                source,
+                target,
+            )
+            abort(504, TIMEOUT_MESSAGE)
+        except PathfindingWorkerError:
+            abort(503, WORKER_STOPPED_MESSAGE)
+        except ExpansionBudgetExceededException:
+            abort(422, EXPANSION_BUDGET_MESSAGE)
 
         return {"capacity": str(capacity), "path": path}
 
@@ -223,17 +387,26 @@ class UserEventsNetwork(Resource):
             validate=validate.OneOf(CurrencyNetworkProxy.event_types),
             missing=None,
         ),
+        **events_page_args,
     }
 
     @use_args(args)
-    @dump_result_with_schema(UserCurrencyNetworkEventSchema(many=True))
     def get(self, args, network_address: str, user_address: str):
         abort_if_unknown_network(self.trustlines, network_address)
         from_block = args["fromBlock"]
         type = args["type"]
         try:
-            return self.trustlines.get_user_network_events(
-                network_address, user_address, type=type, from_block=from_block
+            return stream_events(
+                lambda page: self.trustlines.get_user_network_events(
+                    network_address,
+                    user_address,
+                    type=type,
+                    from_block=from_block,
+                    page=page,
+                ),
+                UserCurrencyNetworkEventSchema(many=True),
+                get_events_page(args),
+                get_stream_page_size(self.trustlines),
             )
         except TimeoutException:
             logger.warning(
@@ -258,19 +431,25 @@ class UserEvents(Resource):
             ),
             missing=None,
         ),
+        **events_page_args,
     }
 
     @use_args(args)
-    @dump_result_with_schema(AnyEventSchema(many=True))
     def get(self, args, user_address: str):
         type = args["type"]
         from_block = args["fromBlock"]
         try:
-            return self.trustlines.get_user_events(
-                user_address,
-                type=type,
-                from_block=from_block,
-                timeout=self.trustlines.event_query_timeout,
+            return stream_events(
+                lambda page: self.trustlines.get_user_events(
+                    user_address,
+                    type=type,
+                    from_block=from_block,
+                    timeout=self.trustlines.event_query_timeout,
+                    page=page,
+                ),
+                AnyEventSchema(many=True),
+                get_events_page(args),
+                get_stream_page_size(self.trustlines),
             )
         except TimeoutException:
             logger.warning(
@@ -293,17 +472,22 @@ class EventsNetwork(Resource):
             validate=validate.OneOf(CurrencyNetworkProxy.event_types),
             missing=None,
         ),
+        **events_page_args,
     }
 
     @use_args(args)
-    @dump_result_with_schema(CurrencyNetworkEventSchema(many=True))
     def get(self, args, network_address: str):
         abort_if_unknown_network(self.trustlines, network_address)
         from_block = args["fromBlock"]
         type = args["type"]
         try:
-            return self.trustlines.get_network_events(
-                network_address, type=type, from_block=from_block
+            return stream_events(
+                lambda page: self.trustlines.get_network_events(
+                    network_address, type=type, from_block=from_block, page=page
+                ),
+                CurrencyNetworkEventSchema(many=True),
+                get_events_page(args),
+                get_stream_page_size(self.trustlines),
             )
         except TimeoutException:
             logger.warning(
@@ -481,8 +665,7 @@ class Path(Resource):
         "feePayer": custom_fields.FeePayerField(require=False, missing="sender"),
     }
 
-    @use_args(args)
-    @dump_result_with_schema(PaymentPathSchema())
+    @use_args(dict(args, debug=fields.Bool(required=False, missing=False)))
     def post(self, args, network_address: str):
         abort_if_unknown_or_frozen_network(self.trustlines, network_address)
         timestamp = int(time.time())
@@ -494,34 +677,216 @@ class Path(Resource):
         max_hops = args["maxHops"]
         fee_payer = FeePayer(args["feePayer"])
 
+        graph = self.trustlines.currency_network_graphs[network_address]
         if fee_payer == FeePayer.SENDER:
-            cost, path = self.trustlines.currency_network_graphs[
-                network_address
-            ].find_transfer_path_sender_pays_fees(
+            find_transfer_path = graph.find_transfer_path_sender_pays_fees
+        elif fee_payer == FeePayer.RECEIVER:
+            find_transfer_path = graph.find_transfer_path_receiver_pays_fees
+        else:
+            raise ValueError(
+                f"feePayer has to be one of {[fee_payer.name for fee_payer in FeePayer]}: {fee_payer}"
+            )
+
+        stats = SearchStatistics() if args["debug"] else None
+        try:
+            cost, path = find_transfer_path(
                 source=source,
                 target=target,
                 value=value,
                 max_fees=max_fees,
                 max_hops=max_hops,
                 timestamp=timestamp,
+                deadline=time.monotonic()
+                + self.trustlines.get_path_query_timeout(network_address),
+                stats=stats,
             )
-        elif fee_payer == FeePayer.RECEIVER:
-            cost, path = self.trustlines.currency_network_graphs[
+        except TimeoutException:
+            logger.warning(
+                "Path: from=%s to=%s value=%s. could not find path in time",
+                source,
+                target,
+                value,
+            )
+            abort(504, TIMEOUT_MESSAGE)
+        except PathfindingWorkerError:
+            abort(503, WORKER_STOPPED_MESSAGE)
+        except ExpansionBudgetExceededException:
+            abort(422, EXPANSION_BUDGET_MESSAGE)
+
+        result = PaymentPathSchema().dump(
+            PaymentPath(cost, path, value, fee_payer=fee_payer)
+        )
+        if stats is not None:
+            result["debug"] = SearchStatisticsSchema().dump(stats)
+        return result
+
+
+class AlternativePaths(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    args = dict(
+        Path.args,
+        numPaths=fields.Int(
+            required=False,
+            missing=3,
+            validate=validate.Range(min=1, max=MAX_ALTERNATIVE_PATHS),
+        ),
+    )
+
+    @use_args(args)
+    @dump_result_with_schema(PaymentPathSchema(many=True))
+    def post(self, args, network_address: str):
+        abort_if_unknown_or_frozen_network(self.trustlines, network_address)
+        timestamp = int(time.time())
+
+        try:
+            return self.trustlines.currency_network_graphs[
                 network_address
-            ].find_transfer_path_receiver_pays_fees(
-                source=source,
-                target=target,
+            ].find_alternative_transfer_paths(
+                source=args["from"],
+                target=args["to"],
+                value=args["value"],
+                fee_payer=FeePayer(args["feePayer"]),
+                num_paths=args["numPaths"],
+                max_hops=args["maxHops"],
+                max_fees=args["maxFees"],
+                timestamp=timestamp,
+                deadline=time.monotonic()
+                + self.trustlines.get_path_query_timeout(network_address),
+            )
+        except TimeoutException:
+            logger.warning(
+                "Alternative paths: from=%s to=%s value=%s. could not find paths in time",
+                args["from"],
+                args["to"],
+                args["value"],
+            )
+            abort(504, TIMEOUT_MESSAGE)
+        except PathfindingWorkerError:
+            abort(503, WORKER_STOPPED_MESSAGE)
+        except ExpansionBudgetExceededException:
+            abort(422, EXPANSION_BUDGET_MESSAGE)
+
+
+class SplitPath(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    args = dict(
+        Path.args,
+        maxPaths=fields.Int(
+            required=False,
+            missing=5,
+            validate=validate.Range(min=1, max=MAX_SPLIT_PATHS),
+        ),
+    )
+
+    @use_args(args)
+    @dump_result_with_schema(SplitPaymentPathSchema())
+    def post(self, args, network_address: str):
+        abort_if_unknown_or_frozen_network(self.trustlines, network_address)
+        timestamp = int(time.time())
+        value = args["value"]
+        fee_payer = FeePayer(args["feePayer"])
+
+        try:
+            payment_paths = self.trustlines.currency_network_graphs[
+                network_address
+            ].find_split_transfer_paths(
+                source=args["from"],
+                target=args["to"],
                 value=value,
-                max_fees=max_fees,
-                max_hops=max_hops,
+                fee_payer=fee_payer,
+                max_paths=args["maxPaths"],
+                max_hops=args["maxHops"],
+                max_fees=args["maxFees"],
                 timestamp=timestamp,
+                deadline=time.monotonic()
+                + self.trustlines.get_path_query_timeout(network_address),
             )
-        else:
-            raise ValueError(
-                f"feePayer has to be one of {[fee_payer.name for fee_payer in FeePayer]}: {fee_payer}"
+        except TimeoutException:
+            logger.warning(
+                "Split path: from=%s to=%s value=%s. could not find paths in time",
+                args["from"],
+                args["to"],
+                value,
             )
+            abort(504, TIMEOUT_MESSAGE)
+        except PathfindingWorkerError:
+            abort(503, WORKER_STOPPED_MESSAGE)
+        except ExpansionBudgetExceededException:
+            abort(422, EXPANSION_BUDGET_MESSAGE)
+
+        return {
+            "fees": sum(payment_path.fee for payment_path in payment_paths),
+            "value": value,
+            "fee_payer": fee_payer,
+            "paths": payment_paths,
+        }
+
+
+class PathBatch(Resource):
+    def __init__(self, trustlines: TrustlinesRelay) -> None:
+        self.trustlines = trustlines
+
+    args = {
+        "paths": fields.List(
+            fields.Nested(Path.args),
+            required=True,
+            validate=validate.Length(min=1, max=MAX_PATH_BATCH_SIZE),
+        )
+    }
+
+    @use_args(args)
+    def post(self, args, network_address: str):
+        abort_if_unknown_or_frozen_network(self.trustlines, network_address)
+        timestamp = int(time.time())
 
-        return PaymentPath(cost, path, value, fee_payer=fee_payer)
+        path_requests = [
+            TransferPathRequest(
+                source=path_args["from"],
+                target=path_args["to"],
+                value=path_args["value"],
+                fee_payer=FeePayer(path_args["feePayer"]),
+                max_hops=path_args["maxHops"],
+                max_fees=path_args["maxFees"],
+            )
+            for path_args in args["paths"]
+        ]
+        try:
+            payment_paths = self.trustlines.currency_network_graphs[
+                network_address
+            ].find_transfer_paths(
+                path_requests,
+                timestamp=timestamp,
+                timeout_per_path=self.trustlines.get_path_query_timeout(
+                    network_address
+                ),
+            )
+        except TimeoutException:
+            # only raised by a pathfinding pool without an idle worker in time
+            abort(504, TIMEOUT_MESSAGE)
+        except PathfindingWorkerError:
+            abort(503, WORKER_STOPPED_MESSAGE)
+
+        schema = PaymentPathSchema()
+        result = []
+        for path_request, payment_path in zip(path_requests, payment_paths):
+            if isinstance(payment_path, TimeoutException):
+                logger.warning(
+                    "Path batch: from=%s to=%s value=%s. could not find path in time",
+                    path_request.source,
+                    path_request.target,
+                    path_request.value,
+                )
+                # same status as for a single path
+                result.append({"error": TIMEOUT_MESSAGE, "status": 504})
+            elif isinstance(payment_path, ExpansionBudgetExceededException):
+                result.append({"error": EXPANSION_BUDGET_MESSAGE, "status": 422})
+            else:
+                result.append(schema.dump(payment_path))
+        return result
 
 
 # CloseTrustline is similar to the above ReduceDebtPath, though it does not
@@ -552,13 +917,27 @@ class CloseTrustline(Resource):
         now = int(time.time())
         graph = self.trustlines.currency_network_graphs[network_address]
 
-        payment_path = graph.close_trustline_path_triangulation(
-            timestamp=now,
-            source=source,
-            target=target,
-            max_hops=max_hops,
-            max_fees=max_fees,
-        )
+        try:
+            payment_path = graph.close_trustline_path_triangulation(
+                timestamp=now,
+                source=source,
+                target=target,
+                max_hops=max_hops,
+                max_fees=max_fees,
+                deadline=time.monotonic()
+                + self.trustlines.get_path_query_timeout(network_address),
+            )
+        except TimeoutException:
+            logger.warning(
+                "Close trustline: from=%s to=%s. could not find path in time",
+                source,
+                target,
+            )
+            abort(504, TIMEOUT_MESSAGE)
+        except PathfindingWorkerError:
+            abort(503, WORKER_STOPPED_MESSAGE)
+        except ExpansionBudgetExceededException:
+            abort(422, EXPANSION_BUDGET_MESSAGE)
 
         return payment_path
 
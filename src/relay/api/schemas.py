@@ -70,6 +70,7 @@ class BlockchainEventSchema(EventSchema):
     type = fields.Str(default="event")
     transactionId = HexBytes(attribute="transaction_id")
     status = fields.Str()
+    cursor = fields.Str()
 
 
 class CurrencyNetworkEventSchema(BlockchainEventSchema):
@@ -156,6 +157,10 @@ class AggregatedAccountSummarySchema(Schema):
     frozenBalance = BigInteger(attribute="frozen_balance")
 
 
+class UserNetworkSummarySchema(AggregatedAccountSummarySchema):
+    networkAddress = Address(attribute="network_address")
+
+
 class TrustlineSchema(Schema):
     class Meta:
         strict = True
@@ -208,6 +213,52 @@ class CurrencyNetworkSchema(Schema):
     isFrozen = fields.Bool(attribute="is_frozen")
 
 
+class PathCacheStatsSchema(Schema):
+    class Meta:
+        strict = True
+
+    size = fields.Int()
+    maxSize = fields.Int(attribute="max_size")
+    hits = fields.Int()
+    misses = fields.Int()
+    evictions = fields.Int()
+    invalidations = fields.Int()
+
+
+class SearchStatisticsSchema(Schema):
+    class Meta:
+        strict = True
+
+    queries = fields.Int()
+    searches = fields.Int()
+    nodesPopped = fields.Int(attribute="nodes_popped")
+    edgesRelaxed = fields.Int(attribute="edges_relaxed")
+    rejectedEdges = fields.Dict(
+        keys=fields.Str(), values=fields.Int(), attribute="rejected_edges"
+    )
+    heapPeak = fields.Int(attribute="heap_peak")
+    wallTime = fields.Float(attribute="wall_time")
+
+
+class NetworkMetricsSchema(Schema):
+    class Meta:
+        strict = True
+
+    pathCache = fields.Nested(PathCacheStatsSchema, attribute="path_cache")
+    pathfinding = fields.Nested(SearchStatisticsSchema, attribute="search_statistics")
+    lastFullSyncDrift = fields.Int(attribute="last_full_sync_drift")
+
+
+class NetworkStatisticsSchema(Schema):
+    class Meta:
+        strict = True
+
+    numUsers = fields.Int(attribute="num_users")
+    numTrustlines = fields.Int(attribute="num_trustlines")
+    moneyCreated = BigInteger(attribute="money_created")
+    totalCreditlines = BigInteger(attribute="total_creditlines")
+
+
 class PaymentPathSchema(Schema):
     class Meta:
         strict = True
@@ -220,3 +271,13 @@ class PaymentPathSchema(Schema):
     path = fields.List(Address(), required=True)
     value = BigInteger()
     feePayer = FeePayerField(required=True, attribute="fee_payer")
+
+
+class SplitPaymentPathSchema(Schema):
+    class Meta:
+        strict = True
+
+    fees = BigInteger(required=True)
+    value = BigInteger()
+    feePayer = FeePayerField(required=True, attribute="fee_payer")
+    paths = fields.Nested(PaymentPathSchema, many=True)
@@ -4,7 +4,12 @@ from marshmallow import validate
 from webargs import fields
 from webargs.flaskparser import use_args
 
-from relay.api.resources import dump_result_with_schema
+from relay.api.resources import (
+    events_page_args,
+    get_events_page,
+    get_stream_page_size,
+    stream_events,
+)
 from relay.api.schemas import TokenEventSchema, UserTokenEventSchema
 from relay.blockchain.token_proxy import TokenProxy
 from relay.blockchain.unw_eth_proxy import UnwEthProxy
@@ -54,17 +59,22 @@ class UserEventsToken(Resource):
             validate=validate.OneOf(UnwEthProxy.event_types + TokenProxy.event_types),
             missing=None,
         ),
+        **events_page_args,
     }
 
     @use_args(args)
-    @dump_result_with_schema(UserTokenEventSchema(many=True))
     def get(self, args, token_address: str, user_address: str):
         abort_if_unknown_token(self.trustlines, token_address)
         from_block = args["fromBlock"]
         type = args["type"]
 
-        return self.trustlines.get_user_token_events(
-            token_address, user_address, type=type, from_block=from_block
+        return stream_events(
+            lambda page: self.trustlines.get_user_token_events(
+                token_address, user_address, type=type, from_block=from_block, page=page
+            ),
+            UserTokenEventSchema(many=True),
+            get_events_page(args),
+            get_stream_page_size(self.trustlines),
         )
 
 
@@ -79,15 +89,20 @@ class EventsToken(Resource):
             validate=validate.OneOf(UnwEthProxy.event_types + TokenProxy.event_types),
             missing=None,
         ),
+        **events_page_args,
     }
 
     @use_args(args)
-    @dump_result_with_schema(TokenEventSchema(many=True))
     def get(self, args, token_address: str):
         abort_if_unknown_token(self.trustlines, token_address)
         from_block = args["fromBlock"]
         type = args["type"]
 
-        return self.trustlines.get_token_events(
-            token_address, type=type, from_block=from_block
+        return stream_events(
+            lambda page: self.trustlines.get_token_events(
+                token_address, type=type, from_block=from_block, page=page
+            ),
+            TokenEventSchema(many=True),
+            get_events_page(args),
+            get_stream_page_size(self.trustlines),
         )
@@ -107,11 +107,22 @@ class CurrencyNetworkProxy(Proxy):
                     )
         return result
 
-    def start_listen_on_full_sync(self, function, sync_interval: float):
+    def start_listen_on_full_sync(
+        self, function, sync_interval: float, gen_graph_representation=None
+    ):
+        """calls function with the result of gen_graph_representation every
+        sync_interval seconds
+
+        gen_graph_representation can be given to get the trustlines from
+        somewhere else than the node, it defaults to self.gen_graph_representation
+        """
+        if gen_graph_representation is None:
+            gen_graph_representation = self.gen_graph_representation
+
         def sync():
             while True:
                 try:
-                    function(self.gen_graph_representation())
+                    function(gen_graph_representation())
                     gevent.sleep(sync_interval)
                 except socket.timeout as err:
                     logger.warning(
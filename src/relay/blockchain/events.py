@@ -1,9 +1,40 @@
-from typing import Optional
+import base64
+import math
+from typing import Iterable, List, NamedTuple, Optional, Tuple
 
 import hexbytes
 
 from ..events import Event
 
+# the position of an event in the chain: block number, transaction index and
+# log index
+EventKey = Tuple[int, int, int]
+
+
+class EventsPage(NamedTuple):
+    """selects the events after the event with the key after, up to and
+    including block to_block, and at most limit of them"""
+
+    after: Optional[EventKey] = None
+    to_block: Optional[int] = None
+    limit: Optional[int] = None
+
+
+def encode_event_cursor(key: EventKey) -> str:
+    return base64.urlsafe_b64encode("{}.{}.{}".format(*key).encode()).decode()
+
+
+def decode_event_cursor(cursor: str) -> EventKey:
+    """raises a ValueError if cursor is not a cursor of an event"""
+    try:
+        parts = base64.urlsafe_b64decode(cursor.encode()).decode().split(".")
+    except (ValueError, UnicodeError) as e:
+        raise ValueError("Invalid cursor") from e
+    if len(parts) != 3:
+        raise ValueError("Invalid cursor")
+    block_number, transaction_index, log_index = (int(part) for part in parts)
+    return block_number, transaction_index, log_index
+
 
 class BlockchainEvent(Event):
     def __init__(self, web3_event, current_blocknumber: int, timestamp: int) -> None:
@@ -31,6 +62,52 @@ class BlockchainEvent(Event):
         else:
             return "confirmed"
 
+    @property
+    def key(self) -> Optional[EventKey]:
+        """the position of the event in the chain, None if not yet mined"""
+        if self.blocknumber is None:
+            return None
+        return (
+            self.blocknumber,
+            self._web3_event.get("transactionIndex"),
+            self._web3_event.get("logIndex"),
+        )
+
+    @property
+    def cursor(self) -> Optional[str]:
+        """opaque cursor to get the events after this one"""
+        key = self.key
+        if key is None:
+            return None
+        return encode_event_cursor(key)
+
+
+def paginate_events(
+    events: Iterable[BlockchainEvent], page: EventsPage
+) -> List[BlockchainEvent]:
+    """select the events of page from events like the ethindex does. Events not
+    yet mined come last and only without an after cursor or to_block"""
+
+    def key(event):
+        if event.key is None:
+            return (math.inf, 0, 0)
+        return event.key
+
+    selected = []
+    for event in sorted(events, key=key):
+        if event.key is None:
+            if page.after is not None or page.to_block is not None:
+                continue
+        else:
+            if page.after is not None and event.key <= page.after:
+                continue
+            if page.to_block is not None and event.blocknumber > page.to_block:
+                continue
+        selected.append(event)
+    if page.limit is not None:
+        selected = selected[: page.limit]
+    return selected
+
 
 class TLNetworkEvent(BlockchainEvent):
     def __init__(
@@ -4,6 +4,7 @@ import logging
 import math
 import socket
 import time
+import weakref
 from typing import Any, Callable, Dict, List, Mapping
 
 import gevent
@@ -20,6 +21,22 @@ updateBlock = "pending"
 
 reconnect_interval = 3  # 3s
 
+# the current block number is only used for the status of events, which only
+# changes every few blocks. It is cached for that many seconds.
+current_blocknumber_ttl = 1
+
+# cache of the current block number of every web3 instance, shared by all
+# proxies using it
+_current_blocknumber_caches: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+
+
+def get_current_blocknumber(web3) -> int:
+    cache = _current_blocknumber_caches.get(web3)
+    if cache is None:
+        cache = concurrency_utils.CachedValue(current_blocknumber_ttl)
+        _current_blocknumber_caches[web3] = cache
+    return cache.get(lambda: web3.eth.blockNumber)
+
 
 def get_new_entries(filter, callback):
     new_entries = filter.get_new_entries()
@@ -115,7 +132,7 @@ class Proxy(object):
         return sorted_events(list(itertools.chain.from_iterable(results)))
 
     def _build_events(self, events: List[Any]):
-        current_blocknumber = self._web3.eth.blockNumber
+        current_blocknumber = get_current_blocknumber(self._web3)
         return [self._build_event(event, current_blocknumber) for event in events]
 
     def _build_event(
@@ -1,4 +1,5 @@
-from typing import Any, Callable, Iterable, List
+import time
+from typing import Any, Callable, Iterable, List, Optional
 
 import gevent
 import gevent.lock
@@ -51,3 +52,37 @@ def synchronized(wrapped, instance, args, kwargs):
 
     with lock:
         return wrapped(*args, **kwargs)
+
+
+class CachedValue:
+    """a value that is fetched again once it is older than ttl seconds
+
+    Greenlets asking for the value while it is being fetched wait for that
+    fetch instead of fetching it themselves.
+    """
+
+    def __init__(self, ttl: float) -> None:
+        self.ttl = ttl
+        self._value: Any = None
+        self._fetched_at: Optional[float] = None
+        self._lock = gevent.lock.Semaphore()
+
+    def _is_fresh(self) -> bool:
+        return (
+            self._fetched_at is not None
+            and time.monotonic() - self._fetched_at < self.ttl
+        )
+
+    def get(self, fetch: Callable[[], Any]) -> Any:
+        """return the cached value, or the value returned by fetch if the
+        cached one is too old"""
+        if self._is_fresh():
+            return self._value
+        with self._lock:
+            if not self._is_fresh():
+                self._value = fetch()
+                self._fetched_at = time.monotonic()
+            return self._value
+
+    def invalidate(self) -> None:
+        self._fetched_at = None
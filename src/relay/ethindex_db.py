@@ -1,12 +1,16 @@
 """provide access to the ethindex database"""
 
 import collections
-import itertools
+import contextlib
 import logging
-from typing import Any, Dict, List
+import time
+from typing import Any, Callable, Dict, Iterable, List, Tuple
 
+import gevent.lock
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
+import psycopg2.pool
 
 from relay.blockchain import (
     currency_network_events,
@@ -14,8 +18,10 @@ from relay.blockchain import (
     token_events,
     unw_eth_events,
 )
-from relay.blockchain.events import BlockchainEvent, TLNetworkEvent
-from relay.blockchain.proxy import sorted_events
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.blockchain.events import BlockchainEvent, EventsPage, TLNetworkEvent
+from relay.blockchain.proxy import current_blocknumber_ttl
+from relay.concurrency_utils import CachedValue
 
 # proxy.get_all_events just asks for these network events. so we need the list
 # here.
@@ -28,6 +34,118 @@ def connect(dsn):
     return psycopg2.connect(dsn, cursor_factory=psycopg2.extras.RealDictCursor)
 
 
+class ConnectionPool:
+    """gevent aware pool of connections to the ethindex database
+
+    At most max_size connections are open at the same time, greenlets asking
+    for more wait until one is given back or raise a psycopg2.pool.PoolError
+    after timeout seconds. Connections that have not been used for
+    idle_timeout seconds are closed. Connections that have not been used for
+    health_check_interval seconds are checked before they are handed out, so
+    that connections closed by the database are replaced.
+    """
+
+    def __init__(
+        self,
+        dsn: str = "",
+        max_size: int = 10,
+        idle_timeout: float = 300,
+        health_check_interval: float = 30,
+        timeout: float = None,
+        connect=connect,
+    ) -> None:
+        self.dsn = dsn
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.timeout = timeout
+        self._connect = connect
+        self._semaphore = gevent.lock.BoundedSemaphore(max_size)
+        # (connection, time it was given back), the most recently used last
+        self._idle: List = []
+
+    @property
+    def num_idle(self) -> int:
+        return len(self._idle)
+
+    @contextlib.contextmanager
+    def connection(self):
+        """context manager handing out a connection of the pool"""
+        if not self._semaphore.acquire(timeout=self.timeout):
+            raise psycopg2.pool.PoolError(
+                "No connection to the ethindex database available"
+            )
+        try:
+            conn = self._get_connection()
+        except BaseException:
+            self._semaphore.release()
+            raise
+        try:
+            yield conn
+        finally:
+            self._put_connection(conn)
+            self._semaphore.release()
+
+    def _get_connection(self):
+        self._close_idle_connections()
+        while self._idle:
+            conn, released_at = self._idle.pop()
+            if time.monotonic() - released_at < self.health_check_interval:
+                return conn
+            if self._is_healthy(conn):
+                return conn
+            logger.info("Replacing broken connection to the ethindex database")
+            self._close(conn)
+        return self._connect(self.dsn)
+
+    def _put_connection(self, conn) -> None:
+        if not conn.closed:
+            try:
+                # end transactions left open, e.g. by an error
+                if (
+                    conn.get_transaction_status()
+                    != psycopg2.extensions.TRANSACTION_STATUS_IDLE
+                ):
+                    conn.rollback()
+            except psycopg2.Error:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+        self._close_idle_connections()
+
+    def _close_idle_connections(self) -> None:
+        deadline = time.monotonic() - self.idle_timeout
+        # the connections used least recently come first
+        while self._idle and self._idle[0][1] < deadline:
+            conn, _ = self._idle.pop(0)
+            self._close(conn)
+
+    @staticmethod
+    def _is_healthy(conn) -> bool:
+        if conn.closed:
+            return False
+        try:
+            with conn.cursor() as cur:
+                cur.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    @staticmethod
+    def _close(conn) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+
+    def close(self) -> None:
+        """close all idle connections"""
+        while self._idle:
+            conn, _ = self._idle.pop()
+            self._close(conn)
+
+
 # EventsQuery is used to store a where block together with required parameters
 # EthindexDB._run_events_query uses this to build and run a complete query.
 EventsQuery = collections.namedtuple("EventsQuery", ["where_block", "params"])
@@ -48,13 +166,13 @@ class EventBuilder:
     def build_events(
         self, events: List[Any], current_blocknumber: int
     ) -> List[BlockchainEvent]:
-        return [self._build_event(event, current_blocknumber) for event in events]
+        return [self.build_event(event, current_blocknumber) for event in events]
 
     @property
     def event_types(self) -> List[str]:
         return list(self.event_builders.keys())
 
-    def _build_event(self, event: Any, current_blocknumber: int) -> BlockchainEvent:
+    def build_event(self, event: Any, current_blocknumber: int) -> BlockchainEvent:
         event_type: str = event.get("event")
         timestamp: int = event.get("timestamp")
         return self.event_builders[event_type](event, current_blocknumber, timestamp)
@@ -79,6 +197,198 @@ order_by_default_sort_order = """ ORDER BY blocknumber, transactionIndex, logInd
     """
 
 
+# number of rows of events fetched from the database at once
+events_fetch_size = 1000
+
+# the current block number of the ethindex, shared by all EthindexDB instances
+_current_blocknumber_cache = CachedValue(current_blocknumber_ttl)
+
+
+def _get_current_blocknumber(conn):
+    with conn.cursor() as cur:
+        cur.execute("""select * from sync where syncid='default'""")
+        row = cur.fetchone()
+        if row:
+            return row["last_block_number"]
+        else:
+            raise RuntimeError("Could not determine current block number")
+
+
+def _events_query_string(
+    events_query: EventsQuery, page: EventsPage = None
+) -> Tuple[str, Tuple]:
+    """build the complete query on the events table restricted to page and
+    return it together with its params"""
+    where_block = events_query.where_block
+    params = list(events_query.params)
+    limit_block = ""
+    if page is not None:
+        if page.after is not None:
+            where_block = "({}) AND (blockNumber, transactionIndex, logIndex) > (%s, %s, %s)".format(
+                where_block
+            )
+            params.extend(page.after)
+        if page.to_block is not None:
+            where_block = "({}) AND blockNumber<=%s".format(where_block)
+            params.append(page.to_block)
+        if page.limit is not None:
+            limit_block = "LIMIT %s"
+            params.append(page.limit)
+    query_string = "{select_star_from_events} WHERE {where_block} {order_by_default_sort_order} {limit_block}".format(
+        select_star_from_events=select_star_from_events,
+        where_block=where_block,
+        order_by_default_sort_order=order_by_default_sort_order,
+        limit_block=limit_block,
+    )
+    return query_string, tuple(params)
+
+
+def _fetch_events(
+    conn_pool: ConnectionPool,
+    events_query: EventsQuery,
+    build_event: Callable[[Any, int], BlockchainEvent],
+    page: EventsPage = None,
+) -> List[BlockchainEvent]:
+    """run a query on the events table restricted to page and build the events
+    from the rows with build_event
+
+    The rows are read with a server side cursor in batches of
+    events_fetch_size rows, so that only one batch of rows is in memory.
+    """
+    query_string, params = _events_query_string(events_query, page)
+    with conn_pool.connection() as conn:
+        with conn:
+            # use the same connection, so that a greenlet never waits for
+            # a second one while holding the first
+            current_blocknumber = _current_blocknumber_cache.get(
+                lambda: _get_current_blocknumber(conn)
+            )
+            with conn.cursor(name="events") as cur:
+                cur.itersize = events_fetch_size
+                cur.execute(query_string, params)
+                return [build_event(row, current_blocknumber) for row in cur]
+
+
+def explain_events_query(
+    conn_pool: ConnectionPool, events_query: EventsQuery, page: EventsPage = None
+) -> Any:
+    """return the plan postgres chooses for a query on the events table as
+    given by EXPLAIN (FORMAT JSON), without running the query"""
+    query_string, params = _events_query_string(events_query, page)
+    with conn_pool.connection() as conn:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute("EXPLAIN (FORMAT JSON) " + query_string, params)
+                return cur.fetchone()["QUERY PLAN"]
+
+
+def _set_user(events: List[BlockchainEvent], user_address: str) -> None:
+    for event in events:
+        if isinstance(event, TLNetworkEvent):
+            event.user = user_address
+        else:
+            raise ValueError("Expected a TLNetworkEvent")
+
+
+def select_user_event_types(
+    selectors: Iterable[Tuple["EthindexDB", Iterable[str]]], type: str = None
+) -> List[Tuple["EthindexDB", List[str]]]:
+    """select the event types to get from contracts with
+    get_user_events_of_contracts
+
+    selectors contains pairs of an EthindexDB and the event types that can be
+    selected by type from its contract. Without a type, the standard event
+    types of all contracts are selected, otherwise only the given type from
+    the contracts it can be selected from.
+    """
+    if type is None:
+        return [
+            (ethindex, list(ethindex.standard_event_types)) for ethindex, _ in selectors
+        ]
+    return [
+        (ethindex, [type])
+        for ethindex, selectable_types in selectors
+        if type in selectable_types
+    ]
+
+
+def user_events_of_contracts_query(
+    selections: Iterable[Tuple["EthindexDB", Iterable[str]]],
+    user_address: str,
+    from_block: int = 0,
+) -> EventsQuery:
+    """build the query used by get_user_events_of_contracts"""
+    where_blocks = []
+    params: List[Any] = [from_block]
+    for ethindex, event_types in selections:
+        events_query = ethindex._user_events_query(
+            event_types, user_address, ethindex._get_addr(None)
+        )
+        where_blocks.append("({})".format(events_query.where_block))
+        params.extend(events_query.params)
+    return EventsQuery(
+        "blockNumber>=%s AND ({})".format(" OR ".join(where_blocks)), tuple(params),
+    )
+
+
+def get_user_events_of_contracts(
+    selections: Iterable[Tuple["EthindexDB", Iterable[str]]],
+    user_address: str,
+    from_block: int = 0,
+    page: EventsPage = None,
+) -> List[BlockchainEvent]:
+    """get the events of a user in many contracts with a single query
+
+    selections contains pairs of an EthindexDB with the address of the
+    contract as default address and the event types to get from the contract.
+    The EthindexDBs need to share their ConnectionPool. Returns the events
+    sorted like sorted_events.
+    """
+    selections = list(selections)
+    if not selections:
+        return []
+    ethindex_of_address: Dict[str, EthindexDB] = {
+        ethindex._get_addr(None): ethindex for ethindex, _ in selections
+    }
+
+    def build_event(row, current_blocknumber):
+        return ethindex_of_address[row["address"]].event_builder.build_event(
+            row, current_blocknumber
+        )
+
+    conn_pool = next(iter(ethindex_of_address.values())).conn_pool
+    events = _fetch_events(
+        conn_pool,
+        user_events_of_contracts_query(selections, user_address, from_block),
+        build_event,
+        page,
+    )
+    _set_user(events, user_address)
+    logger.debug(
+        "get_user_events_of_contracts(%s contracts, %s, %s) -> %s rows",
+        len(ethindex_of_address),
+        user_address,
+        from_block,
+        len(events),
+    )
+    return events
+
+
+# selects the latest event of the given type for every pair of users. The pair
+# is built with LEAST/GREATEST, so that it does not matter in which direction
+# the event was emitted.
+select_latest_event_per_pair = """SELECT DISTINCT ON (
+                  LEAST(args->>'{_from}', args->>'{_to}'),
+                  GREATEST(args->>'{_from}', args->>'{_to}'))
+              args, timestamp
+       FROM events
+       WHERE address=%s AND eventName=%s
+       ORDER BY LEAST(args->>'{_from}', args->>'{_to}'),
+                GREATEST(args->>'{_from}', args->>'{_to}'),
+                blockNumber DESC, transactionIndex DESC, logIndex DESC
+    """
+
+
 class EthindexDB:
     """EthIndexDB provides a partly compatible interface for the
        relay.blockchain.currency_network_proxy.CurrencyNetworkProxy,
@@ -90,12 +400,20 @@ class EthindexDB:
 
     Since the proxy classes operates on one network address only,
     we allow to pass a default address in.
+
+    The connections to the database are taken from the given ConnectionPool,
+    which is meant to be shared by all instances.
     """
 
     def __init__(
-        self, conn, standard_event_types, event_builders, from_to_types, address=None
+        self,
+        conn_pool: ConnectionPool,
+        standard_event_types,
+        event_builders,
+        from_to_types,
+        address=None,
     ):
-        self.conn = conn
+        self.conn_pool = conn_pool
         self.default_address = address
         self.standard_event_types = standard_event_types
         self.event_builder = EventBuilder(event_builders)
@@ -105,17 +423,10 @@ class EthindexDB:
     def event_types(self):
         return self.event_builder.event_types
 
-    def _build_events(self, rows):
-        return self.event_builder.build_events(rows, self._get_current_blocknumber())
-
-    def _get_current_blocknumber(self):
-        with self.conn.cursor() as cur:
-            cur.execute("""select * from sync where syncid='default'""")
-            row = cur.fetchone()
-            if row:
-                return row["last_block_number"]
-            else:
-                raise RuntimeError("Could not determine current block number")
+    def get_current_blocknumber(self):
+        with self.conn_pool.connection() as conn:
+            with conn:
+                return _get_current_blocknumber(conn)
 
     def _get_addr(self, address):
         """all the methods here take an address argument
@@ -132,19 +443,64 @@ class EthindexDB:
         assert r, "no standard event passed in and no default events given"
         return r
 
-    def _run_events_query(self, events_query: EventsQuery) -> List[BlockchainEvent]:
+    def _run_events_query(
+        self, events_query: EventsQuery, page: EventsPage = None
+    ) -> List[BlockchainEvent]:
         """run a query on the events table"""
-        query_string = "{select_star_from_events} WHERE {where_block} {order_by_default_sort_order}".format(
-            select_star_from_events=select_star_from_events,
-            where_block=events_query.where_block,
-            order_by_default_sort_order=order_by_default_sort_order,
+        return _fetch_events(
+            self.conn_pool, events_query, self.event_builder.build_event, page
         )
 
-        with self.conn as conn:
-            with conn.cursor() as cur:
-                cur.execute(query_string, events_query.params)
-                rows = cur.fetchall()
-                return self._build_events(rows)
+    def _user_events_query(
+        self, event_types: Iterable[str], user_address: str, contract_address: str
+    ) -> EventsQuery:
+        """build the where block selecting the events of the given types
+        involving user_address in one contract"""
+        event_conditions = []
+        params: List[Any] = [contract_address]
+        for event_type in event_types:
+            _from, _to = self.from_to_types[event_type]
+            event_conditions.append(
+                "(eventName=%s AND (args->>'{_from}'=%s OR args->>'{_to}'=%s))".format(
+                    _from=_from, _to=_to
+                )
+            )
+            params.extend([event_type, user_address, user_address])
+        return EventsQuery(
+            "address=%s AND ({})".format(" OR ".join(event_conditions)), tuple(params),
+        )
+
+    def user_contract_events_query(
+        self,
+        event_types: Iterable[str],
+        user_address: str,
+        from_block: int = 0,
+        contract_address: str = None,
+    ) -> EventsQuery:
+        """build the query for the events of the given types involving
+        user_address in one contract since from_block"""
+        user_events_query = self._user_events_query(
+            event_types, user_address, self._get_addr(contract_address)
+        )
+        return EventsQuery(
+            "blockNumber>=%s AND {}".format(user_events_query.where_block),
+            (from_block,) + user_events_query.params,
+        )
+
+    def contract_events_query(
+        self,
+        event_types: Iterable[str],
+        from_block: int = 0,
+        contract_address: str = None,
+    ) -> EventsQuery:
+        """build the query for all events of the given types in one contract
+        since from_block"""
+        return EventsQuery(
+            """blockNumber>=%s
+               AND address=%s
+               AND eventName in %s""",
+            (from_block, self._get_addr(contract_address), tuple(event_types)),
+        )
 
     def get_network_events(
         self,
@@ -152,11 +508,14 @@ class EthindexDB:
         user_address: str = None,
         from_block: int = 0,
         timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         """Function for compatibility with relay.blockchain.CurrencyNetworkProxy.
         Will be removed after a refactoring
         """
-        return self.get_user_events(event_name, user_address, from_block, timeout)
+        return self.get_user_events(
+            event_name, user_address, from_block, timeout, page=page
+        )
 
     def get_unw_eth_events(
         self,
@@ -164,9 +523,12 @@ class EthindexDB:
         user_address: str = None,
         from_block: int = 0,
         timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         """Function for compatibility with relay.blockchain.UnwEthProxy. Will be removed after a refactoring"""
-        return self.get_user_events(event_name, user_address, from_block, timeout)
+        return self.get_user_events(
+            event_name, user_address, from_block, timeout, page=page
+        )
 
     def get_token_events(
         self,
@@ -174,9 +536,12 @@ class EthindexDB:
         user_address: str = None,
         from_block: int = 0,
         timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         """Function for compatibility with relay.blockchain.TokenProxy. Will be removed after a refactoring"""
-        return self.get_user_events(event_name, user_address, from_block, timeout)
+        return self.get_user_events(
+            event_name, user_address, from_block, timeout, page=page
+        )
 
     def get_exchange_events(
         self,
@@ -184,9 +549,12 @@ class EthindexDB:
         user_address: str = None,
         from_block: int = 0,
         timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         """Function for compatibility with relay.blockchain.ExchangeProxy. Will be removed after a refactoring"""
-        return self.get_user_events(event_name, user_address, from_block, timeout)
+        return self.get_user_events(
+            event_name, user_address, from_block, timeout, page=page
+        )
 
     def get_user_events(
         self,
@@ -195,6 +563,7 @@ class EthindexDB:
         from_block: int = 0,
         timeout: float = None,
         contract_address: str = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         contract_address = self._get_addr(contract_address)
         if user_address is None:
@@ -203,20 +572,12 @@ class EthindexDB:
                 from_block=from_block,
                 timeout=timeout,
                 contract_address=contract_address,
+                page=page,
             )
-        query = EventsQuery(
-            """blockNumber>=%s
-               AND eventName=%s
-               AND address=%s
-               AND (args->>'{_from}'=%s or args->>'{_to}'=%s)
-            """.format(
-                _from=self.from_to_types[event_name][0],
-                _to=self.from_to_types[event_name][1],
-            ),
-            (from_block, event_name, contract_address, user_address, user_address),
+        query = self.user_contract_events_query(
+            [event_name], user_address, from_block, contract_address
         )
-
-        events = self._run_events_query(query)
+        events = self._run_events_query(query, page)
 
         logger.debug(
             "get_user_events(%s, %s, %s, %s, %s) -> %s rows",
@@ -228,42 +589,67 @@ class EthindexDB:
             len(events),
         )
 
-        for event in events:
-            if isinstance(event, TLNetworkEvent):
-                event.user = user_address
-            else:
-                raise ValueError("Expected a TLNetworkEvent")
+        _set_user(events, user_address)
         return events
 
     def get_all_unw_eth_events(
-        self, user_address: str = None, from_block: int = 0, timeout: float = None
+        self,
+        user_address: str = None,
+        from_block: int = 0,
+        timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         return self.get_all_contract_events(
-            unw_eth_events.standard_event_types, user_address, from_block, timeout
+            unw_eth_events.standard_event_types,
+            user_address,
+            from_block,
+            timeout,
+            page=page,
         )
 
     def get_all_token_events(
-        self, user_address: str = None, from_block: int = 0, timeout: float = None
+        self,
+        user_address: str = None,
+        from_block: int = 0,
+        timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         return self.get_all_contract_events(
-            token_events.standard_event_types, user_address, from_block, timeout
+            token_events.standard_event_types,
+            user_address,
+            from_block,
+            timeout,
+            page=page,
         )
 
     def get_all_network_events(
-        self, user_address: str = None, from_block: int = 0, timeout: float = None
+        self,
+        user_address: str = None,
+        from_block: int = 0,
+        timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         return self.get_all_contract_events(
             currency_network_events.standard_event_types,
             user_address,
             from_block,
             timeout,
+            page=page,
         )
 
     def get_all_exchange_events(
-        self, user_address: str = None, from_block: int = 0, timeout: float = None
+        self,
+        user_address: str = None,
+        from_block: int = 0,
+        timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         return self.get_all_contract_events(
-            exchange_events.standard_event_types, user_address, from_block, timeout
+            exchange_events.standard_event_types,
+            user_address,
+            from_block,
+            timeout,
+            page=page,
         )
 
     def get_all_contract_events(
@@ -273,22 +659,34 @@ class EthindexDB:
         from_block: int = 0,
         timeout: float = None,
         contract_address: str = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
-        # XXX The following code should be replaced with a proper SQL query.
-        # The reason it isn't already a SQL query, is that we need to
-        # dynamically create that query.
         contract_address = self._get_addr(contract_address)
-        results = [
-            self.get_user_events(
-                event_type,
-                user_address=user_address,
+        if user_address is None:
+            return self.get_all_events(
                 from_block=from_block,
                 timeout=timeout,
                 contract_address=contract_address,
+                standard_event_types=event_types,
+                page=page,
             )
-            for event_type in event_types
-        ]
-        return sorted_events(list(itertools.chain.from_iterable(results)))
+        events = self._run_events_query(
+            self.user_contract_events_query(
+                event_types, user_address, from_block, contract_address
+            ),
+            page,
+        )
+        logger.debug(
+            "get_all_contract_events(%s, %s, %s, %s, %s) -> %s rows",
+            event_types,
+            user_address,
+            from_block,
+            timeout,
+            contract_address,
+            len(events),
+        )
+        _set_user(events, user_address)
+        return events
 
     def get_events(
         self,
@@ -296,6 +694,7 @@ class EthindexDB:
         from_block=0,
         timeout: float = None,
         contract_address: str = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         contract_address = self._get_addr(contract_address)
         query = EventsQuery(
@@ -304,7 +703,7 @@ class EthindexDB:
                AND address=%s""",
             (from_block, event_name, contract_address),
         )
-        events = self._run_events_query(query)
+        events = self._run_events_query(query, page)
 
         logger.debug(
             "get_events(%s, %s, %s, %s) -> %s rows",
@@ -323,17 +722,15 @@ class EthindexDB:
         timeout: float = None,
         contract_address: str = None,
         standard_event_types=None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         contract_address = self._get_addr(contract_address)
         standard_event_types = self._get_standard_event_types(standard_event_types)
-        query = EventsQuery(
-            """blockNumber>=%s
-               AND address=%s
-               AND eventName in %s""",
-            (from_block, contract_address, tuple(standard_event_types)),
+        query = self.contract_events_query(
+            standard_event_types, from_block, contract_address
         )
 
-        events = self._run_events_query(query)
+        events = self._run_events_query(query, page)
         logger.debug(
             "get_all_events(%s, %s, %s) -> %s rows",
             from_block,
@@ -343,3 +740,127 @@ class EthindexDB:
         )
 
         return events
+
+    def _get_latest_events_per_pair(self, cur, event_name: str, contract_address: str):
+        """returns a dict mapping a pair of users to the args and timestamp of
+        the latest event of type event_name between them"""
+        _from, _to = self.from_to_types[event_name]
+        query_string = select_latest_event_per_pair.format(_from=_from, _to=_to)
+        cur.execute(query_string, (contract_address, event_name))
+        rows = cur.fetchall()
+        return {frozenset((row["args"][_from], row["args"][_to])): row for row in rows}
+
+    def get_trustlines(
+        self, contract_address: str = None
+    ) -> Tuple[int, List[Trustline]]:
+        """Returns the block number the ethindex has indexed and the
+        trustlines network at that block in the same format as
+        relay.blockchain.CurrencyNetworkProxy.gen_graph_representation
+
+        The state of every trustline is derived from the latest TrustlineUpdate
+        and BalanceUpdate event of every pair of users, so that we need two
+        queries instead of a call to the node for every trustline. Trustlines
+        without any creditline and balance have been closed and are left out.
+        The queries run in one repeatable read transaction, so that they see
+        the same blocks.
+        """
+        contract_address = self._get_addr(contract_address)
+        with self.conn_pool.connection() as conn:
+            with conn:
+                with conn.cursor() as cur:
+                    cur.execute("SET TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+                    trustline_updates = self._get_latest_events_per_pair(
+                        cur,
+                        currency_network_events.TrustlineUpdateEventType,
+                        contract_address,
+                    )
+                    balance_updates = self._get_latest_events_per_pair(
+                        cur,
+                        currency_network_events.BalanceUpdateEventType,
+                        contract_address,
+                    )
+                block_number = _get_current_blocknumber(conn)
+
+        result = []
+        for pair, trustline_update in trustline_updates.items():
+            args = trustline_update["args"]
+            user, counter_party = sorted(pair)
+            if args["_creditor"] == user:
+                creditline_given = args["_creditlineGiven"]
+                creditline_received = args["_creditlineReceived"]
+                interest_rate_given = args.get("_interestRateGiven", 0)
+                interest_rate_received = args.get("_interestRateReceived", 0)
+            else:
+                creditline_given = args["_creditlineReceived"]
+                creditline_received = args["_creditlineGiven"]
+                interest_rate_given = args.get("_interestRateReceived", 0)
+                interest_rate_received = args.get("_interestRateGiven", 0)
+
+            balance = 0
+            m_time = 0
+            balance_update = balance_updates.get(pair)
+            if balance_update is not None:
+                balance = balance_update["args"]["_value"]
+                if balance_update["args"]["_from"] != user:
+                    balance = -balance
+                m_time = balance_update["timestamp"]
+
+            if creditline_given == creditline_received == balance == 0:
+                continue
+            result.append(
+                Trustline(
+                    user=user,
+                    counter_party=counter_party,
+                    creditline_given=creditline_given,
+                    creditline_received=creditline_received,
+                    interest_rate_given=interest_rate_given,
+                    interest_rate_received=interest_rate_received,
+                    is_frozen=args.get("_isFrozen", False),
+                    m_time=m_time,
+                    balance=balance,
+                )
+            )
+
+        logger.debug(
+            "get_trustlines(%s) -> %s trustlines at block %s",
+            contract_address,
+            len(result),
+            block_number,
+        )
+        return block_number, result
+
+
+def get_trustlines_or_fallback(
+    ethindex: EthindexDB,
+    node_blocknumber: Callable[[], int],
+    fallback: Callable[[], Tuple[int, List[Trustline]]],
+    max_lag: int = 0,
+) -> Tuple[int, List[Trustline]]:
+    """returns the block number and the trustlines of a full sync read from
+    the ethindex database
+
+    The ethindex follows the node, so the trustlines in the database can miss
+    the latest updates the graph already got from the node. If the ethindex
+    lags more than max_lag blocks behind the node or the database can not be
+    queried, fallback is called to get them from the node instead.
+    """
+    try:
+        block_number = node_blocknumber()
+        ethindex_block_number, trustlines = ethindex.get_trustlines()
+        if ethindex_block_number < block_number - max_lag:
+            logger.warning(
+                "The ethindex is at block %s, %s blocks behind the node, "
+                "getting trustlines of %s from the node",
+                ethindex_block_number,
+                block_number - ethindex_block_number,
+                ethindex._get_addr(None),
+            )
+            return fallback()
+        return ethindex_block_number, trustlines
+    except psycopg2.Error as err:
+        logger.warning(
+            "Could not get trustlines of %s from ethindex, using the node: %s",
+            ethindex._get_addr(None),
+            err,
+        )
+        return fallback()
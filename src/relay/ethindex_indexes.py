@@ -0,0 +1,131 @@
+"""expression indexes on the events table of the ethindex database
+
+The relay selects the events of a user by the name of the event and by the
+arguments holding the users, e.g. args->>'_from'. The ethindex only indexes
+plain columns, so without further indexes postgres has to look at every event
+of a contract. For every event type and user argument in the from_to_types of
+the events modules there is a partial expression index, which postgres can
+combine with a bitmap or for the conditions of a query.
+"""
+import logging
+import re
+from typing import Dict, Iterable, List, NamedTuple
+
+from relay.blockchain import (
+    currency_network_events,
+    exchange_events,
+    token_events,
+    unw_eth_events,
+)
+from relay.ethindex_db import ConnectionPool
+
+logger = logging.getLogger("ethindex_indexes")
+
+
+class EventsIndex(NamedTuple):
+    event_type: str
+    arg: str
+
+    @property
+    def name(self) -> str:
+        return "relay_events_{}_{}".format(
+            _to_identifier(self.event_type), _to_identifier(self.arg)
+        )
+
+    def create_statement(self) -> str:
+        # concurrently, so that the ethindex can keep on writing events
+        return """CREATE INDEX CONCURRENTLY IF NOT EXISTS {name}
+               ON events (address, (args->>'{arg}'), blockNumber)
+               WHERE eventName='{event_type}'""".format(
+            name=self.name, arg=self.arg, event_type=self.event_type
+        )
+
+
+def _to_identifier(value: str) -> str:
+    return re.sub("[^a-z0-9_]", "_", value.lower())
+
+
+def get_events_indexes(
+    from_to_types_of_modules: Iterable[Dict[str, List[str]]]
+) -> List[EventsIndex]:
+    """return the indexes needed for the given from_to_types, without
+    duplicates for event types used by more than one kind of contract"""
+    indexes: List[EventsIndex] = []
+    for from_to_types in from_to_types_of_modules:
+        for event_type, args in from_to_types.items():
+            for arg in args:
+                index = EventsIndex(event_type, arg)
+                if index not in indexes:
+                    indexes.append(index)
+    return indexes
+
+
+events_indexes = get_events_indexes(
+    module.from_to_types
+    for module in [
+        currency_network_events,
+        token_events,
+        unw_eth_events,
+        exchange_events,
+    ]
+)
+
+
+def get_index_validity(conn_pool: ConnectionPool) -> Dict[str, bool]:
+    """return the names of the indexes on the events table mapped to whether
+    they are valid. Indexes whose concurrent creation failed are invalid"""
+    with conn_pool.connection() as conn:
+        with conn:
+            with conn.cursor() as cur:
+                cur.execute(
+                    """SELECT index_class.relname AS name, pg_index.indisvalid AS valid
+                       FROM pg_index
+                       JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid
+                       JOIN pg_class table_class ON table_class.oid = pg_index.indrelid
+                       WHERE table_class.relname = 'events'"""
+                )
+                return {row["name"]: row["valid"] for row in cur.fetchall()}
+
+
+def get_missing_indexes(
+    conn_pool: ConnectionPool, indexes: Iterable[EventsIndex] = None
+) -> List[EventsIndex]:
+    if indexes is None:
+        indexes = events_indexes
+    validity = get_index_validity(conn_pool)
+    return [index for index in indexes if not validity.get(index.name, False)]
+
+
+def create_indexes(conn_pool: ConnectionPool, indexes: Iterable[EventsIndex]) -> None:
+    """create the indexes, replacing invalid ones
+
+    Indexes can only be created concurrently outside of a transaction."""
+    with conn_pool.connection() as conn:
+        conn.autocommit = True
+        try:
+            with conn.cursor() as cur:
+                for index in indexes:
+                    logger.info("Creating index %s on events", index.name)
+                    cur.execute(
+                        "DROP INDEX CONCURRENTLY IF EXISTS {}".format(index.name)
+                    )
+                    cur.execute(index.create_statement())
+        finally:
+            conn.autocommit = False
+
+
+def check_indexes(conn_pool: ConnectionPool, create: bool = False) -> None:
+    """check that the indexes used by the queries of the relay exist and
+    create the missing ones if create is true"""
+    missing_indexes = get_missing_indexes(conn_pool)
+    if not missing_indexes:
+        logger.info("All indexes on events exist")
+        return
+    if create:
+        create_indexes(conn_pool, missing_indexes)
+    else:
+        logger.warning(
+            "Missing indexes on events, queries for the events of users will be slow. "
+            "Set createEthindexIndexes to create them or run:\n%s",
+            ";\n".join(index.create_statement() for index in missing_indexes),
+        )
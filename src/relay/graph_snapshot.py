@@ -0,0 +1,194 @@
+"""binary snapshots of currency network graphs
+
+A snapshot stores all trustlines of a graph together with the block number
+they reflect. It is written after every full sync, so that a restarted relay
+can load it immediately and only has to catch up on the events since that
+block, instead of serving empty graphs until the first full sync is done.
+
+The file consists of a header, a table of all addresses and one fixed size
+record per trustline referencing the address table. The file is memory mapped
+for reading.
+"""
+import logging
+import mmap
+import os
+import struct
+from typing import Callable, List, NamedTuple
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.blockchain.events import BlockchainEvent
+from relay.network_graph.graph import Account, CurrencyNetworkGraph
+
+logger = logging.getLogger("graph_snapshot")
+
+MAGIC = b"TLGRAPH\0"
+VERSION = 1
+
+# magic, version, block number, number of addresses, number of trustlines
+_header = struct.Struct("<8sHqII")
+_address_length = 42
+# user, counter party, interest rate given, interest rate received, is frozen,
+# mtime, creditline given, creditline received, balance. Creditlines and
+# balances do not fit into 64 bit, so they are stored as 256 bit integers.
+_record = struct.Struct("<IIqq?q32s32s32s")
+_int_length = 32
+
+
+class InvalidSnapshotException(Exception):
+    pass
+
+
+class GraphSnapshot(NamedTuple):
+    block_number: int
+    trustlines: List[Trustline]
+
+
+def _to_bytes(value: int) -> bytes:
+    return value.to_bytes(_int_length, "little", signed=True)
+
+
+def _from_bytes(data: bytes) -> int:
+    return int.from_bytes(data, "little", signed=True)
+
+
+def write_snapshot(path: str, graph: CurrencyNetworkGraph, block_number: int) -> None:
+    """write a snapshot of all trustlines of graph to path
+
+    The snapshot is written to a temporary file first and then moved to path,
+    so that a crash never leaves a partially written snapshot behind.
+    """
+    address_ids = {}
+    records = []
+    for a, b, data in graph.graph.edges(data=True):
+        user, counter_party = min(a, b), max(a, b)
+        account = Account(data, user, counter_party)
+        for address in (user, counter_party):
+            address_ids.setdefault(address, len(address_ids))
+        records.append(
+            _record.pack(
+                address_ids[user],
+                address_ids[counter_party],
+                account.interest_rate,
+                account.reverse_interest_rate,
+                account.is_frozen,
+                account.m_time,
+                _to_bytes(account.creditline),
+                _to_bytes(account.reverse_creditline),
+                _to_bytes(account.balance),
+            )
+        )
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(
+            _header.pack(MAGIC, VERSION, block_number, len(address_ids), len(records))
+        )
+        for address in address_ids:
+            encoded_address = address.encode("ascii")
+            if len(encoded_address) != _address_length:
+                raise ValueError("Invalid address: {}".format(address))
+            f.write(encoded_address)
+        f.writelines(records)
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: str) -> GraphSnapshot:
+    """read the snapshot written to path by write_snapshot
+
+    raises InvalidSnapshotException if the file is not a complete snapshot
+    """
+    with open(path, "rb") as f:
+        try:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # empty file
+            raise InvalidSnapshotException("Empty snapshot file")
+    with data:
+        if len(data) < _header.size:
+            raise InvalidSnapshotException("Snapshot file too short")
+        magic, version, block_number, n_addresses, n_trustlines = _header.unpack_from(
+            data
+        )
+        if magic != MAGIC or version != VERSION:
+            raise InvalidSnapshotException("Unknown snapshot format")
+        addresses_start = _header.size
+        records_start = addresses_start + n_addresses * _address_length
+        records_end = records_start + n_trustlines * _record.size
+        if len(data) != records_end:
+            raise InvalidSnapshotException("Snapshot file has the wrong size")
+
+        address_table = data[addresses_start:records_start].decode("ascii")
+        addresses = [
+            address_table[i : i + _address_length]
+            for i in range(0, len(address_table), _address_length)
+        ]
+        trustlines = [
+            Trustline(
+                user=addresses[user],
+                counter_party=addresses[counter_party],
+                creditline_given=_from_bytes(creditline_given),
+                creditline_received=_from_bytes(creditline_received),
+                interest_rate_given=interest_rate_given,
+                interest_rate_received=interest_rate_received,
+                is_frozen=is_frozen,
+                m_time=m_time,
+                balance=_from_bytes(balance),
+            )
+            for (
+                user,
+                counter_party,
+                interest_rate_given,
+                interest_rate_received,
+                is_frozen,
+                m_time,
+                creditline_given,
+                creditline_received,
+                balance,
+            ) in _record.iter_unpack(data[records_start:records_end])
+        ]
+    return GraphSnapshot(block_number, trustlines)
+
+
+def load_snapshot(
+    path: str,
+    graph: CurrencyNetworkGraph,
+    get_events_since: Callable[[int], List[BlockchainEvent]],
+    apply_event: Callable[[CurrencyNetworkGraph, BlockchainEvent], None],
+) -> bool:
+    """load graph from the snapshot at path and apply the events returned by
+    get_events_since for the block of the snapshot with apply_event
+
+    Returns whether the graph has been loaded. If the snapshot can not be read
+    or the events since can not be fetched, e.g. because the node or the
+    ethindex are slow or not available, the graph is left unchanged and has to
+    wait for the full sync.
+    """
+    if not os.path.exists(path):
+        return False
+    try:
+        snapshot = read_snapshot(path)
+    except (OSError, InvalidSnapshotException) as err:
+        logger.warning("Could not read graph snapshot %s: %s", path, err)
+        return False
+
+    try:
+        events = get_events_since(snapshot.block_number)
+    except Exception:
+        logger.warning(
+            "Could not get the events since block %s of graph snapshot %s, "
+            "waiting for the full sync",
+            snapshot.block_number,
+            path,
+            exc_info=True,
+        )
+        return False
+
+    graph.gen_network(snapshot.trustlines)
+    for event in events:
+        apply_event(graph, event)
+    logger.info(
+        "Loaded graph snapshot %s from block %s and applied %s events since",
+        path,
+        snapshot.block_number,
+        len(events),
+    )
+    return True
@@ -0,0 +1,117 @@
+"""running sums over the trustlines of every user of a currency network
+
+The aggregated account summary of a user used to look at all of their
+trustlines and project the interests of every balance. The sums of the
+creditlines and of the balances of trustlines without interests do not depend
+on the time, so we keep them up to date on every change of a trustline. Only
+the trustlines with interests are left to be looked at on every query.
+"""
+from typing import Dict, Set
+
+from .trustline_data import (
+    get_balance,
+    get_creditline,
+    get_interest_rate,
+    get_is_frozen,
+)
+
+
+class UserSums:
+    """sums over the trustlines of one user, from the view of the user"""
+
+    __slots__ = (
+        "num_trustlines",
+        "creditline_given",
+        "creditline_received",
+        "balance",
+        "frozen_balance",
+        "interest_counter_parties",
+    )
+
+    def __init__(self) -> None:
+        self.num_trustlines = 0
+        self.creditline_given = 0
+        self.creditline_received = 0
+        # the balances of the trustlines without interests
+        self.balance = 0
+        self.frozen_balance = 0
+        # the counter parties of the trustlines with interests, whose balances
+        # are not part of the sums
+        self.interest_counter_parties: Set = set()
+
+
+def has_interests(data, user, counter_party) -> bool:
+    return (
+        get_interest_rate(data, user, counter_party) != 0
+        or get_interest_rate(data, counter_party, user) != 0
+    )
+
+
+class AccountSums:
+    """UserSums of all users of a graph and totals over all trustlines
+
+    Every change of a trustline has to be wrapped into calls of
+    remove_trustline with the old and add_trustline with the new data.
+    """
+
+    def __init__(self, graph=None) -> None:
+        self._sums: Dict = {}
+        self.num_trustlines = 0
+        # does not include interests
+        self.money_created = 0
+        self.total_creditlines = 0
+        if graph is not None:
+            for a, b, data in graph.edges(data=True):
+                self.add_trustline(a, b, data)
+
+    def get(self, user) -> UserSums:
+        return self._sums.get(user, UserSums())
+
+    def has_user(self, user) -> bool:
+        """whether the user has any trustlines"""
+        return user in self._sums
+
+    def users(self):
+        return self._sums.keys()
+
+    @property
+    def num_users(self) -> int:
+        return len(self._sums)
+
+    def add_trustline(self, a, b, data) -> None:
+        self._add_to_totals(a, b, data, 1)
+        self._add(a, b, data, 1)
+        self._add(b, a, data, 1)
+
+    def remove_trustline(self, a, b, data) -> None:
+        self._add_to_totals(a, b, data, -1)
+        self._add(a, b, data, -1)
+        self._add(b, a, data, -1)
+
+    def _add_to_totals(self, a, b, data, sign: int) -> None:
+        self.num_trustlines += sign
+        self.money_created += sign * abs(get_balance(data, a, b))
+        self.total_creditlines += sign * (
+            get_creditline(data, a, b) + get_creditline(data, b, a)
+        )
+
+    def _add(self, user, counter_party, data, sign: int) -> None:
+        sums = self._sums.get(user)
+        if sums is None:
+            sums = self._sums[user] = UserSums()
+        sums.num_trustlines += sign
+        if sums.num_trustlines == 0:
+            del self._sums[user]
+            return
+
+        sums.creditline_given += sign * get_creditline(data, user, counter_party)
+        sums.creditline_received += sign * get_creditline(data, counter_party, user)
+        if has_interests(data, user, counter_party):
+            if sign > 0:
+                sums.interest_counter_parties.add(counter_party)
+            else:
+                sums.interest_counter_parties.discard(counter_party)
+        elif get_is_frozen(data):
+            sums.frozen_balance += sign * get_balance(data, user, counter_party)
+        else:
+            sums.balance += sign * get_balance(data, user, counter_party)
@@ -1,13 +1,57 @@
 """graph algorithms"""
 
 import abc
+import collections
 import heapq
-from typing import Callable, Dict, Iterable, List, Set
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
 
+import gevent
 import networkx as nx
 
+from relay.concurrency_utils import TimeoutException
+
+
+class SearchStatistics:
+    """counters describing the work done by the searches of path queries
+
+    rejected_edges counts the edges total_cost_from_start_to_dst forbade by
+    the reason given to CostAccumulator.reject, e.g. frozen, max_hops, max_fees
+    or capacity.
+    """
+
+    def __init__(self) -> None:
+        self.queries = 0
+        self.searches = 0
+        self.nodes_popped = 0
+        self.edges_relaxed = 0
+        self.rejected_edges: Dict[str, int] = collections.Counter()
+        self.heap_peak = 0
+        self.wall_time = 0.0
+
+    def add(self, other: "SearchStatistics") -> None:
+        self.queries += other.queries
+        self.searches += other.searches
+        self.nodes_popped += other.nodes_popped
+        self.edges_relaxed += other.edges_relaxed
+        self.rejected_edges.update(other.rejected_edges)
+        self.heap_peak = max(self.heap_peak, other.heap_peak)
+        self.wall_time += other.wall_time
+
 
 class CostAccumulator(metaclass=abc.ABCMeta):
+    # set by least_cost_path to count the rejected edges
+    stats: Optional[SearchStatistics] = None
+
+    def reject(self, reason: str) -> None:
+        """count an edge forbidden for the given reason
+
+        Returns None, so that total_cost_from_start_to_dst can return its result.
+        """
+        if self.stats is not None:
+            self.stats.rejected_edges[reason] += 1
+        return None
+
     @abc.abstractmethod
     def zero(self):
         """return 'zero cost' element, which is the initial cost for a one-node path
@@ -42,6 +86,26 @@ class CostAccumulator(metaclass=abc.ABCMeta):
         """
         pass
 
+    def estimate_cost_to_target(self, cost_from_start_to_node, min_hops_to_target):
+        """
+        return a lower bound for the total cost of a path from one of the
+        starting nodes to a target node, that starts with a path of cost
+        cost_from_start_to_node and still needs at least min_hops_to_target
+        hops to reach the target.
+
+        This is used by least_cost_path to direct the search towards the
+        target. The estimate must never be larger than the real cost and it
+        must not decrease along a path, otherwise least_cost_path may return
+        a path that is not the cheapest one.
+
+        It may return None, which means that no target can be reached from
+        the node at all.
+
+        The default implementation does not estimate anything, which makes
+        the goal directed search behave like dijkstra's algorithm.
+        """
+        return cost_from_start_to_node
+
     def compute_cost_for_path(self, graph: nx.graph.Graph, path: List):
         """
         compute the cost for the given path. This may raise nx.NetworkXNoPath if
@@ -67,6 +131,71 @@ def _build_path_from_backlinks(dst: List, backlinks: Dict):
         path.append(dst)
 
 
+class ExpansionBudgetExceededException(Exception):
+    """Exception to signal that a search expanded more nodes than allowed"""
+
+    pass
+
+
+class GraphChangedException(Exception):
+    """Exception to signal that the graph changed while a search let other
+    greenlets run, so that it cannot be continued on the same state"""
+
+    pass
+
+
+class ExpansionBudget:
+    """limits the number of nodes expanded by the searches of one query
+
+    A query may consist of several searches, which all count against the same
+    budget. Every yield_every expansions, the search sleeps for a moment to let
+    the other greenlets run. None disables the limit or the yielding.
+
+    graph_version is a function returning a value, which changes on every
+    change of the graph. If it is given and the graph changed while the search
+    slept, a GraphChangedException is raised.
+    """
+
+    def __init__(
+        self,
+        max_expansions: int = None,
+        yield_every: int = None,
+        graph_version: Callable = None,
+    ) -> None:
+        self.max_expansions = max_expansions
+        self.yield_every = yield_every
+        self.expansions = 0
+        self.graph_version = graph_version
+        self._initial_graph_version = None
+        if graph_version is not None:
+            self._initial_graph_version = graph_version()
+
+    def expand(self):
+        self.expansions += 1
+        if self.max_expansions is not None and self.expansions > self.max_expansions:
+            raise ExpansionBudgetExceededException(
+                "Could not find a path within {} expanded nodes".format(
+                    self.max_expansions
+                )
+            )
+        if self.yield_every and self.expansions % self.yield_every == 0:
+            gevent.sleep(0)
+            if (
+                self.graph_version is not None
+                and self.graph_version() != self._initial_graph_version
+            ):
+                raise GraphChangedException(
+                    "The graph changed while the search let other greenlets run"
+                )
+
+
+def _check_limits(deadline, budget):
+    if deadline is not None and time.monotonic() > deadline:
+        raise TimeoutException("Could not find a path before the deadline")
+    if budget is not None:
+        budget.expand()
+
+
 def _least_cost_path_helper(
     graph: nx.graph.Graph,
     target_nodes: Set,
@@ -74,7 +203,11 @@ def _least_cost_path_helper(
     least_costs: Dict,
     backlinks: Dict,
     cost_fn: Callable,
-    max_cost=None
+    max_cost=None,
+    deadline=None,
+    budget: ExpansionBudget = None,
+    stats: SearchStatistics = None,
+    reached_nodes: Set = None,
     #    node_filter,
     #    edge_filter,
 ):
@@ -82,7 +215,10 @@ def _least_cost_path_helper(
 
     visited_nodes = set()  # set of nodes, where we already found the minimal path
     while queue:
+        _check_limits(deadline, budget)
         cost_from_start_to_node, node = heapq.heappop(queue)
+        if stats is not None:
+            stats.nodes_popped += 1
         if node in target_nodes:
             return cost_from_start_to_node, _build_path_from_backlinks(node, backlinks)
 
@@ -93,6 +229,10 @@ def _least_cost_path_helper(
         for dst, edge_data in graph_adj[node].items():
             if dst in visited_nodes:
                 continue
+            if reached_nodes is not None:
+                reached_nodes.add(dst)
+            if stats is not None:
+                stats.edges_relaxed += 1
             cost_from_start_to_dst = cost_fn(
                 cost_from_start_to_node, node, dst, edge_data
             )
@@ -100,6 +240,8 @@ def _least_cost_path_helper(
                 continue
 
             if max_cost is not None and max_cost < cost_from_start_to_dst:
+                if stats is not None:
+                    stats.rejected_edges["max_cost"] += 1
                 continue
 
             assert cost_from_start_to_dst >= cost_from_start_to_node
@@ -112,10 +254,112 @@ def _least_cost_path_helper(
                 heapq.heappush(queue, (cost_from_start_to_dst, dst))
                 least_costs[dst] = cost_from_start_to_dst
                 backlinks[dst] = node
+                if stats is not None and len(queue) > stats.heap_peak:
+                    stats.heap_peak = len(queue)
 
     raise nx.NetworkXNoPath("no path found")
 
 
+def _goal_directed_least_cost_path_helper(
+    graph: nx.graph.Graph,
+    target_nodes: Set,
+    queue: List,
+    least_costs: Dict,
+    backlinks: Dict,
+    cost_fn: Callable,
+    estimate_fn: Callable,
+    min_hops_to_target: Callable,
+    max_cost=None,
+    deadline=None,
+    budget: ExpansionBudget = None,
+    stats: SearchStatistics = None,
+    reached_nodes: Set = None,
+):
+    """A* variant of _least_cost_path_helper
+
+    The queue is ordered by the estimated cost of the whole path to a target
+    and then by the cost from the start. Nodes, which cannot reach a target,
+    are never put into the queue.
+
+    This returns the same path as _least_cost_path_helper: After the first
+    target has been found, we keep on expanding the nodes whose estimate is not
+    higher than the cost of that target. This way all the nodes dijkstra's
+    algorithm would have looked at before returning are expanded and ties
+    between paths of the same cost can be broken in the same way: dijkstra's
+    algorithm keeps the predecessor it expanded first, i.e. the one with the
+    lowest (cost, node) pair, and returns the target with the lowest node.
+    """
+    graph_adj = graph.adj
+
+    found_cost = None
+    visited_nodes = set()  # set of nodes, where we already found the minimal path
+    while queue:
+        _check_limits(deadline, budget)
+        estimated_cost, cost_from_start_to_node, node = heapq.heappop(queue)
+        if stats is not None:
+            stats.nodes_popped += 1
+        if found_cost is not None and estimated_cost > found_cost:
+            break
+
+        if cost_from_start_to_node > least_costs[node]:
+            continue  # we already found a cheaper path to node
+
+        if node in target_nodes:
+            if found_cost is None:
+                found_cost = cost_from_start_to_node
+            continue
+
+        visited_nodes.add(node)
+        for dst, edge_data in graph_adj[node].items():
+            if dst in visited_nodes:
+                continue
+            if reached_nodes is not None:
+                reached_nodes.add(dst)
+            if stats is not None:
+                stats.edges_relaxed += 1
+            cost_from_start_to_dst = cost_fn(
+                cost_from_start_to_node, node, dst, edge_data
+            )
+            if cost_from_start_to_dst is None:  # cost_fn decided this path is forbidden
+                continue
+
+            if max_cost is not None and max_cost < cost_from_start_to_dst:
+                if stats is not None:
+                    stats.rejected_edges["max_cost"] += 1
+                continue
+
+            assert cost_from_start_to_dst >= cost_from_start_to_node
+
+            least_cost_found_so_far_from_start_to_dst = least_costs.get(dst)
+            if (
+                least_cost_found_so_far_from_start_to_dst is None
+                or cost_from_start_to_dst < least_cost_found_so_far_from_start_to_dst
+            ):
+                estimated_cost = estimate_fn(
+                    cost_from_start_to_dst, min_hops_to_target(dst)
+                )
+                if estimated_cost is None:  # no target can be reached from dst
+                    continue
+                heapq.heappush(queue, (estimated_cost, cost_from_start_to_dst, dst))
+                least_costs[dst] = cost_from_start_to_dst
+                backlinks[dst] = node
+                if stats is not None and len(queue) > stats.heap_peak:
+                    stats.heap_peak = len(queue)
+            elif cost_from_start_to_dst == least_cost_found_so_far_from_start_to_dst:
+                # keep the predecessor dijkstra's algorithm would have expanded first
+                previous_node = backlinks[dst]
+                if previous_node is not None:
+                    previous = (least_costs[previous_node], previous_node)
+                    if (cost_from_start_to_node, node) < previous:
+                        backlinks[dst] = node
+
+    if found_cost is None:
+        raise nx.NetworkXNoPath("no path found")
+
+    target = min(node for node in target_nodes if least_costs.get(node) == found_cost)
+    return found_cost, _build_path_from_backlinks(target, backlinks)
+
+
 def least_cost_path(
     *,
     graph: nx.graph.Graph,
@@ -123,6 +367,11 @@ def least_cost_path(
     target_nodes: Set,
     cost_accumulator: CostAccumulator,
     max_cost=None,
+    min_hops_to_target: Callable = None,
+    deadline: float = None,
+    budget: ExpansionBudget = None,
+    stats: SearchStatistics = None,
+    reached_nodes: Set = None,
 ):
     """find the path through the given graph with least cost from one of the
     starting_nodes to one of the target_nodes
@@ -137,10 +386,34 @@ def least_cost_path(
     total_cost_from_start_to_dst function must return a value that's equal or
     greater than it's given cost_from_start_to_node parameter, i.e. it must not
     use 'negative costs'.
+
+    When min_hops_to_target is given, the search is goal directed (A*).
+    min_hops_to_target(node) must return a lower bound for the number of hops
+    from node to the nearest target node, which is turned into a lower bound
+    for the total cost via the cost_accumulator's estimate_cost_to_target.
+
+    deadline is a time as returned by time.monotonic. If the search is not
+    finished by then, a TimeoutException is raised.
+
+    budget is an ExpansionBudget, which is charged for every node taken from
+    the queue. If it is exceeded, an ExpansionBudgetExceededException is
+    raised.
+
+    If stats is given, the work done by the search is counted in it. It is
+    also set as the stats of cost_accumulator to count the rejected edges.
+
+    If reached_nodes is given, the starting nodes and every node at the end of
+    an edge the search looked at are added to it. This includes the nodes that
+    were put into the queue but never expanded, whose edges can decide the
+    result after they changed, e.g. when the goal directed search stopped
+    before expanding them.
     """
     zero_cost = cost_accumulator.zero()
     cost_fn = cost_accumulator.total_cost_from_start_to_dst
     assert max_cost is None or zero_cost <= max_cost
+    if stats is not None:
+        stats.searches += 1
+        cost_accumulator.stats = stats
 
     least_costs: Dict = {}
     backlinks: Dict = {}
@@ -148,10 +421,172 @@ def least_cost_path(
     for node in starting_nodes:
         if not graph.has_node(node):
             continue
+        if reached_nodes is not None:
+            reached_nodes.add(node)
         least_costs[node] = zero_cost
         backlinks[node] = None
-        heapq.heappush(queue, (zero_cost, node))
+        if min_hops_to_target is None:
+            heapq.heappush(queue, (zero_cost, node))
+        else:
+            estimated_cost = cost_accumulator.estimate_cost_to_target(
+                zero_cost, min_hops_to_target(node)
+            )
+            if estimated_cost is not None:
+                heapq.heappush(queue, (estimated_cost, zero_cost, node))
+
+    if min_hops_to_target is not None:
+        return _goal_directed_least_cost_path_helper(
+            graph,
+            target_nodes,
+            queue,
+            least_costs,
+            backlinks,
+            cost_fn,
+            cost_accumulator.estimate_cost_to_target,
+            min_hops_to_target,
+            max_cost=max_cost,
+            deadline=deadline,
+            budget=budget,
+            stats=stats,
+            reached_nodes=reached_nodes,
+        )
 
     return _least_cost_path_helper(
-        graph, target_nodes, queue, least_costs, backlinks, cost_fn, max_cost=max_cost
+        graph,
+        target_nodes,
+        queue,
+        least_costs,
+        backlinks,
+        cost_fn,
+        max_cost=max_cost,
+        deadline=deadline,
+        budget=budget,
+        stats=stats,
+        reached_nodes=reached_nodes,
     )
+
+
+class _SpurCostAccumulator(CostAccumulator):
+    """CostAccumulator for the spur path searches of k_least_cost_paths
+
+    It continues a root path with the given cost and forbids paths through the
+    excluded nodes and edges. Everything else is left to the wrapped
+    cost_accumulator.
+    """
+
+    def __init__(
+        self,
+        cost_accumulator: CostAccumulator,
+        root_cost,
+        excluded_nodes: Set,
+        excluded_edges: Set,
+    ) -> None:
+        self.cost_accumulator = cost_accumulator
+        self.root_cost = root_cost
+        self.excluded_nodes = excluded_nodes
+        self.excluded_edges = excluded_edges
+
+    def zero(self):
+        return self.root_cost
+
+    def total_cost_from_start_to_dst(
+        self, cost_from_start_to_node, node, dst, edge_data
+    ):
+        if dst in self.excluded_nodes or (node, dst) in self.excluded_edges:
+            return self.reject("excluded")
+        return self.cost_accumulator.total_cost_from_start_to_dst(
+            cost_from_start_to_node, node, dst, edge_data
+        )
+
+    def estimate_cost_to_target(self, cost_from_start_to_node, min_hops_to_target):
+        return self.cost_accumulator.estimate_cost_to_target(
+            cost_from_start_to_node, min_hops_to_target
+        )
+
+
+def k_least_cost_paths(
+    *,
+    graph: nx.graph.Graph,
+    source,
+    target,
+    cost_accumulator: CostAccumulator,
+    k: int,
+    min_hops_to_target: Callable = None,
+    deadline: float = None,
+    budget: ExpansionBudget = None,
+    stats: SearchStatistics = None,
+) -> List[Tuple]:
+    """find up to k loop free paths from source to target with the least costs
+
+    This is Yen's algorithm: every further path deviates from one of the paths
+    already found at some spur node. The path up to the spur node is kept and
+    the rest is searched with least_cost_path, without the nodes of the kept
+    path and the edges the paths found so far take from the spur node.
+
+    Returns a list of (cost, path) tuples sorted by cost, the first one is the
+    path least_cost_path returns. The arguments are used like in
+    least_cost_path.
+    """
+    try:
+        paths = [
+            least_cost_path(
+                graph=graph,
+                starting_nodes={source},
+                target_nodes={target},
+                cost_accumulator=cost_accumulator,
+                min_hops_to_target=min_hops_to_target,
+                deadline=deadline,
+                budget=budget,
+                stats=stats,
+            )
+        ]
+    except nx.NetworkXNoPath:
+        return []
+
+    candidates: List = []
+    seen_paths = {tuple(paths[0][1])}
+    while len(paths) < k:
+        _, previous_path = paths[-1]
+        root_cost = cost_accumulator.zero()
+        for i, spur_node in enumerate(previous_path[:-1]):
+            root_path = previous_path[: i + 1]
+            excluded_edges = {
+                (path[i], path[i + 1])
+                for _, path in paths
+                if len(path) > i + 1 and path[: i + 1] == root_path
+            }
+            spur_cost_accumulator = _SpurCostAccumulator(
+                cost_accumulator, root_cost, set(root_path[:-1]), excluded_edges
+            )
+            try:
+                cost, spur_path = least_cost_path(
+                    graph=graph,
+                    starting_nodes={spur_node},
+                    target_nodes={target},
+                    cost_accumulator=spur_cost_accumulator,
+                    min_hops_to_target=min_hops_to_target,
+                    deadline=deadline,
+                    budget=budget,
+                    stats=stats,
+                )
+            except nx.NetworkXNoPath:
+                pass
+            else:
+                path = root_path[:-1] + spur_path
+                if tuple(path) not in seen_paths:
+                    seen_paths.add(tuple(path))
+                    heapq.heappush(candidates, (cost, path))
+
+            next_node = previous_path[i + 1]
+            root_cost = cost_accumulator.total_cost_from_start_to_dst(
+                root_cost,
+                spur_node,
+                next_node,
+                graph.get_edge_data(spur_node, next_node),
+            )
+
+        if not candidates:
+            break
+        paths.append(heapq.heappop(candidates))
+
+    return paths
@@ -0,0 +1,462 @@
+"""Compact, array backed storage for the trustlines of a currency network
+
+CompactGraph can be used by CurrencyNetworkGraph instead of a networkx.Graph.
+Addresses are interned to integer ids and the trustline data is stored in
+parallel arrays indexed by an edge id, instead of in one dict per edge. The
+adjacency used for path finding is kept in CSR form (offsets, neighbors, edge
+ids). Removed edges are swapped out of their CSR rows in place, new edges are
+kept in a small overflow adjacency, which is merged into a rebuilt CSR once it
+holds more than a fraction of the edges. So trustline churn does not cost a
+rebuild of the whole adjacency for every search.
+
+CompactGraph implements the part of the networkx.Graph interface used by
+CurrencyNetworkGraph. The edge data returned from it are light-weight views
+(EdgeData), which are created on demand and work with the accessors in
+relay.network_graph.trustline_data.
+
+Path finding does not use those views. It runs on the view returned by
+CompactGraph.search_view, which hands out edge ids as edge data, together with
+a CompactTrustlineData accessor that reads the arrays directly.
+"""
+import itertools
+from array import array
+from collections.abc import Mapping, MutableMapping
+from typing import Dict, List, Tuple
+
+import networkx as nx
+
+from relay.network_graph.graph_constants import (
+    balance_ab,
+    creditline_ab,
+    creditline_ba,
+    interest_ab,
+    interest_ba,
+    is_frozen,
+    m_time,
+)
+
+# balances and creditlines may exceed 64 bit, so they are kept in lists
+# of python ints. interest rates and modification times fit into 64 bit.
+_column_factories = {
+    creditline_ab: list,
+    creditline_ba: list,
+    interest_ab: lambda: array("q"),
+    interest_ba: lambda: array("q"),
+    is_frozen: list,
+    m_time: lambda: array("q"),
+    balance_ab: list,
+}
+
+_column_defaults = {
+    creditline_ab: 0,
+    creditline_ba: 0,
+    interest_ab: 0,
+    interest_ba: 0,
+    is_frozen: False,
+    m_time: 0,
+    balance_ab: 0,
+}
+
+_NO_NODE = -1
+
+# the CSR is rebuilt once the overflow adjacency holds more than
+# max(min_overflow_edges, number of edges // overflow_edges_divisor) edges
+min_overflow_edges = 64
+overflow_edges_divisor = 16
+
+
+class EdgeData(MutableMapping):
+    """dict like view on the trustline data of a single edge
+
+    The keys are the ones from relay.network_graph.graph_constants. Keys
+    cannot be added or deleted.
+    """
+
+    __slots__ = ("_columns", "_edge")
+
+    def __init__(self, columns: Dict, edge: int) -> None:
+        self._columns = columns
+        self._edge = edge
+
+    def __getitem__(self, key):
+        return self._columns[key][self._edge]
+
+    def __setitem__(self, key, value):
+        self._columns[key][self._edge] = value
+
+    def __delitem__(self, key):
+        raise TypeError("Cannot delete trustline data")
+
+    def __iter__(self):
+        return iter(self._columns)
+
+    def __len__(self):
+        return len(self._columns)
+
+    def __repr__(self):
+        return repr(dict(self))
+
+
+class AdjacencyView(Mapping):
+    """mapping from the neighbors of a node to the EdgeData of the edges"""
+
+    __slots__ = ("_graph", "_node")
+
+    def __init__(self, graph: "CompactGraph", node) -> None:
+        self._graph = graph
+        self._node = node
+
+    def __getitem__(self, neighbor):
+        edge = self._graph._edge_id(self._node, neighbor)
+        if edge is None:
+            raise KeyError(neighbor)
+        return EdgeData(self._graph._columns, edge)
+
+    def __contains__(self, neighbor):
+        return self._graph._edge_id(self._node, neighbor) is not None
+
+    def __iter__(self):
+        node_id = self._graph._node_ids[self._node]
+        return (neighbor for neighbor, _ in self._graph._edges_of(node_id))
+
+    def __len__(self):
+        return self._graph._degree[self._graph._node_ids[self._node]]
+
+
+class CompactTrustlineData:
+    """Accessor for the trustline data of a CompactGraph
+
+    This provides the getters of relay.network_graph.trustline_data, but
+    takes an edge id as returned by the search view of a CompactGraph instead
+    of the edge data dict.
+    """
+
+    def __init__(self, columns: Dict) -> None:
+        self._balance_ab = columns[balance_ab]
+        self._creditline_ab = columns[creditline_ab]
+        self._creditline_ba = columns[creditline_ba]
+        self._interest_ab = columns[interest_ab]
+        self._interest_ba = columns[interest_ba]
+        self._is_frozen = columns[is_frozen]
+        self._m_time = columns[m_time]
+
+    def get_balance(self, edge, user, counter_party):
+        if user < counter_party:
+            return self._balance_ab[edge]
+        else:
+            return -self._balance_ab[edge]
+
+    def get_creditline(self, edge, user, counter_party):
+        if user < counter_party:
+            return self._creditline_ab[edge]
+        else:
+            return self._creditline_ba[edge]
+
+    def get_interest_rate(self, edge, user, counter_party):
+        if user < counter_party:
+            return self._interest_ab[edge]
+        else:
+            return self._interest_ba[edge]
+
+    def get_is_frozen(self, edge):
+        return self._is_frozen[edge]
+
+    def get_mtime(self, edge):
+        return self._m_time[edge]
+
+
+class _CsrRow:
+    __slots__ = ("_graph", "_node_id")
+
+    def __init__(self, graph, node_id):
+        self._graph = graph
+        self._node_id = node_id
+
+    def items(self):
+        return self._graph._edges_of(self._node_id)
+
+
+class _CsrAdjacency:
+    def __init__(self, graph: "CompactGraph") -> None:
+        self._graph = graph
+
+    def __getitem__(self, node):
+        return _CsrRow(self._graph, self._graph._node_ids[node])
+
+
+class CompactSearchView:
+    """read only view of a CompactGraph to be used with alg.least_cost_path
+
+    Edge data are edge ids, which have to be read with the accessor in the
+    trustline_data attribute.
+    """
+
+    def __init__(self, graph: "CompactGraph") -> None:
+        graph._ensure_csr()
+        self._graph = graph
+        self.adj = _CsrAdjacency(graph)
+        self.trustline_data = CompactTrustlineData(graph._columns)
+
+    def has_node(self, node) -> bool:
+        return self._graph.has_node(node)
+
+    def get_edge_data(self, u, v, default=None):
+        edge = self._graph._edge_id(u, v)
+        if edge is None:
+            return default
+        return edge
+
+
+class CompactGraph:
+    """array backed replacement for the networkx.Graph used by CurrencyNetworkGraph"""
+
+    def __init__(self) -> None:
+        self.clear()
+
+    def clear(self) -> None:
+        self._node_ids: Dict[str, int] = {}
+        self._nodes: List[str] = []
+        self._node_present = bytearray()
+        self._degree = array("l")
+        self._edge_a = array("l")
+        self._edge_b = array("l")
+        self._edge_ids: Dict[int, int] = {}
+        self._free_edges: List[int] = []
+        self._columns = {key: factory() for key, factory in _column_factories.items()}
+        self._invalidate_csr()
+
+    def _invalidate_csr(self) -> None:
+        self._offsets = None
+        self._csr_neighbors: List[str] = []
+        self._csr_edges = array("l")
+        # number of edges in the CSR row of a node, removed edges are swapped
+        # to the end of the row
+        self._csr_lengths = array("l")
+        # node id -> list of (neighbor, edge id) added since the CSR was built
+        self._overflow: Dict[int, List[Tuple[str, int]]] = {}
+        self._num_overflow_edges = 0
+
+    def _ensure_csr(self) -> None:
+        """build the CSR adjacency if it has been invalidated"""
+        if self._offsets is not None:
+            return
+        num_nodes = len(self._nodes)
+        offsets = array("l", [0] * (num_nodes + 1))
+        for node_id in range(num_nodes):
+            offsets[node_id + 1] = offsets[node_id] + self._degree[node_id]
+        neighbors: List = [None] * offsets[num_nodes]
+        edges = array("l", [0]) * offsets[num_nodes]
+        fill = array("l", offsets[:num_nodes])
+        for edge, (a, b) in enumerate(zip(self._edge_a, self._edge_b)):
+            if a == _NO_NODE:
+                continue
+            neighbors[fill[a]] = self._nodes[b]
+            edges[fill[a]] = edge
+            fill[a] += 1
+            neighbors[fill[b]] = self._nodes[a]
+            edges[fill[b]] = edge
+            fill[b] += 1
+        self._offsets = offsets
+        self._csr_neighbors = neighbors
+        self._csr_edges = edges
+        self._csr_lengths = array("l", self._degree)
+        self._overflow = {}
+        self._num_overflow_edges = 0
+
+    def _add_to_csr(self, u_id: int, v_id: int, edge: int) -> None:
+        if self._offsets is None:
+            return
+        self._overflow.setdefault(u_id, []).append((self._nodes[v_id], edge))
+        self._overflow.setdefault(v_id, []).append((self._nodes[u_id], edge))
+        self._num_overflow_edges += 1
+        if self._num_overflow_edges > max(
+            min_overflow_edges, len(self._edge_ids) // overflow_edges_divisor
+        ):
+            self._invalidate_csr()
+
+    def _remove_from_csr(self, node_id: int, edge: int) -> bool:
+        """remove the edge from the adjacency of the node, returns whether it
+        was in the overflow adjacency"""
+        overflow = self._overflow.get(node_id)
+        if overflow is not None:
+            for i, (_, overflow_edge) in enumerate(overflow):
+                if overflow_edge == edge:
+                    del overflow[i]
+                    return True
+        start = self._offsets[node_id]
+        last = start + self._csr_lengths[node_id] - 1
+        for i in range(start, last + 1):
+            if self._csr_edges[i] == edge:
+                self._csr_neighbors[i] = self._csr_neighbors[last]
+                self._csr_edges[i] = self._csr_edges[last]
+                self._csr_lengths[node_id] -= 1
+                return False
+        raise AssertionError(f"Edge {edge} not in the adjacency of node {node_id}")
+
+    def _intern(self, node) -> int:
+        node_id = self._node_ids.get(node)
+        if node_id is None:
+            node_id = len(self._nodes)
+            self._node_ids[node] = node_id
+            self._nodes.append(node)
+            self._node_present.append(0)
+            self._degree.append(0)
+        self._node_present[node_id] = 1
+        return node_id
+
+    @staticmethod
+    def _edge_key(a: int, b: int) -> int:
+        if a > b:
+            a, b = b, a
+        return (a << 32) | b
+
+    def _edge_id(self, u, v):
+        u_id = self._node_ids.get(u)
+        v_id = self._node_ids.get(v)
+        if u_id is None or v_id is None:
+            return None
+        return self._edge_ids.get(self._edge_key(u_id, v_id))
+
+    def _edges_of(self, node_id: int):
+        self._ensure_csr()
+        overflow = self._overflow.get(node_id)
+        if node_id >= len(self._csr_lengths):
+            # interned after the CSR was built
+            return iter(overflow or ())
+        start = self._offsets[node_id]
+        end = start + self._csr_lengths[node_id]
+        row = zip(self._csr_neighbors[start:end], self._csr_edges[start:end])
+        if overflow:
+            return itertools.chain(row, overflow)
+        return row
+
+    def search_view(self) -> CompactSearchView:
+        return CompactSearchView(self)
+
+    def has_node(self, node) -> bool:
+        node_id = self._node_ids.get(node)
+        return node_id is not None and bool(self._node_present[node_id])
+
+    def __contains__(self, node) -> bool:
+        return self.has_node(node)
+
+    def __len__(self) -> int:
+        return sum(self._node_present)
+
+    def has_edge(self, u, v) -> bool:
+        return self._edge_id(u, v) is not None
+
+    def number_of_edges(self) -> int:
+        return len(self._edge_ids)
+
+    def degree(self, node) -> int:
+        if not self.has_node(node):
+            raise nx.NetworkXError(f"The node {node} is not in the graph.")
+        return self._degree[self._node_ids[node]]
+
+    def nodes(self) -> List:
+        return [
+            node for node, present in zip(self._nodes, self._node_present) if present
+        ]
+
+    def add_edge(self, u, v, **attributes) -> None:
+        u_id = self._intern(u)
+        v_id = self._intern(v)
+        key = self._edge_key(u_id, v_id)
+        edge = self._edge_ids.get(key)
+        if edge is None:
+            if self._free_edges:
+                edge = self._free_edges.pop()
+                self._edge_a[edge] = u_id
+                self._edge_b[edge] = v_id
+                for column_key, column in self._columns.items():
+                    column[edge] = _column_defaults[column_key]
+            else:
+                edge = len(self._edge_a)
+                self._edge_a.append(u_id)
+                self._edge_b.append(v_id)
+                for column_key, column in self._columns.items():
+                    column.append(_column_defaults[column_key])
+            self._edge_ids[key] = edge
+            self._degree[u_id] += 1
+            self._degree[v_id] += 1
+            self._add_to_csr(u_id, v_id, edge)
+        for column_key, value in attributes.items():
+            self._columns[column_key][edge] = value
+
+    def remove_edge(self, u, v) -> None:
+        edge = self._edge_id(u, v)
+        if edge is None:
+            raise nx.NetworkXError(f"The edge {u}-{v} is not in the graph")
+        del self._edge_ids[self._edge_key(self._node_ids[u], self._node_ids[v])]
+        self._degree[self._edge_a[edge]] -= 1
+        self._degree[self._edge_b[edge]] -= 1
+        if self._offsets is not None:
+            self._remove_from_csr(self._edge_b[edge], edge)
+            if self._remove_from_csr(self._edge_a[edge], edge):
+                self._num_overflow_edges -= 1
+        self._edge_a[edge] = _NO_NODE
+        self._edge_b[edge] = _NO_NODE
+        self._free_edges.append(edge)
+
+    def remove_node(self, node) -> None:
+        if not self.has_node(node):
+            raise nx.NetworkXError(f"The node {node} is not in the graph.")
+        for neighbor, _ in list(self._edges_of(self._node_ids[node])):
+            self.remove_edge(node, neighbor)
+        self._node_present[self._node_ids[node]] = 0
+
+    def get_edge_data(self, u, v, default=None):
+        edge = self._edge_id(u, v)
+        if edge is None:
+            return default
+        return EdgeData(self._columns, edge)
+
+    def __getitem__(self, node) -> "AdjacencyView":
+        """returns a mapping from the neighbors of node to the edge data"""
+        if not self.has_node(node):
+            raise KeyError(node)
+        return AdjacencyView(self, node)
+
+    @property
+    def adj(self):
+        return self
+
+    def edges(self, nbunch=None, data=False):
+        """returns the edges as list of (u, v) tuples, or (u, v, data) if data
+        is True or (u, v, data[key]) if data is a key
+
+        Like networkx, the edges are reported in the order of the nodes, each
+        edge only once from the node that comes first.
+        """
+        if nbunch is None:
+            edges = self._iter_edges()
+        else:
+            node_id = self._node_ids[nbunch]
+            edges = (
+                (nbunch, neighbor, edge) for neighbor, edge in self._edges_of(node_id)
+            )
+        if data is False:
+            return [(u, v) for u, v, _ in edges]
+        elif data is True:
+            return [(u, v, EdgeData(self._columns, edge)) for u, v, edge in edges]
+        else:
+            column = self._columns[data]
+            return [(u, v, column[edge]) for u, v, edge in edges]
+
+    def _iter_edges(self):
+        self._ensure_csr()
+        seen = bytearray(len(self._nodes))
+        for node_id, node in enumerate(self._nodes):
+            if not self._node_present[node_id]:
+                continue
+            for neighbor, edge in self._edges_of(node_id):
+                if not seen[self._node_ids[neighbor]]:
+                    yield node, neighbor, edge
+            seen[node_id] = 1
+
+    def to_networkx(self) -> nx.Graph:
+        graph = nx.Graph()
+        for u, v, data in self.edges(data=True):
+            graph.add_edge(u, v, **data)
+        return graph
@@ -0,0 +1,91 @@
+"""index of the connected components of a currency network
+
+The index is used to answer path queries between users of different
+components without searching the component of the source.
+
+Adding trustlines merges components, which is done incrementally by relabeling
+the smaller component. Removing trustlines may split a component, which cannot
+be detected cheaply. We therefore keep the old component: The index may then
+consider users connected that are not, but it never considers users
+disconnected that are connected, so it can only miss a chance to answer a
+query early. The index is rebuilt to be exact again once enough trustlines
+have been removed, see ComponentIndex.needs_rebuild.
+"""
+import collections
+from typing import Dict, List
+
+# the index is rebuilt once the number of trustlines removed since it has been
+# built reaches the number of trustlines divided by this
+rebuild_divisor = 100
+
+
+class ComponentIndex:
+    """maps every user of a graph to the id of its connected component"""
+
+    def __init__(self, graph=None) -> None:
+        self._component_of: Dict = {}
+        self._members: Dict[int, List] = {}
+        self._next_component = 0
+        # number of trustlines removed since the index has been built
+        self.num_removed_edges = 0
+        if graph is not None:
+            self._build(graph)
+
+    def _build(self, graph) -> None:
+        for node in graph.nodes():
+            if node in self._component_of:
+                continue
+            component = self._new_component(node)
+            members = self._members[component]
+            queue = collections.deque([node])
+            while queue:
+                for neighbor in graph[queue.popleft()]:
+                    if neighbor not in self._component_of:
+                        self._component_of[neighbor] = component
+                        members.append(neighbor)
+                        queue.append(neighbor)
+
+    def _new_component(self, node) -> int:
+        component = self._next_component
+        self._next_component += 1
+        self._component_of[node] = component
+        self._members[component] = [node]
+        return component
+
+    @property
+    def is_exact(self) -> bool:
+        """whether users in the same component are known to be connected"""
+        return self.num_removed_edges == 0
+
+    def needs_rebuild(self, num_edges: int) -> bool:
+        """whether the index should be rebuilt for a graph with num_edges
+        edges, so that the O(V+E) rebuild is spread over many removals"""
+        return (
+            self.num_removed_edges > 0
+            and self.num_removed_edges * rebuild_divisor >= num_edges
+        )
+
+    def connected(self, a, b) -> bool:
+        """returns False if there is no path between a and b for sure"""
+        component = self._component_of.get(a)
+        return component is not None and component == self._component_of.get(b)
+
+    def add_edge(self, a, b) -> None:
+        component_a = self._component_of.get(a)
+        if component_a is None:
+            component_a = self._new_component(a)
+        component_b = self._component_of.get(b)
+        if component_b is None:
+            component_b = self._new_component(b)
+        if component_a == component_b:
+            return
+
+        if len(self._members[component_a]) < len(self._members[component_b]):
+            component_a, component_b = component_b, component_a
+        members_b = self._members.pop(component_b)
+        for node in members_b:
+            self._component_of[node] = component_a
+        self._members[component_a].extend(members_b)
+
+    def remove_edge(self, a, b) -> None:
+        self.num_removed_edges += 1
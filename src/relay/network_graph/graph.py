@@ -1,11 +1,14 @@
 import csv
+import functools
 import io
 import math
-from typing import Any, Iterable, NamedTuple
+import time
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Union
 
 import networkx as nx
 
-from relay.network_graph.graph_constants import balance_ab, creditline_ab, creditline_ba
+from relay.concurrency_utils import TimeoutException
+from relay.network_graph import trustline_data
 from relay.network_graph.trustline_data import (
     get_balance,
     get_creditline,
@@ -20,9 +23,15 @@ from relay.network_graph.trustline_data import (
 )
 
 from . import alg
+from .account_sums import AccountSums
+from .compact_graph import CompactGraph
+from .components import ComponentIndex
 from .fees import calculate_fees, calculate_fees_reverse, imbalance_generated
 from .interests import balance_with_interests
+from .landmarks import HopLandmarks
+from .path_cache import PathCache
 from .payment_path import FeePayer, PaymentPath
+from .user_networks import UserNetworksIndex
 
 
 class NetworkGraphConfig(NamedTuple):
@@ -30,6 +39,51 @@ class NetworkGraphConfig(NamedTuple):
     trustlines: Iterable = []
 
 
+class TransferPathRequest(NamedTuple):
+    source: str
+    target: str
+    value: int = 1
+    fee_payer: FeePayer = FeePayer.SENDER
+    max_hops: Optional[int] = None
+    max_fees: Optional[int] = None
+
+
+def balance_with_interests_snapshot(
+    data, edge_data, user, counter_party, timestamp, balance_cache=None
+):
+    """returns the balance of user towards counter_party including the interests
+    up to timestamp
+
+    balance_cache may be a dict, which is used to reuse the result in other
+    path searches for the same timestamp as long as the graph does not change.
+    Trustlines without interests are not cached, since computing their balance
+    is cheaper than looking it up.
+    """
+    interest_rate = data.get_interest_rate(edge_data, user, counter_party)
+    reverse_interest_rate = data.get_interest_rate(edge_data, counter_party, user)
+    if balance_cache is None or (interest_rate == 0 and reverse_interest_rate == 0):
+        return balance_with_interests(
+            data.get_balance(edge_data, user, counter_party),
+            interest_rate,
+            reverse_interest_rate,
+            timestamp - data.get_mtime(edge_data),
+        )
+
+    balance = balance_cache.get((user, counter_party))
+    if balance is None:
+        balance = balance_with_interests(
+            data.get_balance(edge_data, user, counter_party),
+            interest_rate,
+            reverse_interest_rate,
+            timestamp - data.get_mtime(edge_data),
+        )
+        # the interests are rounded towards zero, so the balance of the
+        # counter_party is exactly the negated balance
+        balance_cache[user, counter_party] = balance
+        balance_cache[counter_party, user] = -balance
+    return balance
+
+
 class Account(object):
     """account from the view of a"""
 
@@ -219,6 +273,8 @@ class SenderPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         max_hops=None,
         max_fees=None,
         ignore=None,
+        trustline_data=trustline_data,
+        balance_cache: Dict = None,
     ):
         if max_hops is None:
             max_hops = math.inf
@@ -231,6 +287,10 @@ class SenderPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         self.max_hops = max_hops
         self.max_fees = max_fees
         self.ignore = ignore
+        self.trustline_data = trustline_data
+        # the balances only depend on the timestamp, so they can be reused for
+        # the whole search
+        self.balance_cache = {} if balance_cache is None else balance_cache
 
     def zero(self):
         return self.Cost(0, 0)
@@ -239,14 +299,15 @@ class SenderPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         self, cost_from_start_to_node, node, dst, edge_data
     ):
         if dst == self.ignore or node == self.ignore:
-            return None
-        if get_is_frozen(edge_data):
-            return None
+            return self.reject("ignored")
+        data = self.trustline_data
+        if data.get_is_frozen(edge_data):
+            return self.reject("frozen")
 
         sum_fees, num_hops = cost_from_start_to_node
 
         if num_hops + 1 > self.max_hops:
-            return None
+            return self.reject("max_hops")
 
         # fee computation has been inlined here, since the comment in
         # Graph._get_fee suggests it should be as fast as possible. This means
@@ -260,11 +321,8 @@ class SenderPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         # method this means that the payment is done from dst to node, i.e. the
         # order of arguments node and dst is reversed in the following code
 
-        pre_balance = balance_with_interests(
-            get_balance(edge_data, dst, node),
-            get_interest_rate(edge_data, dst, node),
-            get_interest_rate(edge_data, node, dst),
-            self.timestamp - get_mtime(edge_data),
+        pre_balance = balance_with_interests_snapshot(
+            data, edge_data, dst, node, self.timestamp, self.balance_cache
         )
 
         if num_hops == 0:
@@ -278,16 +336,25 @@ class SenderPaysCostAccumulatorSnapshot(alg.CostAccumulator):
             )
 
         if sum_fees + fee > self.max_fees:
-            return None
+            return self.reject("max_fees")
 
         # check that we don't exceed the creditline
-        capacity = pre_balance + get_creditline(edge_data, node, dst)
+        capacity = pre_balance + data.get_creditline(edge_data, node, dst)
         if self.value + sum_fees + fee > capacity:
             # creditline exceeded
-            return None
+            return self.reject("capacity")
 
         return self.Cost(fees=sum_fees + fee, num_hops=num_hops + 1)
 
+    def estimate_cost_to_target(self, cost_from_start_to_node, min_hops_to_target):
+        if min_hops_to_target == math.inf:
+            return None
+        # We do not drop paths exceeding max_hops here. Their cost may still
+        # keep a more expensive path from being used, exactly as it does
+        # without the estimate.
+        sum_fees, num_hops = cost_from_start_to_node
+        return self.Cost(fees=sum_fees, num_hops=num_hops + min_hops_to_target)
+
 
 class ReceiverPaysCostAccumulatorSnapshot(alg.CostAccumulator):
     """This is the CostAccumulator being used when using our 'receiver pays
@@ -318,6 +385,8 @@ class ReceiverPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         max_hops=None,
         max_fees=None,
         ignore=None,
+        trustline_data=trustline_data,
+        balance_cache: Dict = None,
     ):
         if max_hops is None:
             max_hops = math.inf
@@ -330,6 +399,10 @@ class ReceiverPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         self.max_hops = max_hops
         self.max_fees = max_fees
         self.ignore = ignore
+        self.trustline_data = trustline_data
+        # the balances only depend on the timestamp, so they can be reused for
+        # the whole search
+        self.balance_cache = {} if balance_cache is None else balance_cache
 
     def zero(self):
         return self.Cost(0, 0, 0)
@@ -338,9 +411,10 @@ class ReceiverPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         self, cost_from_start_to_node: Cost, node, dst, edge_data
     ):
         if dst == self.ignore or node == self.ignore:
-            return None
-        if get_is_frozen(edge_data):
-            return None
+            return self.reject("ignored")
+        data = self.trustline_data
+        if data.get_is_frozen(edge_data):
+            return self.reject("frozen")
 
         # For this case the pathfinding is not done in reverse.
         #
@@ -352,13 +426,10 @@ class ReceiverPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         sum_fees, num_hops, previous_hop_fee = cost_from_start_to_node
 
         if num_hops + 1 > self.max_hops:
-            return None
+            return self.reject("max_hops")
 
-        pre_balance = balance_with_interests(
-            get_balance(edge_data, node, dst),
-            get_interest_rate(edge_data, node, dst),
-            get_interest_rate(edge_data, dst, node),
-            self.timestamp - get_mtime(edge_data),
+        pre_balance = balance_with_interests_snapshot(
+            data, edge_data, node, dst, self.timestamp, self.balance_cache
         )
 
         fee = calculate_fees(
@@ -369,13 +440,13 @@ class ReceiverPaysCostAccumulatorSnapshot(alg.CostAccumulator):
         )
 
         if sum_fees + previous_hop_fee > self.max_fees:
-            return None
+            return self.reject("max_fees")
 
         # check that we don't exceed the creditline
-        capacity = pre_balance + get_creditline(edge_data, dst, node)
+        capacity = pre_balance + data.get_creditline(edge_data, dst, node)
         if self.value - sum_fees - previous_hop_fee > capacity:
             # creditline exceeded
-            return None
+            return self.reject("capacity")
 
         return self.Cost(
             fees=sum_fees + previous_hop_fee,
@@ -383,6 +454,17 @@ class ReceiverPaysCostAccumulatorSnapshot(alg.CostAccumulator):
             previous_hop_fee=fee,
         )
 
+    def estimate_cost_to_target(self, cost_from_start_to_node, min_hops_to_target):
+        if min_hops_to_target == math.inf:
+            return None
+        if min_hops_to_target == 0:
+            return cost_from_start_to_node
+        # nothing can be said about the fee for the last hop
+        sum_fees, num_hops, _ = cost_from_start_to_node
+        return self.Cost(
+            fees=sum_fees, num_hops=num_hops + min_hops_to_target, previous_hop_fee=0
+        )
+
 
 class SenderPaysCapacityAccumulator(alg.CostAccumulator):
     """This is being used to find a path with the maximum capacity
@@ -403,25 +485,37 @@ class SenderPaysCapacityAccumulator(alg.CostAccumulator):
         num_hops: int
         previous_hop_fee: int
 
-    def __init__(self, *, timestamp, capacity_imbalance_fee_divisor, max_hops=None):
+    def __init__(
+        self,
+        *,
+        timestamp,
+        capacity_imbalance_fee_divisor,
+        max_hops=None,
+        trustline_data=trustline_data,
+        balance_cache: Dict = None,
+    ):
         if max_hops is None:
             max_hops = math.inf
         self.max_hops = max_hops
         self.timestamp = timestamp
         self.capacity_imbalance_fee_divisor = capacity_imbalance_fee_divisor
+        self.trustline_data = trustline_data
+        self.balance_cache = {} if balance_cache is None else balance_cache
 
     def get_balance(self, node, dst, edge_data):
-        return balance_with_interests(
-            get_balance(edge_data, node, dst),
-            get_interest_rate(edge_data, node, dst),
-            get_interest_rate(edge_data, dst, node),
-            self.timestamp - get_mtime(edge_data),
+        return balance_with_interests_snapshot(
+            self.trustline_data,
+            edge_data,
+            node,
+            dst,
+            self.timestamp,
+            self.balance_cache,
         )
 
     def get_capacity(self, node, dst, edge_data):
-        return self.get_balance(node, dst, edge_data) + get_creditline(
-            edge_data, dst, node
-        )
+        return self.get_balance(
+            node, dst, edge_data
+        ) + self.trustline_data.get_creditline(edge_data, dst, node)
 
     def zero(self):
         # We use (- capacity, num_hops, last_hop_fee) as cost
@@ -431,27 +525,28 @@ class SenderPaysCapacityAccumulator(alg.CostAccumulator):
     def total_cost_from_start_to_dst(
         self, cost_from_start_to_node: Cost, node, dst, edge_data
     ):
-        if get_is_frozen(edge_data):
-            return None
+        if self.trustline_data.get_is_frozen(edge_data):
+            return self.reject("frozen")
 
         capacity_from_start_to_node = -cost_from_start_to_node.minus_capacity
         num_hops = cost_from_start_to_node.num_hops
         previous_hop_fee = cost_from_start_to_node.previous_hop_fee
 
         if num_hops + 1 > self.max_hops:
-            return None
+            return self.reject("max_hops")
 
+        balance = self.get_balance(node, dst, edge_data)
         capacity_this_edge = min(
-            self.get_capacity(node, dst, edge_data),
+            balance + self.trustline_data.get_creditline(edge_data, dst, node),
             capacity_from_start_to_node - previous_hop_fee,
         )
 
         if capacity_this_edge <= 0:
-            return None
+            return self.reject("capacity")
 
         fee = calculate_fees(
             imbalance_generated=imbalance_generated(
-                value=capacity_this_edge, balance=self.get_balance(node, dst, edge_data)
+                value=capacity_this_edge, balance=balance
             ),
             capacity_imbalance_fee_divisor=self.capacity_imbalance_fee_divisor,
         )
@@ -463,6 +558,106 @@ class SenderPaysCapacityAccumulator(alg.CostAccumulator):
         )
 
 
+class TransferredBalancesTrustlineData:
+    """trustline data accessor returning the balances after some planned
+    transfers instead of the stored ones
+
+    It wraps the accessor of a graph and is used to search paths as if the
+    planned transfers had already been done, without changing the graph. The
+    planned balances already include the interests up to the time of the
+    transfers, so the interest rates of the changed trustlines are returned as
+    0 to not apply them twice.
+    """
+
+    def __init__(self, trustline_data=trustline_data) -> None:
+        self.trustline_data = trustline_data
+        self.balances: Dict = {}
+
+    def get_balance(self, edge_data, user, counter_party):
+        balance = self.balances.get((user, counter_party))
+        if balance is None:
+            return self.trustline_data.get_balance(edge_data, user, counter_party)
+        return balance
+
+    def set_balance(self, user, counter_party, balance):
+        self.balances[user, counter_party] = balance
+        self.balances[counter_party, user] = -balance
+
+    def get_creditline(self, edge_data, user, counter_party):
+        return self.trustline_data.get_creditline(edge_data, user, counter_party)
+
+    def get_interest_rate(self, edge_data, user, counter_party):
+        if (user, counter_party) in self.balances:
+            return 0
+        return self.trustline_data.get_interest_rate(edge_data, user, counter_party)
+
+    def get_is_frozen(self, edge_data):
+        return self.trustline_data.get_is_frozen(edge_data)
+
+    def get_mtime(self, edge_data):
+        return self.trustline_data.get_mtime(edge_data)
+
+
+def _collects_search_statistics(query):
+    """decorator for the path queries of CurrencyNetworkGraph, which passes
+    them the alg.SearchStatistics to count their work in as stats
+
+    The statistics are added to the stats passed by the caller and to the
+    search_statistics of the graph, if it collects them.
+    """
+
+    @functools.wraps(query)
+    def collecting_query(self, *args, stats=None, **kwargs):
+        if stats is None and self.search_statistics is None:
+            return query(self, *args, stats=None, **kwargs)
+        query_stats = alg.SearchStatistics()
+        start = time.monotonic()
+        try:
+            return query(self, *args, stats=query_stats, **kwargs)
+        finally:
+            query_stats.queries = 1
+            query_stats.wall_time = time.monotonic() - start
+            for collected_stats in (stats, self.search_statistics):
+                if collected_stats is not None:
+                    collected_stats.add(query_stats)
+
+    return collecting_query
+
+
+# number of times a path query is started over after the graph changed while
+# it let other greenlets run, before it is run without letting them run
+max_graph_change_restarts = 3
+
+
+def _restarts_on_graph_change(query):
+    """decorator for the path queries of CurrencyNetworkGraph, which starts
+    them over when the graph changed while one of their searches let other
+    greenlets run, so that every result is computed on one state of the graph
+
+    A query given a balance_cache by its caller shares its state with it and
+    is not started over, its caller has to start over with a new cache.
+    """
+
+    @functools.wraps(query)
+    def restarting_query(self, *args, **kwargs):
+        if kwargs.get("balance_cache") is not None:
+            return query(self, *args, **kwargs)
+        for _ in range(max_graph_change_restarts):
+            try:
+                return query(self, *args, **kwargs)
+            except alg.GraphChangedException:
+                pass
+        # no other greenlet runs while yielding is disabled, so that it cannot
+        # affect their searches
+        self._yielding_disabled = True
+        try:
+            return query(self, *args, **kwargs)
+        finally:
+            self._yielding_disabled = False
+
+    return restarting_query
+
+
 class CurrencyNetworkGraph(object):
     """The whole graph of a Token Network"""
 
@@ -472,19 +667,86 @@ class CurrencyNetworkGraph(object):
         default_interest_rate=0,
         custom_interests=False,
         prevent_mediator_interests=False,
+        compact_graph=False,
+        num_landmarks=0,
+        path_cache_size=0,
+        max_expansions=None,
+        yield_every=None,
+        collect_statistics=False,
     ):
+        """compact_graph selects the storage of the trustlines: a networkx.Graph
+        with one dict per trustline or the array backed CompactGraph, which uses
+        a lot less memory on big networks.
+
+        num_landmarks is the number of landmarks used to direct the search for
+        transfer paths towards the target, 0 disables the goal directed search.
+
+        path_cache_size is the number of transfer paths kept in a cache, 0
+        disables the cache.
+
+        max_expansions limits the number of nodes a path query may expand,
+        yield_every makes the searches let other greenlets run every yield_every
+        expanded nodes. None disables them, see alg.ExpansionBudget.
+
+        collect_statistics enables counting the work done by all path queries
+        in search_statistics. The path queries also take a stats argument to
+        get the statistics of a single query.
+        """
 
         self.capacity_imbalance_fee_divisor = capacity_imbalance_fee_divisor
         self.default_interest_rate = default_interest_rate
         self.custom_interests = custom_interests
         self.prevent_mediator_interests = prevent_mediator_interests
-        self.graph = nx.Graph()
+        self.compact_graph = compact_graph
+        self.graph = self._new_graph_storage()
+        self._components = ComponentIndex()
+        self._account_sums = AccountSums()
+        self._user_networks_index: Optional[UserNetworksIndex] = None
+        self._network_address: Optional[str] = None
+        self.num_landmarks = num_landmarks
+        self._landmarks = None
+        self.path_cache = PathCache(path_cache_size)
+        self.max_expansions = max_expansions
+        self.yield_every = yield_every
+        self._yielding_disabled = False
+        self.search_statistics: Optional[alg.SearchStatistics] = (
+            alg.SearchStatistics() if collect_statistics else None
+        )
+        self.last_full_sync_drift: Optional[int] = None
+
+    def track_users(
+        self, user_networks_index: UserNetworksIndex, network_address: str
+    ) -> None:
+        """keep user_networks_index up to date with the users of this graph"""
+        self._user_networks_index = user_networks_index
+        self._network_address = network_address
+        user_networks_index.replace_users(
+            network_address, [], self._account_sums.users()
+        )
+
+    def _update_user_networks_index(self, *users) -> None:
+        if self._user_networks_index is None:
+            return
+        for user in users:
+            if self._account_sums.has_user(user):
+                self._user_networks_index.add(user, self._network_address)
+            else:
+                self._user_networks_index.remove(user, self._network_address)
+
+    def _new_graph_storage(self):
+        return CompactGraph() if self.compact_graph else nx.Graph()
 
     def gen_network(self, trustlines: Iterable[Any]):
-        self.graph.clear()
+        """replace all trustlines with the given ones
+
+        The new graph is built separately and then replaces the old one at
+        once, so that readers never see a partially built graph. Readers still
+        using the old graph keep a complete snapshot of it.
+        """
+        graph = self._new_graph_storage()
         for trustline in trustlines:
             assert trustline.user < trustline.counter_party
-            self.graph.add_edge(
+            graph.add_edge(
                 trustline.user,
                 trustline.counter_party,
                 creditline_ab=trustline.creditline_given,
@@ -495,6 +757,89 @@ class CurrencyNetworkGraph(object):
                 m_time=trustline.m_time,
                 balance_ab=trustline.balance,
             )
+        old_account_sums = self._account_sums
+        self.graph = graph
+        self._components = ComponentIndex(graph)
+        self._account_sums = AccountSums(graph)
+        if self._user_networks_index is not None:
+            self._user_networks_index.replace_users(
+                self._network_address,
+                old_account_sums.users(),
+                self._account_sums.users(),
+            )
+        self._landmarks = None
+        self.path_cache.clear()
+
+    def reconcile_network(self, trustlines: Iterable[Any]) -> int:
+        """bring the graph to the state of the given trustlines like gen_network,
+        but only update the trustlines that differ from it
+
+        returns the number of trustlines that have been updated or removed
+        """
+        drift = 0
+        trustline_keys = set()
+        for trustline in trustlines:
+            assert trustline.user < trustline.counter_party
+            trustline_keys.add((trustline.user, trustline.counter_party))
+            if self._is_up_to_date(trustline):
+                continue
+            drift += 1
+            # update the balance first, so that update_trustline can decide
+            # whether the trustline is closed based on the complete state
+            self.update_balance(
+                trustline.user,
+                trustline.counter_party,
+                trustline.balance,
+                timestamp=trustline.m_time,
+            )
+            self.update_trustline(
+                trustline.user,
+                trustline.counter_party,
+                trustline.creditline_given,
+                trustline.creditline_received,
+                interest_rate_given=trustline.interest_rate_given,
+                interest_rate_received=trustline.interest_rate_received,
+                is_frozen=trustline.is_frozen,
+            )
+
+        for a, b in list(self.graph.edges()):
+            if (min(a, b), max(a, b)) not in trustline_keys:
+                drift += 1
+                self.remove_trustline(a, b)
+
+        if not self._components.is_exact:
+            # removed trustlines may have split components
+            self._components = ComponentIndex(self.graph)
+
+        self.last_full_sync_drift = drift
+        return drift
+
+    def _is_up_to_date(self, trustline) -> bool:
+        if not self.graph.has_edge(trustline.user, trustline.counter_party):
+            # closed trustlines are not part of the graph
+            return (
+                trustline.balance
+                == trustline.creditline_given
+                == trustline.creditline_received
+                == trustline.interest_rate_given
+                == trustline.interest_rate_received
+                == 0
+            )
+        account = Account(
+            self.graph[trustline.user][trustline.counter_party],
+            trustline.user,
+            trustline.counter_party,
+        )
+        return (
+            account.creditline == trustline.creditline_given
+            and account.reverse_creditline == trustline.creditline_received
+            and account.interest_rate == trustline.interest_rate_given
+            and account.reverse_interest_rate == trustline.interest_rate_received
+            and account.is_frozen == trustline.is_frozen
+            and account.balance == trustline.balance
+            # the modification time does not matter without a balance
+            and (account.balance == 0 or account.m_time == trustline.m_time)
+        )
 
     @classmethod
     def from_config(cls, config: NetworkGraphConfig):
@@ -506,12 +851,20 @@ class CurrencyNetworkGraph(object):
 
     @property
     def users(self):
-        return list(self.graph.nodes())
+        return list(self._account_sums.users())
+
+    @property
+    def num_users(self) -> int:
+        return self._account_sums.num_users
+
+    @property
+    def num_trustlines(self) -> int:
+        return self._account_sums.num_trustlines
 
     @property
     def money_created(self):
         # does not include interests
-        return sum([abs(edge[2]) for edge in self.graph.edges(data=balance_ab)])
+        return self._account_sums.money_created
 
     @property
     def has_interests(self) -> bool:
@@ -519,9 +872,7 @@ class CurrencyNetworkGraph(object):
 
     @property
     def total_creditlines(self):
-        return sum([edge[2] for edge in self.graph.edges(data=creditline_ab)]) + sum(
-            [edge[2] for edge in self.graph.edges(data=creditline_ba)]
-        )
+        return self._account_sums.total_creditlines
 
     def get_friends(self, address):
         if address in self.graph:
@@ -540,7 +891,10 @@ class CurrencyNetworkGraph(object):
         is_frozen: bool = False,
     ):
         """to update the creditlines, used to react on changes on the blockchain"""
+        self.path_cache.invalidate_trustline(creditor, debtor)
         if not self.graph.has_edge(creditor, debtor):
+            self._add_edge_to_landmarks(creditor, debtor)
+            self._components.add_edge(creditor, debtor)
             self.graph.add_edge(
                 creditor,
                 debtor,
@@ -552,25 +906,33 @@ class CurrencyNetworkGraph(object):
                 m_time=0,
                 balance_ab=0,
             )
-        account = Account(self.graph[creditor][debtor], creditor, debtor)
-        account.creditline = creditline_given
-        account.reverse_creditline = creditline_received
-
-        if interest_rate_given is not None:
-            account.interest_rate = interest_rate_given
-        elif self.custom_interests:
-            raise RuntimeError(
-                "Not interests specified even though custom interests are enabled"
+            self._account_sums.add_trustline(
+                creditor, debtor, self.graph[creditor][debtor]
             )
-
-        if interest_rate_received is not None:
-            account.reverse_interest_rate = interest_rate_received
-        elif self.custom_interests:
-            raise RuntimeError(
-                "Not interests specified even though custom interests are enabled"
-            )
-
-        account.is_frozen = is_frozen
+            self._update_user_networks_index(creditor, debtor)
+        account = Account(self.graph[creditor][debtor], creditor, debtor)
+        self._account_sums.remove_trustline(creditor, debtor, account.data)
+        try:
+            account.creditline = creditline_given
+            account.reverse_creditline = creditline_received
+
+            if interest_rate_given is not None:
+                account.interest_rate = interest_rate_given
+            elif self.custom_interests:
+                raise RuntimeError(
+                    "Not interests specified even though custom interests are enabled"
+                )
+
+            if interest_rate_received is not None:
+                account.reverse_interest_rate = interest_rate_received
+            elif self.custom_interests:
+                raise RuntimeError(
+                    "Not interests specified even though custom interests are enabled"
+                )
+
+            account.is_frozen = is_frozen
+        finally:
+            self._account_sums.add_trustline(creditor, debtor, account.data)
 
         if account.can_be_closed():
             self.remove_trustline(creditor, debtor)
@@ -583,7 +945,10 @@ class CurrencyNetworkGraph(object):
     def update_balance(self, a: str, b: str, balance: int, timestamp: int = None):
         """to update the balance, used to react on changes on the blockchain
         the last modification time of the balance is also updated to keep track of the interests"""
+        self.path_cache.invalidate_trustline(a, b)
         if not self.graph.has_edge(a, b):
+            self._add_edge_to_landmarks(a, b)
+            self._components.add_edge(a, b)
             self.graph.add_edge(
                 a,
                 b,
@@ -595,8 +960,12 @@ class CurrencyNetworkGraph(object):
                 m_time=0,
                 balance_ab=0,
             )
+            self._account_sums.add_trustline(a, b, self.graph[a][b])
+            self._update_user_networks_index(a, b)
         account = Account(self.graph[a][b], a, b)
+        self._account_sums.remove_trustline(a, b, account.data)
         account.balance = balance
+        self._account_sums.add_trustline(a, b, account.data)
         if timestamp is not None:
             account.m_time = timestamp
         elif self.has_interests:
@@ -607,12 +976,16 @@ class CurrencyNetworkGraph(object):
             self.remove_trustline(a, b)
 
     def remove_trustline(self, a, b):
+        self.path_cache.invalidate_trustline(a, b)
+        self._account_sums.remove_trustline(a, b, self.graph[a][b])
         self.graph.remove_edge(a, b)
+        self._components.remove_edge(a, b)
+        self._update_user_networks_index(a, b)
 
-        if len(self.graph.edges(a)) == 0:
+        if self.graph.degree(a) == 0:
             self.graph.remove_node(a)
 
-        if len(self.graph.edges(b)) == 0:
+        if self.graph.degree(b) == 0:
             self.graph.remove_node(b)
 
     def get_account_sum(
@@ -624,24 +997,32 @@ class CurrencyNetworkGraph(object):
             return self.get_account_summary(user, counter_party, timestamp)
 
     def get_aggregated_account_summary(self, user, timestamp: int = 0):
-        aggregated_account_summary = AggregatedAccountSummary()
+        # gen_network may replace self.graph and self._account_sums
+        graph = self.graph
+        sums = self._account_sums.get(user)
+        aggregated_account_summary = AggregatedAccountSummary(
+            balance=sums.balance,
+            frozen_balance=sums.frozen_balance,
+            creditline_given=sums.creditline_given,
+            creditline_received=sums.creditline_received,
+        )
 
-        for counter_party in self.get_friends(user):
-            account = Account(self.graph[user][counter_party], user, counter_party)
+        # only the balances of trustlines with interests change over time
+        for counter_party in sums.interest_counter_parties:
+            account = Account(graph[user][counter_party], user, counter_party)
 
             unfrozen_balance = account.unfrozen_balance_with_interests(timestamp)
             balance = account.balance_with_interests(timestamp)
 
             aggregated_account_summary.balance += unfrozen_balance
             aggregated_account_summary.frozen_balance += balance - unfrozen_balance
-            aggregated_account_summary.creditline_given += account.creditline
-            aggregated_account_summary.creditline_received += account.reverse_creditline
 
         return aggregated_account_summary
 
     def get_account_summary(self, user, counter_party, timestamp):
-        if self.graph.has_edge(user, counter_party):
-            account = Account(self.graph[user][counter_party], user, counter_party)
+        graph = self.graph  # gen_network may replace self.graph
+        if graph.has_edge(user, counter_party):
+            account = Account(graph[user][counter_party], user, counter_party)
             return AccountSummary(
                 account.balance_with_interests(timestamp),
                 account.creditline,
@@ -659,12 +1040,17 @@ class CurrencyNetworkGraph(object):
         def mapping(address):
             return address[2:6] if len(address) > 6 else address[2:]
 
-        for u, v, d in self.graph.edges(data=True):
-            self.graph.node[u]["width"] = 0.6
-            self.graph.node[u]["height"] = 0.4
+        if self.compact_graph:
+            graph = self.graph.to_networkx()
+        else:
+            graph = self.graph
+
+        for u, v, d in graph.edges(data=True):
+            graph.node[u]["width"] = 0.6
+            graph.node[u]["height"] = 0.4
             d["color"] = "blue"
             d["len"] = 1.4
-        g = nx.relabel_nodes(self.graph, mapping)
+        g = nx.relabel_nodes(graph, mapping)
         a = nx.drawing.nx_agraph.to_agraph(g)
         a.graph_attr["label"] = "Trustlines Network"
         a.layout()
@@ -694,8 +1080,77 @@ class CurrencyNetworkGraph(object):
             )
         return output.getvalue()
 
+    def _pathfinding_graph(self):
+        """returns the graph to be passed to alg.least_cost_path together with
+        the trustline data accessor the cost accumulators have to use for it"""
+        if self.compact_graph:
+            search_view = self.graph.search_view()
+            return search_view, search_view.trustline_data
+        else:
+            return self.graph, trustline_data
+
+    def _new_expansion_budget(self) -> Optional[alg.ExpansionBudget]:
+        yield_every = None if self._yielding_disabled else self.yield_every
+        if self.max_expansions is None and yield_every is None:
+            return None
+        # the path cache changes its version on every change of the graph
+        return alg.ExpansionBudget(
+            self.max_expansions,
+            yield_every,
+            graph_version=lambda: self.path_cache.version,
+        )
+
+    def _connected(self, source, target) -> bool:
+        """returns False if there is no path between source and target for sure
+
+        The index of the components is rebuilt lazily after trustlines have
+        been removed, which may have split components.
+        """
+        if self._components.needs_rebuild(self.graph.number_of_edges()):
+            self._components = ComponentIndex(self.graph)
+        return self._components.connected(source, target)
+
+    def _add_edge_to_landmarks(self, a, b):
+        """to be called before a trustline between a and b is added, since new
+        edges can make the hop bounds invalid
+
+        The landmarks are only computed again if the new edge shortens a path
+        from one of them. The goal directed searches skipped nodes based on
+        the bounds, so their cached results can depend on trustlines anywhere
+        in the graph and are cleared in that case, too.
+        """
+        if self._landmarks is None or self._landmarks.add_edge(self.graph, a, b):
+            return
+        self._landmarks = None
+        self.path_cache.clear()
+
+    def _min_hops_to_target_function(self, target):
+        """returns a function computing a lower bound for the number of hops
+        from a node to target, or None if the goal directed search is disabled
+
+        The landmarks stay valid when trustlines are removed, since that can
+        only make paths longer. They are recomputed lazily after a new
+        trustline made paths from them shorter.
+        """
+        if self.num_landmarks <= 0:
+            return None
+        if self._landmarks is None:
+            self._landmarks = HopLandmarks(self.graph, self.num_landmarks)
+        return self._landmarks.lower_bound_function(target)
+
+    @_collects_search_statistics
+    @_restarts_on_graph_change
     def find_transfer_path_sender_pays_fees(
-        self, source, target, value=None, max_hops=None, max_fees=None, timestamp=0
+        self,
+        source,
+        target,
+        value=None,
+        max_hops=None,
+        max_fees=None,
+        timestamp=0,
+        balance_cache=None,
+        deadline=None,
+        stats=None,
     ):
 
         cost, path = self._find_transfer_path(
@@ -706,12 +1161,26 @@ class CurrencyNetworkGraph(object):
             max_fees=max_fees,
             timestamp=timestamp,
             cost_accumulator_function=SenderPaysCostAccumulatorSnapshot,
+            balance_cache=balance_cache,
+            deadline=deadline,
+            stats=stats,
         )
 
         return cost, list(reversed(path))
 
+    @_collects_search_statistics
+    @_restarts_on_graph_change
     def find_transfer_path_receiver_pays_fees(
-        self, source, target, value=None, max_hops=None, max_fees=None, timestamp=0
+        self,
+        source,
+        target,
+        value=None,
+        max_hops=None,
+        max_fees=None,
+        timestamp=0,
+        balance_cache=None,
+        deadline=None,
+        stats=None,
     ):
 
         return self._find_transfer_path(
@@ -722,8 +1191,310 @@ class CurrencyNetworkGraph(object):
             max_fees=max_fees,
             timestamp=timestamp,
             cost_accumulator_function=ReceiverPaysCostAccumulatorSnapshot,
+            balance_cache=balance_cache,
+            deadline=deadline,
+            stats=stats,
         )
 
+    @_restarts_on_graph_change
+    def find_transfer_paths(
+        self,
+        path_requests: Iterable[TransferPathRequest],
+        timestamp: int,
+        timeout_per_path: float = None,
+        deadline: float = None,
+        stats: alg.SearchStatistics = None,
+    ) -> List[Union[PaymentPath, Exception]]:
+        """find the paths for many transfers at once
+
+        All paths are computed for the same timestamp and the same state of
+        the graph, so that the balances with interests only have to be
+        computed once per trustline. The search for a single path is aborted
+        after timeout_per_path seconds, at the deadline of the whole batch or
+        when it exceeds the expansion budget and its result is the
+        TimeoutException or ExpansionBudgetExceededException. If the graph
+        changes while a search lets other greenlets run, all paths are
+        searched again. The work of all searches is counted in stats.
+        """
+        balance_cache: Dict = {}
+        payment_paths: List[Union[PaymentPath, Exception]] = []
+        for path_request in path_requests:
+            if path_request.fee_payer == FeePayer.SENDER:
+                find_transfer_path = self.find_transfer_path_sender_pays_fees
+            elif path_request.fee_payer == FeePayer.RECEIVER:
+                find_transfer_path = self.find_transfer_path_receiver_pays_fees
+            else:
+                raise ValueError(f"Unknown fee payer: {path_request.fee_payer}")
+
+            path_deadline = deadline
+            if timeout_per_path is not None:
+                path_deadline = time.monotonic() + timeout_per_path
+                if deadline is not None:
+                    path_deadline = min(path_deadline, deadline)
+
+            try:
+                cost, path = find_transfer_path(
+                    source=path_request.source,
+                    target=path_request.target,
+                    value=path_request.value,
+                    max_hops=path_request.max_hops,
+                    max_fees=path_request.max_fees,
+                    timestamp=timestamp,
+                    balance_cache=balance_cache,
+                    deadline=path_deadline,
+                    stats=stats,
+                )
+            except (TimeoutException, alg.ExpansionBudgetExceededException) as err:
+                payment_paths.append(err)
+            else:
+                payment_paths.append(
+                    PaymentPath(
+                        fee=cost,
+                        path=path,
+                        value=path_request.value,
+                        fee_payer=path_request.fee_payer,
+                    )
+                )
+        return payment_paths
+
+    @_collects_search_statistics
+    @_restarts_on_graph_change
+    def find_alternative_transfer_paths(
+        self,
+        source,
+        target,
+        value=None,
+        fee_payer: FeePayer = FeePayer.SENDER,
+        num_paths=1,
+        max_hops=None,
+        max_fees=None,
+        timestamp=0,
+        deadline=None,
+        stats=None,
+    ) -> List[PaymentPath]:
+        """find up to num_paths loop free paths for a transfer, sorted by
+        their fees and then by their number of hops
+
+        The first path is the one find_transfer_path_* returns, the others can
+        be used in case a transfer along it fails. All searches share the
+        balances with interests.
+        """
+        if value is None:
+            value = 1
+        if fee_payer == FeePayer.SENDER:
+            cost_accumulator_class = SenderPaysCostAccumulatorSnapshot
+            # we are searching paths from target to source, to accumulate fees correctly.
+            search_source, search_target = target, source
+        elif fee_payer == FeePayer.RECEIVER:
+            cost_accumulator_class = ReceiverPaysCostAccumulatorSnapshot
+            search_source, search_target = source, target
+        else:
+            raise ValueError(f"Unknown fee payer: {fee_payer}")
+        if not self._connected(source, target):
+            return []
+
+        graph, graph_trustline_data = self._pathfinding_graph()
+        cost_accumulator = cost_accumulator_class(
+            timestamp=timestamp,
+            value=value,
+            capacity_imbalance_fee_divisor=self.capacity_imbalance_fee_divisor,
+            max_hops=max_hops,
+            max_fees=max_fees,
+            trustline_data=graph_trustline_data,
+        )
+        paths = alg.k_least_cost_paths(
+            graph=graph,
+            source=search_source,
+            target=search_target,
+            cost_accumulator=cost_accumulator,
+            k=num_paths,
+            min_hops_to_target=self._min_hops_to_target_function(search_target),
+            deadline=deadline,
+            budget=self._new_expansion_budget(),
+            stats=stats,
+        )
+
+        payment_paths = []
+        for cost, path in paths:
+            if fee_payer == FeePayer.SENDER:
+                path = list(reversed(path))
+            payment_paths.append(
+                PaymentPath(fee=cost[0], path=path, value=value, fee_payer=fee_payer)
+            )
+        return payment_paths
+
+    @_collects_search_statistics
+    @_restarts_on_graph_change
+    def find_split_transfer_paths(
+        self,
+        source,
+        target,
+        value,
+        fee_payer: FeePayer = FeePayer.SENDER,
+        max_paths=1,
+        max_hops=None,
+        max_fees=None,
+        timestamp=0,
+        deadline=None,
+        stats=None,
+    ) -> List[PaymentPath]:
+        """find paths to transfer value from source to target split over up to
+        max_paths paths
+
+        This is used for transfers that are too big for any single path. The
+        paths are searched one after another, each for as much of the remaining
+        value as the path with the maximum capacity can carry. Every path is
+        searched as if the transfers along the paths found before had already
+        been done, so that paths sharing a trustline do not use its capacity
+        twice and the fees are computed for the changed balances.
+
+        max_hops applies to every path, max_fees to the sum of all fees.
+        Returns an empty list if value can not be transferred.
+        """
+        if fee_payer == FeePayer.SENDER:
+            cost_accumulator_class = SenderPaysCostAccumulatorSnapshot
+        elif fee_payer == FeePayer.RECEIVER:
+            cost_accumulator_class = ReceiverPaysCostAccumulatorSnapshot
+        else:
+            raise ValueError(f"Unknown fee payer: {fee_payer}")
+        if not self._connected(source, target):
+            return []
+
+        graph, graph_trustline_data = self._pathfinding_graph()
+        transferred_balances = TransferredBalancesTrustlineData(graph_trustline_data)
+        budget = self._new_expansion_budget()
+        balance_cache: Dict = {}
+        payment_paths: List[PaymentPath] = []
+        remaining_value = value
+        sum_fees = 0
+        while remaining_value > 0 and len(payment_paths) < max_paths:
+            capacity_accumulator = SenderPaysCapacityAccumulator(
+                timestamp=timestamp,
+                capacity_imbalance_fee_divisor=self.capacity_imbalance_fee_divisor,
+                max_hops=max_hops,
+                trustline_data=transferred_balances,
+                balance_cache=balance_cache,
+            )
+            try:
+                cost, _ = alg.least_cost_path(
+                    graph=graph,
+                    starting_nodes={source},
+                    target_nodes={target},
+                    cost_accumulator=capacity_accumulator,
+                    deadline=deadline,
+                    budget=budget,
+                    stats=stats,
+                )
+            except nx.NetworkXNoPath:
+                break
+
+            # the capacity is only an estimate, since the fees can not be
+            # computed exactly from it. Try smaller values if it is too high.
+            path_value = min(remaining_value, -cost.minus_capacity)
+            while path_value > 0:
+                cost_accumulator = cost_accumulator_class(
+                    timestamp=timestamp,
+                    value=path_value,
+                    capacity_imbalance_fee_divisor=self.capacity_imbalance_fee_divisor,
+                    max_hops=max_hops,
+                    max_fees=None if max_fees is None else max_fees - sum_fees,
+                    trustline_data=transferred_balances,
+                    balance_cache=balance_cache,
+                )
+                try:
+                    path = self._find_planned_path(
+                        graph,
+                        source,
+                        target,
+                        cost_accumulator,
+                        deadline,
+                        budget,
+                        stats,
+                    )
+                except nx.NetworkXNoPath:
+                    path_value //= 2
+                else:
+                    break
+            if path_value == 0:
+                break
+
+            fees = self._plan_transfer(
+                graph, path, cost_accumulator, transferred_balances, balance_cache
+            )
+            payment_paths.append(
+                PaymentPath(fee=fees, path=path, value=path_value, fee_payer=fee_payer)
+            )
+            remaining_value -= path_value
+            sum_fees += fees
+
+        if remaining_value > 0:
+            return []
+        return payment_paths
+
+    def _find_planned_path(
+        self, graph, source, target, cost_accumulator, deadline, budget, stats
+    ):
+        if isinstance(cost_accumulator, SenderPaysCostAccumulatorSnapshot):
+            # search from target to source, to accumulate the fees correctly
+            _, path = alg.least_cost_path(
+                graph=graph,
+                starting_nodes={target},
+                target_nodes={source},
+                cost_accumulator=cost_accumulator,
+                min_hops_to_target=self._min_hops_to_target_function(source),
+                deadline=deadline,
+                budget=budget,
+                stats=stats,
+            )
+            return list(reversed(path))
+        else:
+            _, path = alg.least_cost_path(
+                graph=graph,
+                starting_nodes={source},
+                target_nodes={target},
+                cost_accumulator=cost_accumulator,
+                min_hops_to_target=self._min_hops_to_target_function(target),
+                deadline=deadline,
+                budget=budget,
+                stats=stats,
+            )
+            return path
+
+    @staticmethod
+    def _plan_transfer(
+        graph, path, cost_accumulator, transferred_balances, balance_cache
+    ) -> int:
+        """change the balances of transferred_balances like the transfer of
+        cost_accumulator.value along path and return its fees"""
+        value = cost_accumulator.value
+        timestamp = cost_accumulator.timestamp
+        sender_pays = isinstance(cost_accumulator, SenderPaysCostAccumulatorSnapshot)
+        search_path = list(reversed(path)) if sender_pays else path
+
+        cost = cost_accumulator.zero()
+        for node, dst in zip(search_path, search_path[1:]):
+            edge_data = graph.get_edge_data(node, dst)
+            cost = cost_accumulator.total_cost_from_start_to_dst(
+                cost, node, dst, edge_data
+            )
+            assert cost is not None
+            if sender_pays:
+                # dst pays node the value and the fees of the following hops
+                payer, receiver, transferred = dst, node, value + cost.fees
+            else:
+                # node pays dst the value without the fees of the previous hops
+                payer, receiver, transferred = node, dst, value - cost.fees
+            pre_balance = balance_with_interests_snapshot(
+                transferred_balances,
+                edge_data,
+                payer,
+                receiver,
+                timestamp,
+                balance_cache,
+            )
+            transferred_balances.set_balance(payer, receiver, pre_balance - transferred)
+        return cost.fees
+
     def _find_transfer_path(
         self,
         *,
@@ -734,36 +1505,90 @@ class CurrencyNetworkGraph(object):
         max_fees=None,
         timestamp=0,
         cost_accumulator_function,
+        balance_cache=None,
+        deadline=None,
+        stats=None,
     ):
 
         if value is None:
             value = 1
 
+        if not self._connected(source, target):
+            return 0, []
+
+        if self.path_cache.enabled:
+            # without interests the balances do not depend on the timestamp
+            cache_key = (
+                cost_accumulator_function,
+                source,
+                target,
+                value,
+                max_hops,
+                max_fees,
+                timestamp if self.has_interests else None,
+            )
+            cached_result = self.path_cache.get(cache_key)
+            if cached_result is not None:
+                cost, path = cached_result
+                return cost, list(path)
+            reached_nodes: Optional[set] = set()
+            path_cache_version = self.path_cache.version
+        else:
+            reached_nodes = None
+
+        graph, graph_trustline_data = self._pathfinding_graph()
         cost_accumulator = cost_accumulator_function(
             timestamp=timestamp,
             value=value,
             capacity_imbalance_fee_divisor=self.capacity_imbalance_fee_divisor,
             max_hops=max_hops,
             max_fees=max_fees,
+            trustline_data=graph_trustline_data,
+            balance_cache=balance_cache,
         )
 
         try:
             cost, path = alg.least_cost_path(
-                graph=self.graph,
+                graph=graph,
                 starting_nodes={source},
                 target_nodes={target},
                 cost_accumulator=cost_accumulator,
+                min_hops_to_target=self._min_hops_to_target_function(target),
+                deadline=deadline,
+                budget=self._new_expansion_budget(),
+                stats=stats,
+                reached_nodes=reached_nodes,
             )
         except (
             nx.NetworkXNoPath,
             # key error if source or target is not in graph
             KeyError,
         ):
-            return 0, []
-        return cost[0], list(path)
+            result = 0, ()
+        else:
+            result = cost[0], tuple(path)
+
+        if reached_nodes is not None:
+            # source and target may not be part of the graph yet
+            self.path_cache.put(
+                cache_key,
+                result,
+                reached_nodes | {source, target},
+                version=path_cache_version,
+            )
+        return result[0], list(result[1])
 
+    @_collects_search_statistics
+    @_restarts_on_graph_change
     def close_trustline_path_triangulation(
-        self, timestamp, source, target, max_hops=None, max_fees=None
+        self,
+        timestamp,
+        source,
+        target,
+        max_hops=None,
+        max_fees=None,
+        deadline=None,
+        stats=None,
     ):
 
         neighbors = {x[0] for x in self.graph.adj[source].items()} - {target}
@@ -796,6 +1621,7 @@ class CurrencyNetworkGraph(object):
             fee_payer = FeePayer.RECEIVER
             cost_accumulator_class = ReceiverPaysCostAccumulatorSnapshot
 
+        graph, graph_trustline_data = self._pathfinding_graph()
         cost_accumulator = cost_accumulator_class(
             timestamp=timestamp,
             value=value,
@@ -803,16 +1629,20 @@ class CurrencyNetworkGraph(object):
             max_hops=max_hops,
             max_fees=max_fees,
             ignore=source,
+            trustline_data=graph_trustline_data,
         )
 
         try:
             # can't use the cost as returned by alg.least_cost_path since it
             # doesn't include the source node at the beginning and end
             _, path = alg.least_cost_path(
-                graph=self.graph,
+                graph=graph,
                 starting_nodes={target},
                 target_nodes=neighbors,
                 cost_accumulator=cost_accumulator,
+                deadline=deadline,
+                budget=self._new_expansion_budget(),
+                stats=stats,
             )
             path = [source] + path + [source]
             cost_accumulator.ignore = (
@@ -821,7 +1651,7 @@ class CurrencyNetworkGraph(object):
             cost_accumulator.max_hops = (
                 math.inf
             )  # don't check max_hops, we know we're below
-            cost = cost_accumulator.compute_cost_for_path(self.graph, path)
+            cost = cost_accumulator.compute_cost_for_path(graph, path)
 
         except nx.NetworkXNoPath:
             return PaymentPath(fee=0, path=[], value=value, fee_payer=FeePayer.SENDER)
@@ -831,7 +1661,18 @@ class CurrencyNetworkGraph(object):
 
         return PaymentPath(fee=cost[0], path=path, value=value, fee_payer=fee_payer)
 
-    def find_maximum_capacity_path(self, source, target, max_hops=None, timestamp=0):
+    @_collects_search_statistics
+    @_restarts_on_graph_change
+    def find_maximum_capacity_path(
+        self,
+        source,
+        target,
+        max_hops=None,
+        timestamp=0,
+        exact=False,
+        deadline=None,
+        stats=None,
+    ):
         """
         find a path probably with the maximum capacity to transfer from source to target
         The "imbalance_fee" function not being bijective, only an estimate of the fees can be found from "value + fee"
@@ -840,22 +1681,40 @@ class CurrencyNetworkGraph(object):
             source: source for the path
             target: target for the path
             max_hops: the maximum number of hops to find the path
+            exact: if True, the estimate is refined by searching sender pays
+                paths, so that the returned value is exactly the maximum that
+                can be sent with the fees paid by the sender
+            deadline: time as returned by time.monotonic after which the
+                search is aborted with a TimeoutException
 
         Returns:
             returns the value that can be send in the max capacity path and the path,
         """
+        if not self._connected(source, target):
+            return 0, []
+
+        graph, graph_trustline_data = self._pathfinding_graph()
+        # the balances only depend on the timestamp, so they are shared by all
+        # searches needed for the exact capacity
+        balance_cache: Dict = {}
+        budget = self._new_expansion_budget()
         capacity_accumulator = SenderPaysCapacityAccumulator(
             timestamp=timestamp,
             capacity_imbalance_fee_divisor=self.capacity_imbalance_fee_divisor,
             max_hops=max_hops,
+            trustline_data=graph_trustline_data,
+            balance_cache=balance_cache,
         )
 
         try:
             cost, path = alg.least_cost_path(
-                graph=self.graph,
+                graph=graph,
                 starting_nodes={source},
                 target_nodes={target},
                 cost_accumulator=capacity_accumulator,
+                deadline=deadline,
+                budget=budget,
+                stats=stats,
             )
         except (
             nx.NetworkXNoPath,
@@ -863,7 +1722,117 @@ class CurrencyNetworkGraph(object):
         ):  # key error for if source or target is not in graph
             return 0, []
 
-        return -cost[0], list(path)
+        if not exact:
+            return -cost[0], list(path)
+        return self._find_exact_maximum_capacity_path(
+            graph,
+            graph_trustline_data,
+            source,
+            target,
+            estimate=-cost[0],
+            max_hops=max_hops,
+            timestamp=timestamp,
+            balance_cache=balance_cache,
+            deadline=deadline,
+            budget=budget,
+            stats=stats,
+        )
+
+    def _find_exact_maximum_capacity_path(
+        self,
+        graph,
+        graph_trustline_data,
+        source,
+        target,
+        *,
+        estimate,
+        max_hops,
+        timestamp,
+        balance_cache,
+        deadline,
+        budget,
+        stats,
+    ):
+        """find the maximum value that can be sent from source to target with
+        the sender paying the fees by bisection over the value
+
+        The estimate is usually off by about the fees only, so we first look for
+        an interval around it with exponentially growing steps and bisect it
+        afterwards. This only needs a few searches, which share the balances
+        in balance_cache.
+        """
+
+        def find_path(value):
+            cost_accumulator = SenderPaysCostAccumulatorSnapshot(
+                timestamp=timestamp,
+                value=value,
+                capacity_imbalance_fee_divisor=self.capacity_imbalance_fee_divisor,
+                max_hops=max_hops,
+                trustline_data=graph_trustline_data,
+                balance_cache=balance_cache,
+            )
+            try:
+                return self._find_planned_path(
+                    graph, source, target, cost_accumulator, deadline, budget, stats
+                )
+            except nx.NetworkXNoPath:
+                return None
+
+        # the whole value has to be transferred over one trustline of target
+        upper_bound = max(
+            balance_with_interests_snapshot(
+                graph_trustline_data,
+                edge_data,
+                neighbor,
+                target,
+                timestamp,
+                balance_cache,
+            )
+            + graph_trustline_data.get_creditline(edge_data, target, neighbor)
+            for neighbor, edge_data in graph.adj[target].items()
+        )
+        if self.capacity_imbalance_fee_divisor > 0:
+            step = estimate // self.capacity_imbalance_fee_divisor + 1
+        else:
+            step = 1
+
+        # invariant: lower can be sent along lower_path, upper can not be sent
+        estimate_path = find_path(estimate)
+        if estimate_path is not None:
+            lower, lower_path = estimate, estimate_path
+            while True:
+                upper = lower + step
+                if upper > upper_bound:
+                    upper = upper_bound + 1
+                    break
+                path = find_path(upper)
+                if path is None:
+                    break
+                lower, lower_path = upper, path
+                step *= 2
+        else:
+            upper = estimate
+            while True:
+                lower = upper - step
+                if lower <= 0:
+                    lower, lower_path = 0, []
+                    break
+                path = find_path(lower)
+                if path is not None:
+                    lower_path = path
+                    break
+                upper = lower
+                step *= 2
+
+        while upper - lower > 1:
+            middle = (lower + upper) // 2
+            path = find_path(middle)
+            if path is None:
+                upper = middle
+            else:
+                lower, lower_path = middle, path
+
+        return lower, lower_path
 
     def get_balances_along_path(self, path):
         balances = []
@@ -884,20 +1853,35 @@ class CurrencyNetworkGraphForTesting(CurrencyNetworkGraph):
         default_interest_rate=0,
         custom_interests=False,
         prevent_mediator_interests=False,
+        compact_graph=False,
+        num_landmarks=0,
+        path_cache_size=0,
+        max_expansions=None,
+        yield_every=None,
+        collect_statistics=False,
     ):
         super().__init__(
             capacity_imbalance_fee_divisor=capacity_imbalance_fee_divisor,
             default_interest_rate=default_interest_rate,
             custom_interests=custom_interests,
             prevent_mediator_interests=prevent_mediator_interests,
+            compact_graph=compact_graph,
+            num_landmarks=num_landmarks,
+            path_cache_size=path_cache_size,
+            max_expansions=max_expansions,
+            yield_every=yield_every,
+            collect_statistics=collect_statistics,
         )
 
     def freeze_trustline(self, creditor, debtor):
         if not self.graph.has_edge(creditor, debtor):
             raise ValueError("Trustlines does not exist.")
         else:
+            self.path_cache.invalidate_trustline(creditor, debtor)
             account = Account(self.graph[creditor][debtor], creditor, debtor)
+            self._account_sums.remove_trustline(creditor, debtor, account.data)
             account.is_frozen = True
+            self._account_sums.add_trustline(creditor, debtor, account.data)
 
     def transfer_path(self, path, value, expected_fees, timestamp=0):
         assert value > 0
@@ -917,7 +1901,10 @@ class CurrencyNetworkGraphForTesting(CurrencyNetworkGraph):
             if cost is None:
                 raise nx.NetworkXNoPath("no path found")
             new_balance = get_balance(edge_data, target, source) - value - cost[0]
+            self.path_cache.invalidate_trustline(source, target)
+            self._account_sums.remove_trustline(source, target, edge_data)
             set_balance(edge_data, target, source, new_balance)
+            self._account_sums.add_trustline(source, target, edge_data)
 
         assert expected_fees == cost[0]
         return cost[0]
@@ -48,12 +48,15 @@ def balance_with_interests(
 ) -> int:
     delta_time_in_seconds = _ensure_non_negative_delta_time(delta_time_in_seconds)
     if balance > 0:
-        interest = calculate_interests(
-            balance, internal_interest_rate_positive_balance, delta_time_in_seconds
-        )
+        internal_interest_rate = internal_interest_rate_positive_balance
+    else:
+        internal_interest_rate = internal_interest_rate_negative_balance
+    if balance == 0 or internal_interest_rate == 0 or delta_time_in_seconds == 0:
+        # calculate_interests would return 0
+        interest = 0
     else:
         interest = calculate_interests(
-            balance, internal_interest_rate_negative_balance, delta_time_in_seconds
+            balance, internal_interest_rate, delta_time_in_seconds
         )
     total = balance + interest
     assert isinstance(total, int)
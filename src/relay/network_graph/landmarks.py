@@ -0,0 +1,135 @@
+"""lower bounds on the number of hops between two users
+
+This implements the landmark part of the ALT (A*, landmarks, triangle
+inequality) technique. For a few landmark nodes we store the number of hops to
+every other node. The triangle inequality then gives a lower bound on the
+number of hops between any two nodes u and v:
+
+    hops(u, v) >= |hops(landmark, u) - hops(landmark, v)|
+
+The hop counts are computed from the topology of the graph only, i.e. they do
+not depend on balances, creditlines or frozen trustlines. Removing edges only
+increases the real number of hops, so the bounds stay valid after trustlines
+have been removed. Adding edges may invalidate them, see HopLandmarks.add_edge.
+"""
+import collections
+import math
+import operator
+from typing import Callable, Dict, List, Tuple
+
+
+def _hops_from(graph, source) -> Dict:
+    """breadth first search returning the number of hops from source to all
+    reachable nodes"""
+    hops = {source: 0}
+    queue = collections.deque([source])
+    while queue:
+        node = queue.popleft()
+        next_hops = hops[node] + 1
+        for neighbor in graph[node]:
+            if neighbor not in hops:
+                hops[neighbor] = next_hops
+                queue.append(neighbor)
+    return hops
+
+
+class HopLandmarks:
+    """Landmarks with their hop distances to all nodes of a graph
+
+    The landmarks are chosen with the 'farthest' strategy: the first landmark
+    is the node with the highest degree, every following one is the node
+    farthest away from all landmarks chosen so far. Nodes not reachable from
+    any landmark are preferred, so that every connected component gets a
+    landmark if possible.
+    """
+
+    def __init__(self, graph, num_landmarks: int) -> None:
+        self.landmarks: List = []
+        # for every node the number of hops to all landmarks, 0 for the
+        # landmarks in other connected components
+        self._hop_vectors: Dict[object, Tuple[int, ...]] = {}
+        # for every node the index of a landmark in its connected component
+        self._components: Dict[object, int] = {}
+
+        nodes = list(graph.nodes())
+        if not nodes or num_landmarks <= 0:
+            return
+
+        all_hops = []
+        min_hops_to_landmarks = dict.fromkeys(nodes, math.inf)
+        candidate = max(nodes, key=graph.degree)
+        while len(self.landmarks) < num_landmarks:
+            hops = _hops_from(graph, candidate)
+            for node in hops:
+                self._components.setdefault(node, len(self.landmarks))
+            self.landmarks.append(candidate)
+            all_hops.append(hops)
+            for node, num_hops in hops.items():
+                if num_hops < min_hops_to_landmarks[node]:
+                    min_hops_to_landmarks[node] = num_hops
+            candidate = max(min_hops_to_landmarks, key=min_hops_to_landmarks.get)
+            if min_hops_to_landmarks[candidate] == 0:
+                break  # all nodes are landmarks
+
+        for node in self._components:
+            self._hop_vectors[node] = tuple(hops.get(node, 0) for hops in all_hops)
+
+    def add_edge(self, graph, u, v) -> bool:
+        """update the hop counts for an edge between u and v, which is about
+        to be added to graph
+
+        Returns whether the hop counts are still exact. If not, the landmarks
+        have to be computed again. An edge between nodes whose hop counts to
+        every landmark differ by at most one does not shorten any path from a
+        landmark. A new node connected to a node reached by the landmarks
+        gets the hop counts of that node plus one.
+        """
+        u_vector = self._hop_vectors.get(u)
+        v_vector = self._hop_vectors.get(v)
+        if u_vector is None and v_vector is None:
+            # neither of them is reached by a landmark, not even afterwards
+            return True
+        if u_vector is not None and v_vector is not None:
+            return self._components[u] == self._components[v] and all(
+                abs(u_hops - v_hops) <= 1 for u_hops, v_hops in zip(u_vector, v_vector)
+            )
+
+        if u_vector is None:
+            new_node, node, vector = u, v, v_vector
+        else:
+            new_node, node, vector = v, u, u_vector
+        if graph.has_node(new_node):
+            # its trustlines would connect more nodes to the landmarks
+            return False
+        component = self._components[node]
+        self._components[new_node] = component
+        self._hop_vectors[new_node] = tuple(
+            hops + 1 if self._components[landmark] == component else 0
+            for hops, landmark in zip(vector, self.landmarks)
+        )
+        return True
+
+    def lower_bound(self, node, target) -> float:
+        """returns a lower bound for the number of hops between node and target
+
+        math.inf is returned if node and target are not connected at all.
+        """
+        return self.lower_bound_function(target)(node)
+
+    def lower_bound_function(self, target) -> Callable:
+        """returns a function computing lower_bound(node, target) for a fixed
+        target, which is faster than calling lower_bound for many nodes"""
+        components = self._components
+        hop_vectors = self._hop_vectors
+        target_component = components.get(target)
+        target_vector = hop_vectors.get(target)
+        sub = operator.sub
+
+        def lower_bound(node):
+            if components.get(node) != target_component:
+                return math.inf
+            if target_vector is None:
+                return 0  # neither node nor target is reachable by a landmark
+            return max(map(abs, map(sub, hop_vectors[node], target_vector)))
+
+        return lower_bound
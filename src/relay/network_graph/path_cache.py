@@ -0,0 +1,92 @@
+"""cache for the results of path searches
+
+A path search only ever looks at the trustlines of the nodes it reached. We
+therefore store the reached nodes together with every result and evict the
+result as soon as a trustline of one of these nodes changes.
+"""
+import collections
+from typing import Any, Dict, Hashable, Iterable, Set
+
+
+class PathCache:
+    """LRU cache of path search results, evicted when a trustline of one of
+    the nodes a search depended on changes
+
+    A max_size of 0 disables the cache.
+    """
+
+    def __init__(self, max_size: int = 0) -> None:
+        self.max_size = max_size
+        self._entries: collections.OrderedDict = collections.OrderedDict()
+        self._keys_by_node: Dict[Any, Set[Hashable]] = {}
+
+        self.hits = 0
+        self.misses = 0
+        # entries removed to make room for new ones
+        self.evictions = 0
+        # entries removed because a trustline they depend on changed
+        self.invalidations = 0
+        # changed on every change of the graph
+        self.version = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0
+
+    @property
+    def size(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None):
+        try:
+            result, _ = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return result
+
+    def put(self, key: Hashable, result, nodes: Iterable, version=None) -> None:
+        """store result, which stays valid until a trustline of one of nodes
+        changes
+
+        If version is given, result is only stored if the graph has not
+        changed since version has been read, i.e. while result was computed.
+        """
+        if not self.enabled:
+            return
+        if version is not None and version != self.version:
+            return
+        if key in self._entries:
+            self._remove(key)
+        nodes = frozenset(nodes)
+        self._entries[key] = (result, nodes)
+        for node in nodes:
+            self._keys_by_node.setdefault(node, set()).add(key)
+        while len(self._entries) > self.max_size:
+            oldest_key = next(iter(self._entries))
+            self._remove(oldest_key)
+            self.evictions += 1
+
+    def invalidate_trustline(self, a, b) -> None:
+        """remove all results, that may depend on the trustline between a and b"""
+        self.version += 1
+        keys = self._keys_by_node.get(a, set()) | self._keys_by_node.get(b, set())
+        for key in keys:
+            self._remove(key)
+        self.invalidations += len(keys)
+
+    def clear(self) -> None:
+        self.version += 1
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self._keys_by_node.clear()
+
+    def _remove(self, key: Hashable) -> None:
+        _, nodes = self._entries.pop(key)
+        for node in nodes:
+            keys = self._keys_by_node[node]
+            keys.discard(key)
+            if not keys:
+                del self._keys_by_node[node]
@@ -0,0 +1,40 @@
+"""index of the currency networks every user has trustlines in
+
+The graphs of the currency networks keep the index up to date whenever a user
+gets their first or loses their last trustline in a network, so that the
+networks of a user can be looked up without looking at the users of every
+network.
+"""
+from typing import Dict, Iterable, Set
+
+
+class UserNetworksIndex:
+    """maps every user to the addresses of the currency networks they are in"""
+
+    def __init__(self) -> None:
+        self._networks_of_user: Dict[str, Set[str]] = {}
+
+    def add(self, user: str, network_address: str) -> None:
+        self._networks_of_user.setdefault(user, set()).add(network_address)
+
+    def remove(self, user: str, network_address: str) -> None:
+        networks = self._networks_of_user.get(user)
+        if networks is None:
+            return
+        networks.discard(network_address)
+        if not networks:
+            del self._networks_of_user[user]
+
+    def replace_users(
+        self, network_address: str, old_users: Iterable, new_users: Iterable
+    ) -> None:
+        """replace the users of a network, e.g. when its graph was regenerated"""
+        old_users = set(old_users)
+        new_users = set(new_users)
+        for user in old_users - new_users:
+            self.remove(user, network_address)
+        for user in new_users - old_users:
+            self.add(user, network_address)
+
+    def get_networks(self, user: str) -> Set[str]:
+        return self._networks_of_user.get(user, set())
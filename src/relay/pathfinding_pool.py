@@ -0,0 +1,470 @@
+"""pool of worker processes searching paths in currency network graphs
+
+Path searches are CPU bound and never yield to the gevent hub, so a single
+expensive search blocks all other requests and the delivery of events. With a
+pool, the searches are done by worker processes instead, while the main process
+only waits for the results.
+
+Every worker holds a copy of all currency network graphs. The main process
+keeps its own graphs up to date as before and forwards every change to all
+workers. Changes and queries are sent to a worker through the same pipe, so a
+worker answers every query with all changes applied that were made before the
+query was sent.
+"""
+import itertools
+import logging
+import pickle
+import struct
+import sys
+import time
+from typing import Any, Dict, List, NamedTuple
+
+import gevent
+import gevent.event
+import gevent.lock
+import gevent.queue
+from gevent import subprocess
+
+from relay.concurrency_utils import TimeoutException
+from relay.network_graph.alg import SearchStatistics
+from relay.network_graph.graph import Account, CurrencyNetworkGraph
+
+logger = logging.getLogger("pathfinding_pool")
+
+# the path searches done by the workers
+QUERY_METHODS = (
+    "find_transfer_path_sender_pays_fees",
+    "find_transfer_path_receiver_pays_fees",
+    "find_alternative_transfer_paths",
+    "find_split_transfer_paths",
+    "close_trustline_path_triangulation",
+    "find_maximum_capacity_path",
+    "find_transfer_paths",
+)
+
+_length = struct.Struct("<Q")
+
+_CREATE = "create"
+_UPDATE = "update"
+_QUERY = "query"
+
+
+class PathfindingWorkerError(Exception):
+    """Exception to signal that a pathfinding worker stopped while searching"""
+
+    pass
+
+
+class TrustlineState(NamedTuple):
+    """the state of a trustline as expected by CurrencyNetworkGraph.gen_network"""
+
+    user: str
+    counter_party: str
+    creditline_given: int
+    creditline_received: int
+    interest_rate_given: int
+    interest_rate_received: int
+    is_frozen: bool
+    m_time: int
+    balance: int
+
+
+def _write_message(f, message) -> None:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    f.write(_length.pack(len(data)) + data)
+    f.flush()
+
+
+def _read_exactly(f, size: int) -> bytes:
+    chunks = []
+    while size > 0:
+        chunk = f.read(size)
+        if not chunk:
+            raise EOFError()
+        chunks.append(chunk)
+        size -= len(chunk)
+    return b"".join(chunks)
+
+
+def _read_message(f):
+    """read the next message from f, returns None if f is closed"""
+    try:
+        (size,) = _length.unpack(_read_exactly(f, _length.size))
+        return pickle.loads(_read_exactly(f, size))
+    except EOFError:
+        return None
+
+
+def get_trustline_states(graph: CurrencyNetworkGraph) -> List[TrustlineState]:
+    trustlines = []
+    for a, b, data in graph.graph.edges(data=True):
+        account = Account(data, a, b)
+        trustlines.append(
+            TrustlineState(
+                user=a,
+                counter_party=b,
+                creditline_given=account.creditline,
+                creditline_received=account.reverse_creditline,
+                interest_rate_given=account.interest_rate,
+                interest_rate_received=account.reverse_interest_rate,
+                is_frozen=account.is_frozen,
+                m_time=account.m_time,
+                balance=account.balance,
+            )
+        )
+    return trustlines
+
+
+class _Worker:
+    def __init__(self, pool: "PathfindingPool") -> None:
+        self.pool = pool
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "relay.pathfinding_pool"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+        self._write_lock = gevent.lock.Semaphore()
+        self.pending: Dict[int, gevent.event.AsyncResult] = {}
+        self.alive = True
+        self._reader = gevent.spawn(self._read_replies)
+
+    def send(self, message) -> None:
+        with self._write_lock:
+            try:
+                _write_message(self.process.stdin, message)
+            except BrokenPipeError:
+                # the worker stopped and will be replaced with a copy of the
+                # current graphs
+                self.alive = False
+
+    def _read_replies(self) -> None:
+        while True:
+            reply = _read_message(self.process.stdout)
+            if reply is None:
+                break
+            request_id, succeeded, result, stats = reply
+            async_result = self.pending.pop(request_id)
+            if succeeded:
+                async_result.set((result, stats))
+            else:
+                async_result.set_exception(result)
+            self.pool._release(self)
+        self.alive = False
+        for async_result in self.pending.values():
+            async_result.set_exception(
+                PathfindingWorkerError("Pathfinding worker stopped while searching")
+            )
+        self.pending.clear()
+        self.pool._replace(self)
+
+    def close(self) -> None:
+        self.alive = False
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+
+
+class PathfindingPool:
+    """a bounded pool of worker processes doing the path searches
+
+    Queries wait for a free worker and for its result until their deadline,
+    or until timeout seconds passed if no deadline is given, and raise a
+    TimeoutException afterwards.
+    """
+
+    def __init__(self, num_workers: int, timeout: float) -> None:
+        self.timeout = timeout
+        self._graphs: Dict[str, "PooledCurrencyNetworkGraph"] = {}
+        self._request_ids = itertools.count()
+        self._update_lock = gevent.lock.RLock()
+        self._closed = False
+        self._idle_workers: gevent.queue.Queue = gevent.queue.Queue()
+        self.workers = []
+        for _ in range(num_workers):
+            self._start_worker()
+
+    def _start_worker(self) -> None:
+        worker = _Worker(self)
+        self.workers.append(worker)
+        self._idle_workers.put(worker)
+
+    def _release(self, worker: _Worker) -> None:
+        if worker.alive:
+            self._idle_workers.put(worker)
+
+    def _replace(self, worker: _Worker) -> None:
+        """start a new worker for one that stopped, with all graphs copied"""
+        if self._closed or worker not in self.workers:
+            return
+        logger.error("Pathfinding worker stopped, starting a new one")
+        self.workers.remove(worker)
+        with self._update_lock:
+            new_worker = _Worker(self)
+            for address, graph in self._graphs.items():
+                new_worker.send((_CREATE, address, graph.config))
+                new_worker.send(
+                    (
+                        _UPDATE,
+                        address,
+                        "gen_network",
+                        (get_trustline_states(graph),),
+                        {},
+                    )
+                )
+            self.workers.append(new_worker)
+        self._idle_workers.put(new_worker)
+
+    def register_graph(self, address: str, graph: "PooledCurrencyNetworkGraph") -> None:
+        with self._update_lock:
+            self._graphs[address] = graph
+            for worker in self.workers:
+                worker.send((_CREATE, address, graph.config))
+
+    def update(self, address: str, method_name: str, args, kwargs) -> None:
+        """apply a change to the graph of address in all workers"""
+        with self._update_lock:
+            for worker in self.workers:
+                worker.send((_UPDATE, address, method_name, args, kwargs))
+
+    def query(
+        self,
+        address: str,
+        method_name: str,
+        args,
+        kwargs,
+        deadline: float = None,
+        stats: SearchStatistics = None,
+    ) -> Any:
+        """call the path search method_name on the graph of address in a worker
+        and return its result
+
+        If stats is given, the statistics of the search are added to it. If
+        the worker stops while searching, the search is tried once more by
+        another worker, before a PathfindingWorkerError is raised.
+        """
+        if deadline is None:
+            deadline = time.monotonic() + self.timeout
+        for attempt in range(2):
+            async_result = self._send_query(
+                address, method_name, args, kwargs, deadline, stats is not None
+            )
+            # The worker is released once it answered, even if we stopped waiting.
+            try:
+                result, query_stats = async_result.get(
+                    timeout=self._remaining(deadline)
+                )
+            except gevent.Timeout:
+                raise TimeoutException("Path search took too long")
+            except PathfindingWorkerError:
+                if attempt > 0:
+                    raise
+                logger.warning(
+                    "Pathfinding worker stopped while searching, searching again"
+                )
+            else:
+                break
+        if stats is not None:
+            stats.add(query_stats)
+        return result
+
+    def _send_query(
+        self, address, method_name, args, kwargs, deadline, collect_stats
+    ) -> gevent.event.AsyncResult:
+        """send the query to an idle worker, returns the result to wait for"""
+        async_result = gevent.event.AsyncResult()
+        while True:
+            worker = self._get_idle_worker(deadline)
+            request_id = next(self._request_ids)
+            worker.pending[request_id] = async_result
+            worker.send(
+                (
+                    _QUERY,
+                    request_id,
+                    address,
+                    method_name,
+                    args,
+                    kwargs,
+                    self._remaining(deadline),
+                    collect_stats,
+                )
+            )
+            if worker.alive:
+                return async_result
+            worker.pending.pop(request_id, None)
+
+    def _get_idle_worker(self, deadline: float) -> _Worker:
+        while True:
+            try:
+                worker = self._idle_workers.get(timeout=self._remaining(deadline))
+            except gevent.queue.Empty:
+                raise TimeoutException("No pathfinding worker available")
+            if worker.alive:
+                return worker
+
+    @staticmethod
+    def _remaining(deadline: float) -> float:
+        return max(deadline - time.monotonic(), 0)
+
+    def close(self) -> None:
+        self._closed = True
+        for worker in self.workers:
+            worker.close()
+
+
+class PooledCurrencyNetworkGraph(CurrencyNetworkGraph):
+    """CurrencyNetworkGraph that searches paths with a PathfindingPool
+
+    All other queries are answered by this graph directly. Every change made
+    to it is forwarded to the copies of the workers.
+    """
+
+    def __init__(self, pool: PathfindingPool, address: str, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.config = kwargs
+        self._pool = pool
+        self._address = address
+        self._changing = False
+        pool.register_graph(address, self)
+
+    def _change(self, method_name, *args, **kwargs):
+        # changes may call other changing methods, only the outermost call
+        # must be forwarded
+        if self._changing:
+            return getattr(super(), method_name)(*args, **kwargs)
+        self._changing = True
+        try:
+            result = getattr(super(), method_name)(*args, **kwargs)
+        finally:
+            self._changing = False
+        self._pool.update(self._address, method_name, args, kwargs)
+        return result
+
+    def _query(self, method_name, *args, **kwargs):
+        # the balance cache only makes sense within one process
+        kwargs.pop("balance_cache", None)
+        deadline = kwargs.pop("deadline", None)
+        stats = kwargs.pop("stats", None)
+        if stats is None and self.search_statistics is None:
+            query_stats = None
+        else:
+            query_stats = SearchStatistics()
+        result = self._pool.query(
+            self._address,
+            method_name,
+            args,
+            kwargs,
+            deadline=deadline,
+            stats=query_stats,
+        )
+        for collected_stats in (stats, self.search_statistics):
+            if collected_stats is not None:
+                collected_stats.add(query_stats)
+        return result
+
+    def gen_network(self, trustlines):
+        return self._change("gen_network", list(trustlines))
+
+    def reconcile_network(self, trustlines):
+        return self._change("reconcile_network", list(trustlines))
+
+    def update_trustline(self, *args, **kwargs):
+        return self._change("update_trustline", *args, **kwargs)
+
+    def update_balance(self, *args, **kwargs):
+        return self._change("update_balance", *args, **kwargs)
+
+    def remove_trustline(self, *args, **kwargs):
+        return self._change("remove_trustline", *args, **kwargs)
+
+    def find_transfer_path_sender_pays_fees(self, *args, **kwargs):
+        return self._query("find_transfer_path_sender_pays_fees", *args, **kwargs)
+
+    def find_transfer_path_receiver_pays_fees(self, *args, **kwargs):
+        return self._query("find_transfer_path_receiver_pays_fees", *args, **kwargs)
+
+    def find_alternative_transfer_paths(self, *args, **kwargs):
+        return self._query("find_alternative_transfer_paths", *args, **kwargs)
+
+    def find_split_transfer_paths(self, *args, **kwargs):
+        return self._query("find_split_transfer_paths", *args, **kwargs)
+
+    def close_trustline_path_triangulation(self, *args, **kwargs):
+        return self._query("close_trustline_path_triangulation", *args, **kwargs)
+
+    def find_maximum_capacity_path(self, *args, **kwargs):
+        return self._query("find_maximum_capacity_path", *args, **kwargs)
+
+    def find_transfer_paths(
+        self, path_requests, timestamp, timeout_per_path=None, **kwargs
+    ):
+        # the whole batch is searched by one worker, so that all paths are
+        # computed on the same state of the graph with one balance cache
+        path_requests = list(path_requests)
+        if timeout_per_path is not None and kwargs.get("deadline") is None:
+            kwargs["deadline"] = time.monotonic() + timeout_per_path * len(
+                path_requests
+            )
+        return self._query(
+            "find_transfer_paths",
+            path_requests,
+            timestamp=timestamp,
+            timeout_per_path=timeout_per_path,
+            **kwargs,
+        )
+
+
+def run_worker(stdin=None, stdout=None) -> None:
+    """run a worker, reading its messages from stdin until it is closed"""
+    if stdin is None:
+        stdin = sys.stdin.buffer
+    if stdout is None:
+        stdout = sys.stdout.buffer
+    graphs: Dict[str, CurrencyNetworkGraph] = {}
+    while True:
+        message = _read_message(stdin)
+        if message is None:
+            return
+        kind = message[0]
+        if kind == _CREATE:
+            _, address, config = message
+            graphs[address] = CurrencyNetworkGraph(**config)
+        elif kind == _UPDATE:
+            _, address, method_name, args, kwargs = message
+            try:
+                getattr(graphs[address], method_name)(*args, **kwargs)
+            except Exception:
+                logger.exception(f"Could not apply {method_name} to {address}")
+        elif kind == _QUERY:
+            (
+                _,
+                request_id,
+                address,
+                method_name,
+                args,
+                kwargs,
+                timeout,
+                collect_stats,
+            ) = message
+            if method_name not in QUERY_METHODS:
+                raise ValueError(f"Unknown query: {method_name}")
+            kwargs["deadline"] = time.monotonic() + timeout
+            stats = SearchStatistics() if collect_stats else None
+            if stats is not None:
+                kwargs["stats"] = stats
+            try:
+                result = getattr(graphs[address], method_name)(*args, **kwargs)
+            except Exception as e:
+                _write_message(stdout, (request_id, False, e, stats))
+            else:
+                _write_message(stdout, (request_id, True, result, stats))
+        else:
+            raise ValueError(f"Unknown message: {kind}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    # stdout is used for the replies, so nothing else may be printed to it
+    replies = sys.stdout.buffer
+    sys.stdout = sys.stderr
+    run_worker(stdout=replies)
@@ -6,7 +6,7 @@ import os
 import sys
 from collections import defaultdict
 from copy import deepcopy
-from typing import Dict, Iterable, List, Optional, Union
+from typing import Dict, Iterable, List, Optional, Tuple, Union
 
 import gevent
 import sqlalchemy
@@ -17,7 +17,7 @@ from tldeploy.identity import MetaTransaction
 from web3 import Web3
 
 import relay.concurrency_utils as concurrency_utils
-from relay import ethindex_db
+from relay import ethindex_db, ethindex_indexes, graph_snapshot
 from relay.pushservice.client import PushNotificationClient
 from relay.pushservice.client_token_db import (
     ClientTokenAlreadyExistsException,
@@ -36,7 +36,7 @@ from .blockchain import (
 )
 from .blockchain.currency_network_proxy import CurrencyNetworkProxy
 from .blockchain.delegate import Delegate, DelegationFees
-from .blockchain.events import BlockchainEvent
+from .blockchain.events import BlockchainEvent, EventsPage, paginate_events
 from .blockchain.exchange_proxy import ExchangeProxy
 from .blockchain.node import Node
 from .blockchain.proxy import sorted_events
@@ -45,6 +45,8 @@ from .blockchain.unw_eth_proxy import UnwEthProxy
 from .events import BalanceEvent, NetworkBalanceEvent
 from .exchange.orderbook import OrderBookGreenlet
 from .network_graph.graph import CurrencyNetworkGraph
+from .network_graph.user_networks import UserNetworksIndex
+from .pathfinding_pool import PathfindingPool, PooledCurrencyNetworkGraph
 from .streams import MessagingSubject, Subject
 
 logger = logging.getLogger("relay")
@@ -62,6 +64,7 @@ class TrustlinesRelay:
         self.addresses_json_path = addresses_json_path
         self.currency_network_proxies: Dict[str, CurrencyNetworkProxy] = {}
         self.currency_network_graphs: Dict[str, CurrencyNetworkGraph] = {}
+        self.user_networks_index = UserNetworksIndex()
         self.subjects = defaultdict(Subject)
         self.messaging = defaultdict(MessagingSubject)
         self.contracts = {}
@@ -74,6 +77,14 @@ class TrustlinesRelay:
         self._client_token_db: Optional[ClientTokenDB] = None
         self.fixed_gas_price: Optional[int] = None
         self.known_identity_factories: List[str] = []
+        self.pathfinding_pool: Optional[PathfindingPool] = None
+        # connections are only opened when needed
+        self.ethindex_pool = ethindex_db.ConnectionPool(
+            "",
+            max_size=self.config.get("ethindexPoolSize", 10),
+            idle_timeout=self.config.get("ethindexPoolIdleTimeout", 300),
+            timeout=self.event_query_timeout,
+        )
 
     @property
     def network_addresses(self) -> Iterable[str]:
@@ -103,10 +114,35 @@ class TrustlinesRelay:
     def enable_deploy_identity(self) -> bool:
         return self.config.get("enableDeployIdentity", False)
 
+    @property
+    def enable_admin_endpoints(self) -> bool:
+        return self.config.get("enableAdminEndpoints", False)
+
     @property
     def event_query_timeout(self) -> int:
         return self.config.get("eventQueryTimeout", 20)
 
+    @property
+    def path_query_timeout(self) -> float:
+        return self.config.get("pathQueryTimeout", 2)
+
+    def get_network_config(self, network_address: str, key: str, default=None):
+        """return the config value key, which can be overridden for the currency
+        network network_address in [relay.networks."<network_address>"]"""
+        network_config = self.config.get("networks", {}).get(network_address, {})
+        return network_config.get(key, self.config.get(key, default))
+
+    def get_path_query_timeout(self, network_address: str) -> float:
+        return self.get_network_config(network_address, "pathQueryTimeout", 2)
+
+    @property
+    def pathfinding_workers(self) -> int:
+        return self.config.get("pathfindingWorkers", 0)
+
+    @property
+    def graph_snapshot_directory(self) -> Optional[str]:
+        return self.config.get("graphSnapshotDirectory", None)
+
     @property
     def use_eth_index(self) -> bool:
         return os.environ.get("ETHINDEX", "1") == "1"
@@ -117,7 +153,7 @@ class TrustlinesRelay:
         """
         if self.use_eth_index:
             return ethindex_db.EthindexDB(
-                ethindex_db.connect(""),
+                self.ethindex_pool,
                 address=network_address,
                 standard_event_types=currency_network_events.standard_event_types,
                 event_builders=currency_network_events.event_builders,
@@ -132,7 +168,7 @@ class TrustlinesRelay:
         """
         if self.use_eth_index:
             return ethindex_db.EthindexDB(
-                ethindex_db.connect(""),
+                self.ethindex_pool,
                 address=address,
                 standard_event_types=token_events.standard_event_types,
                 event_builders=token_events.event_builders,
@@ -147,7 +183,7 @@ class TrustlinesRelay:
         """
         if self.use_eth_index:
             return ethindex_db.EthindexDB(
-                ethindex_db.connect(""),
+                self.ethindex_pool,
                 address=address,
                 standard_event_types=unw_eth_events.standard_event_types,
                 event_builders=unw_eth_events.event_builders,
@@ -162,7 +198,7 @@ class TrustlinesRelay:
         """
         if self.use_eth_index:
             return ethindex_db.EthindexDB(
-                ethindex_db.connect(""),
+                self.ethindex_pool,
                 address=address,
                 standard_event_types=exchange_events.standard_event_types,
                 event_builders=exchange_events.event_builders,
@@ -223,6 +259,13 @@ class TrustlinesRelay:
         logger.info("using web3 URL {}".format(url))
         self._web3 = Web3(Web3.HTTPProvider(url))
         self.node = Node(self._web3, fixed_gas_price=self.fixed_gas_price)
+        if self.pathfinding_workers > 0:
+            logger.info(
+                "starting {} pathfinding workers".format(self.pathfinding_workers)
+            )
+            self.pathfinding_pool = PathfindingPool(
+                self.pathfinding_workers, timeout=self.path_query_timeout
+            )
 
         delegation_fees = [
             DelegationFees(value=d["value"], currency_network=d["currencyNetwork"])
@@ -238,6 +281,8 @@ class TrustlinesRelay:
             delegation_fees=delegation_fees,
         )
         self._start_listen_on_new_addresses()
+        if self.use_eth_index:
+            self._start_check_ethindex_indexes()
 
     def new_network(self, address: str) -> None:
         assert is_checksum_address(address)
@@ -248,12 +293,35 @@ class TrustlinesRelay:
             self._web3, self.contracts["CurrencyNetwork"]["abi"], address
         )
         currency_network_proxy = self.currency_network_proxies[address]
-        self.currency_network_graphs[address] = CurrencyNetworkGraph(
+        graph_config = dict(
             capacity_imbalance_fee_divisor=currency_network_proxy.capacity_imbalance_fee_divisor,
             default_interest_rate=currency_network_proxy.default_interest_rate,
             custom_interests=currency_network_proxy.custom_interests,
             prevent_mediator_interests=currency_network_proxy.prevent_mediator_interests,
+            compact_graph=self.config.get("compactGraph", False),
+            num_landmarks=self.config.get("pathfindingLandmarks", 0),
+            path_cache_size=self.config.get("pathCacheSize", 0),
+            max_expansions=self.get_network_config(
+                address, "pathfindingMaxExpansions", 0
+            )
+            or None,
+            yield_every=self.get_network_config(address, "pathfindingYieldEvery", 0)
+            or None,
+            collect_statistics=self.get_network_config(
+                address, "pathfindingStatistics", False
+            ),
         )
+        if self.pathfinding_pool is not None:
+            self.currency_network_graphs[address] = PooledCurrencyNetworkGraph(
+                self.pathfinding_pool, address, **graph_config
+            )
+        else:
+            self.currency_network_graphs[address] = CurrencyNetworkGraph(**graph_config)
+        self.currency_network_graphs[address].track_users(
+            self.user_networks_index, address
+        )
+        if self.graph_snapshot_directory is not None:
+            self._load_graph_snapshot(address)
         self._start_listen_network(address)
 
     def new_exchange(self, address: str) -> None:
@@ -294,11 +362,12 @@ class TrustlinesRelay:
 
     def get_networks_of_user(self, user_address: str) -> List[str]:
         assert is_checksum_address(user_address)
-        networks_of_user: List[str] = []
-        for network_address in self.network_addresses:
-            if user_address in self.currency_network_graphs[network_address].users:
-                networks_of_user.append(network_address)
-        return networks_of_user
+        networks_of_user = self.user_networks_index.get_networks(user_address)
+        return [
+            network_address
+            for network_address in self.network_addresses
+            if network_address in networks_of_user
+        ]
 
     def add_push_client_token(self, user_address: str, client_token: str) -> None:
         if self._firebase_raw_push_service is not None:
@@ -352,38 +421,74 @@ class TrustlinesRelay:
         if not success:
             raise TokenNotFoundException
 
+    @staticmethod
+    def _select_events(
+        selector, method_name: str, *args, page: EventsPage = None, **kwargs
+    ) -> List[BlockchainEvent]:
+        """call method_name of an event selector and return the events of page
+
+        The ethindex selects the page in the database, the events of the
+        proxies are selected after getting all of them."""
+        if page is None:
+            return getattr(selector, method_name)(*args, **kwargs)
+        if isinstance(selector, ethindex_db.EthindexDB):
+            return getattr(selector, method_name)(*args, page=page, **kwargs)
+        return paginate_events(getattr(selector, method_name)(*args, **kwargs), page)
+
     def get_user_network_events(
         self,
         network_address: str,
         user_address: str,
         type: str = None,
         from_block: int = 0,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         proxy = self.get_event_selector_for_currency_network(network_address)
         if type is not None:
-            events = proxy.get_network_events(
+            events = self._select_events(
+                proxy,
+                "get_network_events",
                 type,
                 user_address,
                 from_block=from_block,
                 timeout=self.event_query_timeout,
+                page=page,
             )
         else:
-            events = proxy.get_all_network_events(
-                user_address, from_block=from_block, timeout=self.event_query_timeout
+            events = self._select_events(
+                proxy,
+                "get_all_network_events",
+                user_address,
+                from_block=from_block,
+                timeout=self.event_query_timeout,
+                page=page,
             )
         return events
 
     def get_network_events(
-        self, network_address: str, type: str = None, from_block: int = 0
+        self,
+        network_address: str,
+        type: str = None,
+        from_block: int = 0,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         proxy = self.get_event_selector_for_currency_network(network_address)
         if type is not None:
-            events = proxy.get_events(
-                type, from_block=from_block, timeout=self.event_query_timeout
+            events = self._select_events(
+                proxy,
+                "get_events",
+                type,
+                from_block=from_block,
+                timeout=self.event_query_timeout,
+                page=page,
             )
         else:
-            events = proxy.get_all_events(
-                from_block=from_block, timeout=self.event_query_timeout
+            events = self._select_events(
+                proxy,
+                "get_all_events",
+                from_block=from_block,
+                timeout=self.event_query_timeout,
+                page=page,
             )
         return events
 
@@ -393,8 +498,20 @@ class TrustlinesRelay:
         type: str = None,
         from_block: int = 0,
         timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         assert is_checksum_address(user_address)
+        if self.use_eth_index:
+            # ask for the events of all contracts with a single query
+            return self._get_user_events_of_contracts(
+                self._get_user_event_selectors(),
+                user_address,
+                type,
+                from_block,
+                timeout,
+                page,
+            )
+
         network_event_queries = self._get_network_event_queries(
             user_address, type, from_block
         )
@@ -408,7 +525,94 @@ class TrustlinesRelay:
             network_event_queries + unw_eth_event_queries + exchange_event_queries,
             timeout=timeout,
         )
-        return sorted_events(list(itertools.chain.from_iterable(results)))
+        events = sorted_events(list(itertools.chain.from_iterable(results)))
+        if page is not None:
+            events = paginate_events(events, page)
+        return events
+
+    def _get_user_event_selectors(self) -> List:
+        """return the event selectors of all contracts with events of users,
+        paired with the event types that can be selected from them by type"""
+        selectors = [
+            self.get_event_selector_for_currency_network(network_address)
+            for network_address in self.network_addresses
+        ] + [
+            self.get_event_selector_for_unw_eth(unw_eth_address)
+            for unw_eth_address in self.unw_eth_addresses
+        ]
+        exchange_selectors = [
+            self.get_event_selector_for_exchange(exchange_address)
+            for exchange_address in self.exchange_addresses
+        ]
+        return [(selector, selector.event_types) for selector in selectors] + [
+            (selector, selector.standard_event_types) for selector in exchange_selectors
+        ]
+
+    def get_ethindex_query_plans(
+        self, network_address: str, user_address: str, page: EventsPage = None
+    ) -> Dict:
+        """return the plans of the ethindex database for the queries of the
+        events endpoints, run for the given currency network and user"""
+        ethindex = self.get_event_selector_for_currency_network(network_address)
+        queries = [
+            (
+                "networkEvents",
+                ethindex.contract_events_query(ethindex.standard_event_types),
+            ),
+            (
+                "userNetworkEvents",
+                ethindex.user_contract_events_query(
+                    ethindex.standard_event_types, user_address
+                ),
+            ),
+            (
+                "userEvents",
+                ethindex_db.user_events_of_contracts_query(
+                    ethindex_db.select_user_event_types(
+                        self._get_user_event_selectors()
+                    ),
+                    user_address,
+                ),
+            ),
+        ]
+        missing_indexes = ethindex_indexes.get_missing_indexes(self.ethindex_pool)
+        return {
+            "missingIndexes": [index.name for index in missing_indexes],
+            "queryPlans": [
+                {
+                    "name": name,
+                    "plan": ethindex_db.explain_events_query(
+                        self.ethindex_pool, query, page
+                    ),
+                }
+                for name, query in queries
+            ],
+        }
+
+    @staticmethod
+    def _get_user_events_of_contracts(
+        selectors: List[Tuple[ethindex_db.EthindexDB, List[str]]],
+        user_address: str,
+        type: str = None,
+        from_block: int = 0,
+        timeout: float = None,
+        page: EventsPage = None,
+    ) -> List[BlockchainEvent]:
+        """get the events of a user in the contracts of the ethindex selectors
+        with a single query"""
+        results = concurrency_utils.joinall(
+            [
+                functools.partial(
+                    ethindex_db.get_user_events_of_contracts,
+                    ethindex_db.select_user_event_types(selectors, type),
+                    user_address,
+                    from_block=from_block,
+                    page=page,
+                )
+            ],
+            timeout=timeout,
+        )
+        return results[0]
 
     def _get_network_event_queries(
         self, user_address: str, type: str = None, from_block: int = 0
@@ -496,6 +700,7 @@ class TrustlinesRelay:
         user_address: str,
         type: str = None,
         from_block: int = 0,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         if token_address in self.unw_eth_addresses:
             proxy: Union[UnwEthProxy, TokenProxy] = self.get_event_selector_for_unw_eth(
@@ -507,16 +712,27 @@ class TrustlinesRelay:
             func_names = ["get_token_events", "get_all_token_events"]
 
         if type is not None:
-            events = getattr(proxy, func_names[0])(
-                type, user_address, from_block=from_block
+            events = self._select_events(
+                proxy,
+                func_names[0],
+                type,
+                user_address,
+                from_block=from_block,
+                page=page,
             )
         else:
-            events = getattr(proxy, func_names[1])(user_address, from_block=from_block)
+            events = self._select_events(
+                proxy, func_names[1], user_address, from_block=from_block, page=page
+            )
 
         return events
 
     def get_token_events(
-        self, token_address: str, type: str = None, from_block: int = 0
+        self,
+        token_address: str,
+        type: str = None,
+        from_block: int = 0,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
 
         if token_address in self.unw_eth_addresses:
@@ -527,20 +743,32 @@ class TrustlinesRelay:
             proxy = self.get_event_selector_for_token(token_address)
 
         if type is not None:
-            events = proxy.get_events(type, from_block=from_block)
+            events = self._select_events(
+                proxy, "get_events", type, from_block=from_block, page=page
+            )
         else:
-            events = proxy.get_all_events(from_block=from_block)
+            events = self._select_events(
+                proxy, "get_all_events", from_block=from_block, page=page
+            )
 
         return events
 
     def get_exchange_events(
-        self, exchange_address: str, type: str = None, from_block: int = 0
+        self,
+        exchange_address: str,
+        type: str = None,
+        from_block: int = 0,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         proxy = self.get_event_selector_for_exchange(exchange_address)
         if type is not None:
-            events = proxy.get_events(type, from_block=from_block)
+            events = self._select_events(
+                proxy, "get_events", type, from_block=from_block, page=page
+            )
         else:
-            events = proxy.get_all_events(from_block=from_block)
+            events = self._select_events(
+                proxy, "get_all_events", from_block=from_block, page=page
+            )
         return events
 
     def get_user_exchange_events(
@@ -549,18 +777,27 @@ class TrustlinesRelay:
         user_address: str,
         type: str = None,
         from_block: int = 0,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         proxy = self.get_event_selector_for_exchange(exchange_address)
         if type is not None:
-            events = proxy.get_exchange_events(
+            events = self._select_events(
+                proxy,
+                "get_exchange_events",
                 type,
                 user_address,
                 from_block=from_block,
                 timeout=self.event_query_timeout,
+                page=page,
             )
         else:
-            events = proxy.get_all_exchange_events(
-                user_address, from_block=from_block, timeout=self.event_query_timeout
+            events = self._select_events(
+                proxy,
+                "get_all_exchange_events",
+                user_address,
+                from_block=from_block,
+                timeout=self.event_query_timeout,
+                page=page,
             )
         return events
 
@@ -570,13 +807,29 @@ class TrustlinesRelay:
         type: str = None,
         from_block: int = 0,
         timeout: float = None,
+        page: EventsPage = None,
     ) -> List[BlockchainEvent]:
         assert is_checksum_address(user_address)
+        if self.use_eth_index:
+            return self._get_user_events_of_contracts(
+                [
+                    self.get_event_selector_for_exchange(exchange_address)
+                    for exchange_address in self.exchange_addresses
+                ],
+                user_address,
+                type,
+                from_block,
+                timeout,
+                page,
+            )
         exchange_event_queries = self._get_exchange_event_queries(
             user_address, type, from_block
         )
         results = concurrency_utils.joinall(exchange_event_queries, timeout=timeout)
-        return sorted_events(list(itertools.chain.from_iterable(results)))
+        events = sorted_events(list(itertools.chain.from_iterable(results)))
+        if page is not None:
+            events = paginate_events(events, page)
+        return events
 
     def _load_gas_price_settings(self, gas_price_settings: Dict):
         method = gas_price_settings.get("method", "rpc")
@@ -635,8 +888,18 @@ class TrustlinesRelay:
         assert is_checksum_address(address)
         graph = self.currency_network_graphs[address]
         proxy = self.currency_network_proxies[address]
+        if self.graph_snapshot_directory is not None:
+            on_synced = functools.partial(self._write_graph_snapshot, address)
+        else:
+            on_synced = None
         proxy.start_listen_on_full_sync(
-            _create_on_full_sync(graph), self.config.get("syncInterval", 300)
+            _create_on_full_sync(
+                graph,
+                reconcile=self.config.get("reconcileOnFullSync", False),
+                on_synced=on_synced,
+            ),
+            self.config.get("syncInterval", 300),
+            gen_graph_representation=self._get_graph_representation_function(address),
         )
         proxy.start_listen_on_balance(self._process_balance_update)
         proxy.start_listen_on_trustline(self._process_trustline_update)
@@ -647,6 +910,101 @@ class TrustlinesRelay:
         )
         proxy.start_listen_on_network_freeze(self._process_network_freeze)
 
+    def _get_graph_representation_function(self, address):
+        """returns the function used to get the trustlines of a network on a
+        full sync together with the block number they reflect at least
+
+        With the ethindex we read the trustlines from the database, which is a
+        lot faster than asking the node for every single trustline. If the
+        database can not be queried or lags behind the node, we fall back to
+        the node.
+        """
+        proxy = self.currency_network_proxies[address]
+
+        def gen_graph_representation_from_node():
+            block_number = self.node.blocknumber
+            return block_number, proxy.gen_graph_representation()
+
+        if not self.use_eth_index:
+            return gen_graph_representation_from_node
+
+        def gen_graph_representation():
+            ethindex = ethindex_db.EthindexDB(
+                self.ethindex_pool,
+                address=address,
+                standard_event_types=currency_network_events.standard_event_types,
+                event_builders=currency_network_events.event_builders,
+                from_to_types=currency_network_events.from_to_types,
+            )
+            return ethindex_db.get_trustlines_or_fallback(
+                ethindex,
+                lambda: self.node.blocknumber,
+                gen_graph_representation_from_node,
+                max_lag=self.config.get("fullSyncMaxEthindexLag", 0),
+            )
+
+        return gen_graph_representation
+
+    def _get_graph_snapshot_path(self, address):
+        return os.path.join(
+            self.graph_snapshot_directory, "{}.snapshot".format(address)
+        )
+
+    def _write_graph_snapshot(self, address, block_number):
+        try:
+            os.makedirs(self.graph_snapshot_directory, exist_ok=True)
+            graph_snapshot.write_snapshot(
+                self._get_graph_snapshot_path(address),
+                self.currency_network_graphs[address],
+                block_number,
+            )
+        except OSError as err:
+            logger.warning(
+                "Could not write graph snapshot of {}: {}".format(address, err)
+            )
+
+    def _load_graph_snapshot(self, address):
+        """load the graph of a network from its snapshot and apply the
+        trustline and balance updates since the block of the snapshot, so that
+        the graph can be used before the first full sync is done"""
+        event_selector = self.get_event_selector_for_currency_network(address)
+
+        def get_events_since(block_number):
+            return sorted_events(
+                list(
+                    itertools.chain.from_iterable(
+                        concurrency_utils.joinall(
+                            [
+                                functools.partial(
+                                    event_selector.get_events,
+                                    event_type,
+                                    from_block=block_number,
+                                    timeout=self.event_query_timeout,
+                                )
+                                for event_type in [
+                                    currency_network_events.TrustlineUpdateEventType,
+                                    currency_network_events.BalanceUpdateEventType,
+                                ]
+                            ],
+                            timeout=self.event_query_timeout,
+                        )
+                    )
+                )
+            )
+
+        def apply_event(graph, event):
+            if event.type == currency_network_events.TrustlineUpdateEventType:
+                _apply_trustline_update(graph, event)
+            else:
+                _apply_balance_update(graph, event)
+
+        graph_snapshot.load_snapshot(
+            self._get_graph_snapshot_path(address),
+            self.currency_network_graphs[address],
+            get_events_since,
+            apply_event,
+        )
+
     def _start_listen_on_new_addresses(self):
         def listen():
             while True:
@@ -660,6 +1018,22 @@ class TrustlinesRelay:
 
         gevent.Greenlet.spawn(listen)
 
+    def _start_check_ethindex_indexes(self):
+        def check():
+            try:
+                ethindex_indexes.check_indexes(
+                    self.ethindex_pool,
+                    create=self.config.get("createEthindexIndexes", False),
+                )
+            except Exception:
+                logger.error(
+                    "Error while checking the ethindex indexes",
+                    exc_info=sys.exc_info(),
+                )
+
+        # creating the indexes can take a while
+        gevent.Greenlet.spawn(check)
+
     def _start_push_service(self):
         path = self.config.get("firebase", {}).get("credentialsPath", None)
         if path is not None:
@@ -692,12 +1066,7 @@ class TrustlinesRelay:
 
     def _process_balance_update(self, balance_update_event):
         graph = self.currency_network_graphs[balance_update_event.network_address]
-        graph.update_balance(
-            balance_update_event.from_,
-            balance_update_event.to,
-            balance_update_event.value,
-            balance_update_event.timestamp,
-        )
+        _apply_balance_update(graph, balance_update_event)
         self._publish_trustline_events(
             user1=balance_update_event.from_,
             user2=balance_update_event.to,
@@ -759,14 +1128,7 @@ class TrustlinesRelay:
     def _process_trustline_update(self, trustline_update_event):
         logger.debug("Process trustline update event")
         graph = self.currency_network_graphs[trustline_update_event.network_address]
-        graph.update_trustline(
-            creditor=trustline_update_event.from_,
-            debtor=trustline_update_event.to,
-            creditline_given=trustline_update_event.creditline_given,
-            creditline_received=trustline_update_event.creditline_received,
-            interest_rate_given=trustline_update_event.interest_rate_given,
-            interest_rate_received=trustline_update_event.interest_rate_received,
-        )
+        _apply_trustline_update(graph, trustline_update_event)
         self._publish_blockchain_event(trustline_update_event)
         self._publish_trustline_events(
             user1=trustline_update_event.from_,
@@ -786,9 +1148,43 @@ class TrustlinesRelay:
         self.subjects[event.user].publish(event)
 
 
-def _create_on_full_sync(graph):
-    def update_community(graph_rep):
-        graph.gen_network(graph_rep)
+def _apply_balance_update(graph, balance_update_event):
+    graph.update_balance(
+        balance_update_event.from_,
+        balance_update_event.to,
+        balance_update_event.value,
+        balance_update_event.timestamp,
+    )
+
+
+def _apply_trustline_update(graph, trustline_update_event):
+    graph.update_trustline(
+        creditor=trustline_update_event.from_,
+        debtor=trustline_update_event.to,
+        creditline_given=trustline_update_event.creditline_given,
+        creditline_received=trustline_update_event.creditline_received,
+        interest_rate_given=trustline_update_event.interest_rate_given,
+        interest_rate_received=trustline_update_event.interest_rate_received,
+    )
+
+
+def _create_on_full_sync(graph, reconcile=False, on_synced=None):
+    """returns the function called with the block number and the trustlines
+    of a full sync
+
+    on_synced is called with the block number after the graph has been updated
+    """
+
+    def update_community(block_number_and_graph_rep):
+        block_number, graph_rep = block_number_and_graph_rep
+        if reconcile:
+            drift = graph.reconcile_network(graph_rep)
+            if drift > 0:
+                logger.info("Full sync updated {} drifted trustlines".format(drift))
+        else:
+            graph.gen_network(graph_rep)
+        if on_synced is not None:
+            on_synced(block_number)
 
     return update_community
 
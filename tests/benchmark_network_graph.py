@@ -0,0 +1,376 @@
+#! /usr/bin/env python3
+"""benchmark the network graph on synthetic currency networks
+
+The networks are generated with a fixed seed, either scale-free by
+preferential attachment or made of communities with few trustlines between
+them. Creditlines, balances, interest rates and frozen trustlines follow
+distributions like the ones of real currency networks.
+
+Every run appends its timings together with the current git commit to a
+results file, so that runs of different commits can be compared:
+
+    ./benchmark_network_graph.py run --num-edges 1000 --num-edges 100000
+    ./benchmark_network_graph.py compare
+"""
+import datetime
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, Iterable, List
+
+import click
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.network_graph.graph import CurrencyNetworkGraph
+
+KINDS = ("scale-free", "communities")
+DEFAULT_RESULTS_FILE = "benchmark-results.jsonl"
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+
+def address(i: int) -> str:
+    return "0x{:040X}".format(i)
+
+
+def scale_free_edges(num_edges: int, rng: random.Random, m: int = 4):
+    """generate num_edges edges by preferential attachment: every new node is
+    connected to m nodes chosen with a probability proportional to their degree
+    """
+    edges = set()
+    targets = list(range(m))
+    # every node appears once per trustline it has
+    repeated_nodes: List[int] = []
+    node = m
+    while len(edges) < num_edges:
+        for target in set(targets):
+            if len(edges) < num_edges:
+                edges.add((target, node))
+                repeated_nodes.extend((target, node))
+        targets = [rng.choice(repeated_nodes) for _ in range(m)]
+        node += 1
+    return edges
+
+
+def community_edges(
+    num_edges: int,
+    rng: random.Random,
+    community_size: int = 100,
+    degree: int = 8,
+    inter_community_fraction: float = 0.05,
+):
+    """generate num_edges edges between nodes in communities of community_size
+    nodes with an average degree of degree, where only inter_community_fraction
+    of the edges connect different communities
+    """
+    num_nodes = max(2 * num_edges // degree, 2 * community_size)
+    num_communities = num_nodes // community_size
+    edges = set()
+    while len(edges) < num_edges:
+        community = rng.randrange(num_communities)
+        a = community * community_size + rng.randrange(community_size)
+        if rng.random() < inter_community_fraction:
+            community = rng.randrange(num_communities)
+        b = community * community_size + rng.randrange(community_size)
+        if a != b:
+            edges.add((min(a, b), max(a, b)))
+    return edges
+
+
+def generate_trustlines(
+    kind: str, num_edges: int, seed: int = 0, now: int = None
+) -> List[Trustline]:
+    """generate the trustlines of a currency network with num_edges trustlines"""
+    rng = random.Random(seed)
+    if now is None:
+        now = int(time.time())
+    if kind == "scale-free":
+        edges = scale_free_edges(num_edges, rng)
+    elif kind == "communities":
+        edges = community_edges(num_edges, rng)
+    else:
+        raise ValueError(f"Unknown kind of network: {kind}")
+
+    def creditline():
+        # most creditlines are small, a few are huge
+        if rng.random() < 0.2:
+            return 0
+        return int(rng.lognormvariate(10, 2))
+
+    def interest_rate():
+        if rng.random() < 0.8:
+            return 0
+        return rng.choice([10, 50, 100, 200, 500, 1000])
+
+    trustlines = []
+    for a, b in sorted(edges):
+        creditline_given = creditline()
+        creditline_received = creditline()
+        if rng.random() < 0.3:
+            balance = 0
+        else:
+            balance = rng.randint(-creditline_received, creditline_given)
+        trustlines.append(
+            Trustline(
+                user=address(a),
+                counter_party=address(b),
+                creditline_given=creditline_given,
+                creditline_received=creditline_received,
+                interest_rate_given=interest_rate(),
+                interest_rate_received=interest_rate(),
+                is_frozen=rng.random() < 0.01,
+                m_time=now - rng.randrange(SECONDS_PER_YEAR),
+                balance=balance,
+            )
+        )
+    return trustlines
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    timings = sorted(timings)
+    return {
+        "runs": len(timings),
+        "min": timings[0],
+        "median": statistics.median(timings),
+        "mean": statistics.mean(timings),
+        "p95": timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+        "max": timings[-1],
+    }
+
+
+def time_calls(function: Callable, arguments: Iterable) -> Dict[str, float]:
+    timings = []
+    for args in arguments:
+        start = time.perf_counter()
+        function(*args)
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+
+def run_benchmark(
+    kind: str,
+    num_edges: int,
+    num_queries: int = 100,
+    seed: int = 0,
+    graph_options: Dict = None,
+) -> Dict:
+    """generate a network and time the operations of the graph on it
+
+    Returns the summaries of the timings per operation.
+    """
+    now = int(time.time())
+    trustlines = generate_trustlines(kind, num_edges, seed=seed, now=now)
+    graph = CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=1000,
+        default_interest_rate=0,
+        custom_interests=True,
+        **(graph_options or {}),
+    )
+    results = {"gen_network": time_calls(graph.gen_network, [(trustlines,)])}
+
+    rng = random.Random(seed)
+    users = sorted(graph.users)
+    pairs = [tuple(rng.sample(users, 2)) for _ in range(num_queries)]
+    values = [int(rng.lognormvariate(6, 2)) + 1 for _ in range(num_queries)]
+    trustline_pairs = [
+        (trustline.user, trustline.counter_party)
+        for trustline in rng.sample(trustlines, min(num_queries, len(trustlines)))
+    ]
+
+    results["find_transfer_path_sender_pays_fees"] = time_calls(
+        lambda source, target, value: graph.find_transfer_path_sender_pays_fees(
+            source, target, value, timestamp=now
+        ),
+        [(source, target, value) for (source, target), value in zip(pairs, values)],
+    )
+    results["find_transfer_path_receiver_pays_fees"] = time_calls(
+        lambda source, target, value: graph.find_transfer_path_receiver_pays_fees(
+            source, target, value, timestamp=now
+        ),
+        [(source, target, value) for (source, target), value in zip(pairs, values)],
+    )
+    results["close_trustline_path_triangulation"] = time_calls(
+        lambda source, target: graph.close_trustline_path_triangulation(
+            now, source, target
+        ),
+        trustline_pairs,
+    )
+    results["find_maximum_capacity_path"] = time_calls(
+        lambda source, target: graph.find_maximum_capacity_path(
+            source, target, timestamp=now
+        ),
+        pairs,
+    )
+    results["get_account_sum"] = time_calls(
+        lambda user: graph.get_account_sum(user, timestamp=now),
+        [(source,) for source, _ in pairs],
+    )
+
+    def update_trustlines_and_find_path(new_pair, closed_pair, source, target, value):
+        # trustline churn between path queries, one trustline is opened and
+        # one is closed before every query
+        graph.update_trustline(*new_pair, 1000, 1000, 0, 0)
+        if graph.graph.has_edge(*closed_pair):
+            graph.remove_trustline(*closed_pair)
+        graph.find_transfer_path_sender_pays_fees(source, target, value, timestamp=now)
+
+    new_pairs = [tuple(rng.sample(users, 2)) for _ in range(num_queries)]
+    results["update_trustlines_and_find_path"] = time_calls(
+        update_trustlines_and_find_path,
+        [
+            (new_pair, closed_pair, source, target, value)
+            for new_pair, closed_pair, (source, target), value in zip(
+                new_pairs, trustline_pairs, pairs, values
+            )
+        ],
+    )
+    return results
+
+
+def get_commit() -> str:
+    try:
+        return (
+            subprocess.check_output(
+                ["git", "rev-parse", "--short", "HEAD"],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                stderr=subprocess.DEVNULL,
+            )
+            .decode()
+            .strip()
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def read_results(results_file: str) -> List[Dict]:
+    with open(results_file) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def benchmark_key(result: Dict):
+    return result["kind"], result["num_edges"], result["num_queries"]
+
+
+@click.group()
+def main():
+    pass
+
+
+@main.command()
+@click.option(
+    "--kind",
+    type=click.Choice(KINDS),
+    multiple=True,
+    help="kind of network to generate, default: all",
+)
+@click.option(
+    "--num-edges",
+    type=int,
+    multiple=True,
+    help="number of trustlines of the networks, default: 1000, 10000 and 100000",
+)
+@click.option("--num-queries", type=int, default=100, help="queries per operation")
+@click.option("--seed", type=int, default=0, help="seed of the generated networks")
+@click.option(
+    "--compact-graph", is_flag=True, help="use the compact storage for the graph"
+)
+@click.option(
+    "--results-file",
+    default=DEFAULT_RESULTS_FILE,
+    help="file the results are appended to",
+)
+def run(kind, num_edges, num_queries, seed, compact_graph, results_file):
+    """generate networks and time the operations of the graph on them"""
+    kinds = kind or KINDS
+    sizes = num_edges or (1000, 10000, 100000)
+    commit = get_commit()
+    with open(results_file, "a") as f:
+        for kind in kinds:
+            for size in sizes:
+                click.echo(f"benchmarking {kind} network with {size} trustlines")
+                timings = run_benchmark(
+                    kind,
+                    size,
+                    num_queries=num_queries,
+                    seed=seed,
+                    graph_options={"compact_graph": compact_graph},
+                )
+                for operation, summary in timings.items():
+                    click.echo(
+                        f"  {operation:40} median {summary['median'] * 1000:10.3f} ms"
+                        f"  p95 {summary['p95'] * 1000:10.3f} ms"
+                    )
+                result = {
+                    "commit": commit,
+                    "date": datetime.datetime.utcnow().isoformat(),
+                    "python": platform.python_version(),
+                    "kind": kind,
+                    "num_edges": size,
+                    "num_queries": num_queries,
+                    "seed": seed,
+                    "compact_graph": compact_graph,
+                    "timings": timings,
+                }
+                f.write(json.dumps(result, sort_keys=True) + "\n")
+                f.flush()
+
+
+@main.command()
+@click.option(
+    "--results-file",
+    default=DEFAULT_RESULTS_FILE,
+    help="file the results have been appended to",
+)
+@click.option(
+    "--threshold",
+    type=float,
+    default=1.2,
+    help="ratio of the medians that counts as a regression",
+)
+@click.argument("old_commit", required=False)
+@click.argument("new_commit", required=False)
+def compare(results_file, threshold, old_commit, new_commit):
+    """compare the median timings of two commits, by default the last two
+    commits in the results file
+
+    Exits with status 1 if an operation got slower by more than threshold.
+    """
+    results = read_results(results_file)
+    commits = []
+    for result in results:
+        if result["commit"] not in commits:
+            commits.append(result["commit"])
+    if old_commit is None or new_commit is None:
+        if len(commits) < 2:
+            raise click.ClickException("Need results of at least two commits")
+        old_commit, new_commit = commits[-2], commits[-1]
+
+    # the last result of a commit for every benchmark counts
+    old = {benchmark_key(r): r for r in results if r["commit"] == old_commit}
+    new = {benchmark_key(r): r for r in results if r["commit"] == new_commit}
+    regression = False
+    for key in sorted(old.keys() & new.keys()):
+        click.echo("{} network with {} trustlines, {} queries".format(*key))
+        for operation, new_summary in sorted(new[key]["timings"].items()):
+            old_summary = old[key]["timings"].get(operation)
+            if old_summary is None:
+                continue
+            ratio = new_summary["median"] / max(old_summary["median"], 1e-9)
+            marker = ""
+            if ratio > threshold:
+                marker = "  REGRESSION"
+                regression = True
+            click.echo(
+                f"  {operation:40} {old_summary['median'] * 1000:10.3f} ms"
+                f" -> {new_summary['median'] * 1000:10.3f} ms  x{ratio:.2f}{marker}"
+            )
+    if regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+import json
+
+import psycopg2
+import pytest
+
+from relay.api.resources import STREAM_ERROR_MESSAGE, TIMEOUT_MESSAGE, stream_events
+from relay.blockchain.events import EventsPage
+from relay.concurrency_utils import TimeoutException
+
+
+class Event:
+    def __init__(self, number):
+        self.key = (number, 0, 0)
+
+
+class EventSchema:
+    @staticmethod
+    def dump(events):
+        return [{"blockNumber": event.key[0]} for event in events]
+
+
+def get_events_failing_on_second_page(exception):
+    def get_events(page):
+        if page.after is not None:
+            raise exception
+        return [Event(number) for number in range(1, page.limit + 1)]
+
+    return get_events
+
+
+def test_stream_events_in_pages():
+    pages = []
+
+    def get_events(page):
+        pages.append(page)
+        start = 1 if page.after is None else page.after[0] + 1
+        return [Event(number) for number in range(start, min(start + page.limit, 6))]
+
+    response = stream_events(get_events, EventSchema, EventsPage(), 2)
+
+    assert [event["blockNumber"] for event in json.loads(response.get_data())] == [
+        1,
+        2,
+        3,
+        4,
+        5,
+    ]
+    assert [page.after for page in pages] == [None, (2, 0, 0), (4, 0, 0)]
+
+
+@pytest.mark.parametrize(
+    "exception, message, status",
+    [
+        (TimeoutException(), TIMEOUT_MESSAGE, 504),
+        (psycopg2.OperationalError(), STREAM_ERROR_MESSAGE, 500),
+    ],
+)
+def test_stream_events_ends_with_error_of_later_page(exception, message, status):
+    response = stream_events(
+        get_events_failing_on_second_page(exception), EventSchema, EventsPage(), 2
+    )
+
+    assert response.status_code == 200
+    assert json.loads(response.get_data()) == [
+        {"blockNumber": 1},
+        {"blockNumber": 2},
+        {"error": message, "status": status},
+    ]
+
+
+def test_stream_events_raises_error_of_first_page():
+    with pytest.raises(TimeoutException):
+        stream_events(
+            get_events_failing_on_second_page(TimeoutException()),
+            EventSchema,
+            EventsPage(after=(1, 0, 0)),
+            2,
+        )
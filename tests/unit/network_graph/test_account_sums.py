@@ -0,0 +1,181 @@
+import random
+
+import pytest
+from tests.unit.network_graph.conftest import addresses
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.network_graph.account_sums import AccountSums
+from relay.network_graph.graph import Account
+from relay.network_graph.graph import (
+    CurrencyNetworkGraphForTesting as CurrencyNetworkGraph,
+)
+
+A, B, C, D, E, F, G, H = addresses
+SECONDS_PER_YEAR = 365 * 24 * 60 * 60
+
+
+def brute_force_summary(graph, user, timestamp):
+    balance = frozen_balance = creditline_given = creditline_received = 0
+    if graph.has_node(user):
+        for counter_party, edge_data in graph[user].items():
+            account = Account(edge_data, user, counter_party)
+            unfrozen_balance = account.unfrozen_balance_with_interests(timestamp)
+            balance += unfrozen_balance
+            frozen_balance += (
+                account.balance_with_interests(timestamp) - unfrozen_balance
+            )
+            creditline_given += account.creditline
+            creditline_received += account.reverse_creditline
+    return balance, frozen_balance, creditline_given, creditline_received
+
+
+def assert_sums_match(community, timestamp=SECONDS_PER_YEAR):
+    edges = list(community.graph.edges(data=True))
+    assert community.num_trustlines == len(edges)
+    assert community.money_created == sum(
+        abs(data["balance_ab"]) for _, _, data in edges
+    )
+    assert community.total_creditlines == sum(
+        data["creditline_ab"] + data["creditline_ba"] for _, _, data in edges
+    )
+    assert set(community.users) == {user for edge in edges for user in edge[:2]}
+    assert community.num_users == len(community.users)
+    for user in addresses:
+        summary = community.get_aggregated_account_summary(user, timestamp)
+        assert (
+            summary.balance,
+            summary.frozen_balance,
+            summary.creditline_given,
+            summary.creditline_received,
+        ) == brute_force_summary(community.graph, user, timestamp)
+
+
+def random_trustline(rng):
+    a, b = sorted(rng.sample(addresses, 2))
+    return Trustline(
+        a,
+        b,
+        rng.randrange(1000),
+        rng.randrange(1000),
+        interest_rate_given=rng.choice([0, 0, 100]),
+        interest_rate_received=rng.choice([0, 0, 200]),
+        is_frozen=rng.random() < 0.2,
+        m_time=rng.randrange(SECONDS_PER_YEAR),
+        balance=rng.randrange(-500, 500),
+    )
+
+
+@pytest.fixture(params=[False, True])
+def community(request):
+    community = CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=100,
+        custom_interests=True,
+        compact_graph=request.param,
+    )
+    rng = random.Random(0)
+    community.gen_network({random_trustline(rng) for _ in range(15)})
+    return community
+
+
+def test_sums_after_gen_network(community):
+    assert_sums_match(community)
+
+
+def test_sums_follow_updates(community):
+    rng = random.Random(1)
+    for _ in range(200):
+        trustline = random_trustline(rng)
+        operation = rng.randrange(5)
+        if operation == 0:
+            community.update_trustline(
+                trustline.user,
+                trustline.counter_party,
+                trustline.creditline_given,
+                trustline.creditline_received,
+                trustline.interest_rate_given,
+                trustline.interest_rate_received,
+                trustline.is_frozen,
+            )
+        elif operation == 1:
+            community.update_balance(
+                trustline.user,
+                trustline.counter_party,
+                trustline.balance,
+                timestamp=trustline.m_time,
+            )
+        elif operation == 2 and community.graph.has_edge(
+            trustline.user, trustline.counter_party
+        ):
+            community.remove_trustline(trustline.user, trustline.counter_party)
+        elif operation == 3 and community.graph.has_edge(
+            trustline.user, trustline.counter_party
+        ):
+            community.freeze_trustline(trustline.user, trustline.counter_party)
+        elif operation == 4:
+            community.reconcile_network(
+                [random_trustline(rng) for _ in range(3)]
+                + [
+                    Trustline(user, counter_party, 10, 10)
+                    for user, counter_party in [(A, B), (C, D)]
+                ]
+            )
+        assert_sums_match(community)
+
+
+def test_sums_follow_transfers():
+    community = CurrencyNetworkGraph(capacity_imbalance_fee_divisor=100)
+    community.gen_network([Trustline(A, B, 100, 100), Trustline(B, C, 100, 100)])
+    community.transfer_path([A, B], 50, 0)
+    assert_sums_match(community)
+    assert community.get_aggregated_account_summary(B).balance == 50
+
+
+def test_only_trustlines_with_interests_are_projected():
+    sums = AccountSums()
+    sums.add_trustline(
+        A,
+        B,
+        dict(
+            creditline_ab=100,
+            creditline_ba=200,
+            interest_ab=0,
+            interest_ba=0,
+            is_frozen=False,
+            m_time=0,
+            balance_ab=10,
+        ),
+    )
+    sums.add_trustline(
+        A,
+        C,
+        dict(
+            creditline_ab=100,
+            creditline_ba=200,
+            interest_ab=0,
+            interest_ba=100,
+            is_frozen=False,
+            m_time=0,
+            balance_ab=20,
+        ),
+    )
+    assert sums.get(A).balance == 10
+    assert sums.get(B).balance == -10
+    assert sums.get(A).creditline_given == 200
+    assert sums.get(A).interest_counter_parties == {C}
+    assert sums.get(C).interest_counter_parties == {A}
+
+
+def test_removing_last_trustline_forgets_user():
+    sums = AccountSums()
+    data = dict(
+        creditline_ab=100,
+        creditline_ba=200,
+        interest_ab=0,
+        interest_ba=0,
+        is_frozen=False,
+        m_time=0,
+        balance_ab=10,
+    )
+    sums.add_trustline(A, B, data)
+    sums.remove_trustline(A, B, data)
+    assert sums._sums == {}
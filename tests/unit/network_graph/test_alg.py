@@ -1,5 +1,9 @@
+import time
+
 import networkx as nx
+import pytest
 
+from relay.concurrency_utils import TimeoutException
 from relay.network_graph import alg
 
 
@@ -35,3 +39,153 @@ def test_optimize_number_of_costfn_calls():
         cost_accumulator=cost_accumulator,
     )
     assert cost_accumulator.num_calls == len(nodes) - 1
+
+
+def test_deadline():
+    g = nx.Graph()
+    g.add_edge(1, 2, fee=1)
+
+    with pytest.raises(TimeoutException):
+        alg.least_cost_path(
+            graph=g,
+            starting_nodes={1},
+            target_nodes={2},
+            cost_accumulator=FeeCostAccumulatorCounter(),
+            deadline=time.monotonic() - 1,
+        )
+
+
+def path_fee(graph, path):
+    return sum(graph[src][dst]["fee"] for src, dst in zip(path, path[1:]))
+
+
+def test_k_least_cost_paths_like_networkx():
+    g = nx.gnm_random_graph(15, 40, seed=1)
+    for i, (src, dst) in enumerate(g.edges()):
+        g[src][dst]["fee"] = 1 + (i * 7) % 5
+
+    for source, target in [(0, 14), (3, 7), (5, 11)]:
+        paths = alg.k_least_cost_paths(
+            graph=g,
+            source=source,
+            target=target,
+            cost_accumulator=FeeCostAccumulatorCounter(),
+            k=6,
+        )
+        expected_costs = [
+            path_fee(g, path)
+            for path, _ in zip(
+                nx.shortest_simple_paths(g, source, target, weight="fee"), range(6)
+            )
+        ]
+        assert [cost for cost, _ in paths] == expected_costs
+        for cost, path in paths:
+            assert path_fee(g, path) == cost
+            assert len(set(path)) == len(path)
+        assert len({tuple(path) for _, path in paths}) == len(paths)
+
+
+def test_k_least_cost_paths_all_paths():
+    g = nx.Graph()
+    g.add_edge(1, 2, fee=1)
+    g.add_edge(2, 4, fee=1)
+    g.add_edge(1, 3, fee=2)
+    g.add_edge(3, 4, fee=2)
+    assert alg.k_least_cost_paths(
+        graph=g, source=1, target=4, cost_accumulator=FeeCostAccumulatorCounter(), k=5,
+    ) == [(2, [1, 2, 4]), (4, [1, 3, 4])]
+
+
+def test_k_least_cost_paths_no_path():
+    g = nx.Graph()
+    g.add_edge(1, 2, fee=1)
+    g.add_node(3)
+    assert (
+        alg.k_least_cost_paths(
+            graph=g,
+            source=1,
+            target=3,
+            cost_accumulator=FeeCostAccumulatorCounter(),
+            k=5,
+        )
+        == []
+    )
+
+
+def path_graph_with_fees(n):
+    g = nx.path_graph(n)
+    nx.set_edge_attributes(g, 1, "fee")
+    return g
+
+
+def test_expansion_budget_exceeded():
+    graph = path_graph_with_fees(10)
+    with pytest.raises(alg.ExpansionBudgetExceededException):
+        alg.least_cost_path(
+            graph=graph,
+            starting_nodes={0},
+            target_nodes={9},
+            cost_accumulator=FeeCostAccumulatorCounter(),
+            budget=alg.ExpansionBudget(max_expansions=5),
+        )
+
+
+def test_expansion_budget_sufficient():
+    graph = path_graph_with_fees(10)
+    budget = alg.ExpansionBudget(max_expansions=10)
+    cost, path = alg.least_cost_path(
+        graph=graph,
+        starting_nodes={0},
+        target_nodes={9},
+        cost_accumulator=FeeCostAccumulatorCounter(),
+        budget=budget,
+    )
+    assert path == list(range(10))
+    assert budget.expansions == 10
+
+
+def test_expansion_budget_yields(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(alg.gevent, "sleep", sleeps.append)
+    alg.least_cost_path(
+        graph=path_graph_with_fees(10),
+        starting_nodes={0},
+        target_nodes={9},
+        cost_accumulator=FeeCostAccumulatorCounter(),
+        budget=alg.ExpansionBudget(yield_every=3),
+    )
+    assert sleeps == [0, 0, 0]
+
+
+def test_expansion_budget_detects_graph_change(monkeypatch):
+    versions = [0]
+    monkeypatch.setattr(alg.gevent, "sleep", lambda seconds: versions.append(1))
+    with pytest.raises(alg.GraphChangedException):
+        alg.least_cost_path(
+            graph=path_graph_with_fees(10),
+            starting_nodes={0},
+            target_nodes={9},
+            cost_accumulator=FeeCostAccumulatorCounter(),
+            budget=alg.ExpansionBudget(
+                yield_every=3, graph_version=lambda: versions[-1]
+            ),
+        )
+    assert versions == [0, 1]
+
+
+def test_search_statistics():
+    stats = alg.SearchStatistics()
+    with pytest.raises(nx.NetworkXNoPath):
+        alg.least_cost_path(
+            graph=path_graph_with_fees(10),
+            starting_nodes={0},
+            target_nodes={9},
+            cost_accumulator=FeeCostAccumulatorCounter(),
+            max_cost=5,
+            stats=stats,
+        )
+    assert stats.searches == 1
+    assert stats.nodes_popped == 6
+    assert stats.edges_relaxed == 6
+    assert stats.rejected_edges == {"max_cost": 1}
+    assert stats.heap_peak == 1
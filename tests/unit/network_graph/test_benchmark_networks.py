@@ -0,0 +1,33 @@
+import pytest
+
+from tests.benchmark_network_graph import KINDS, generate_trustlines, run_benchmark
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_generate_trustlines(kind):
+    trustlines = generate_trustlines(kind, 500, seed=1, now=10 ** 9)
+    assert len(trustlines) == 500
+    assert len({(t.user, t.counter_party) for t in trustlines}) == 500
+    for trustline in trustlines:
+        assert trustline.user != trustline.counter_party
+        assert (
+            -trustline.creditline_received
+            <= trustline.balance
+            <= trustline.creditline_given
+        )
+    assert generate_trustlines(kind, 500, seed=1, now=10 ** 9) == trustlines
+
+
+@pytest.mark.parametrize("kind", KINDS)
+def test_run_benchmark(kind):
+    results = run_benchmark(kind, 300, num_queries=5)
+    assert set(results) == {
+        "gen_network",
+        "find_transfer_path_sender_pays_fees",
+        "find_transfer_path_receiver_pays_fees",
+        "close_trustline_path_triangulation",
+        "find_maximum_capacity_path",
+        "get_account_sum",
+        "update_trustlines_and_find_path",
+    }
+    assert results["find_maximum_capacity_path"]["runs"] == 5
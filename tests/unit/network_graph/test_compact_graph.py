@@ -0,0 +1,215 @@
+import itertools
+import random
+
+import pytest
+from tests.unit.network_graph.conftest import addresses
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.network_graph.compact_graph import CompactGraph
+from relay.network_graph.graph import (
+    CurrencyNetworkGraphForTesting as CurrencyNetworkGraph,
+)
+
+A, B, C, D, E, F, G, H = addresses
+
+
+@pytest.fixture
+def trustlines():
+    return [
+        Trustline(A, B, 100, 150, balance=20),
+        Trustline(A, E, 500, 550, interest_rate_given=200, m_time=1000),
+        Trustline(B, C, 200, 250, balance=-30),
+        Trustline(C, D, 300, 350),
+        Trustline(D, E, 400, 450, balance=100),
+        Trustline(E, F, 50, 50, is_frozen=True),
+        Trustline(F, G, 1000, 1000),
+        Trustline(B, G, 10, 500),
+    ]
+
+
+@pytest.fixture
+def communities(trustlines):
+    """a community using a networkx graph and a community using the compact graph"""
+    result = []
+    for compact_graph in [False, True]:
+        community = CurrencyNetworkGraph(
+            capacity_imbalance_fee_divisor=100, compact_graph=compact_graph
+        )
+        community.gen_network(trustlines)
+        result.append(community)
+    return result
+
+
+def assert_same_paths(community, compact_community, timestamp=2000):
+    for source, target in itertools.permutations(addresses, 2):
+        for value in [1, 50, 200, 700]:
+            for max_hops in [None, 2]:
+                for method in [
+                    "find_transfer_path_sender_pays_fees",
+                    "find_transfer_path_receiver_pays_fees",
+                ]:
+                    kwargs = dict(
+                        source=source,
+                        target=target,
+                        value=value,
+                        max_hops=max_hops,
+                        timestamp=timestamp,
+                    )
+                    assert getattr(community, method)(**kwargs) == getattr(
+                        compact_community, method
+                    )(**kwargs)
+        assert community.find_maximum_capacity_path(
+            source, target, timestamp=timestamp
+        ) == compact_community.find_maximum_capacity_path(
+            source, target, timestamp=timestamp
+        )
+
+
+def test_same_paths(communities):
+    assert_same_paths(*communities)
+
+
+def test_same_close_trustline_paths(communities):
+    community, compact_community = communities
+    for user, counter_party in [(A, B), (B, A), (B, C), (D, E)]:
+        assert community.close_trustline_path_triangulation(
+            2000, user, counter_party
+        ) == compact_community.close_trustline_path_triangulation(
+            2000, user, counter_party
+        )
+
+
+def test_same_after_updates(communities):
+    for community in communities:
+        community.update_balance(A, B, -50, timestamp=1500)
+        community.update_trustline(C, H, 300, 200)
+        community.update_trustline(F, G, 0, 0)
+        community.update_balance(D, C, 40, timestamp=1500)
+        community.remove_trustline(A, E)
+    assert_same_paths(*communities)
+
+
+def test_same_account_sums(communities):
+    community, compact_community = communities
+    for user in addresses:
+        summary = community.get_account_sum(user, timestamp=2000)
+        compact_summary = compact_community.get_account_sum(user, timestamp=2000)
+        assert vars(summary) == vars(compact_summary)
+        for counter_party in addresses:
+            summary = community.get_account_sum(user, counter_party, timestamp=2000)
+            compact_summary = compact_community.get_account_sum(
+                user, counter_party, timestamp=2000
+            )
+            assert vars(summary) == vars(compact_summary)
+
+
+def test_same_totals(communities):
+    community, compact_community = communities
+    assert set(community.users) == set(compact_community.users)
+    assert community.money_created == compact_community.money_created
+    assert community.total_creditlines == compact_community.total_creditlines
+    assert community.dump() == compact_community.dump()
+
+
+def test_remove_trustline_removes_nodes(communities):
+    _, compact_community = communities
+    compact_community.remove_trustline(C, D)
+    assert not compact_community.graph.has_edge(C, D)
+    assert compact_community.graph.has_node(C)
+    compact_community.update_trustline(F, G, 0, 0)
+    assert compact_community.graph.has_node(F)
+    compact_community.remove_trustline(E, F)
+    assert not compact_community.graph.has_node(F)
+    assert F not in compact_community.users
+
+
+def test_compact_graph_reuses_edge_slots():
+    graph = CompactGraph()
+    graph.add_edge(A, B, balance_ab=10)
+    graph.add_edge(B, C, balance_ab=20)
+    graph.remove_edge(A, B)
+    graph.add_edge(C, D)
+
+    assert len(graph._edge_a) == 2
+    assert graph.get_edge_data(C, D)["balance_ab"] == 0
+    assert graph.get_edge_data(B, C)["balance_ab"] == 20
+    assert sorted(graph[C]) == [B, D]
+    assert graph.number_of_edges() == 2
+
+
+def test_compact_graph_edge_data_view_writes_through():
+    graph = CompactGraph()
+    graph.add_edge(A, B)
+    graph[A][B]["creditline_ab"] = 2 ** 100
+    assert graph.get_edge_data(B, A)["creditline_ab"] == 2 ** 100
+    assert graph.edges(data="creditline_ab") == [(A, B, 2 ** 100)]
+
+
+def test_gen_network_keeps_old_snapshot(communities, trustlines):
+    for community in communities:
+        old_graph = community.graph
+        community.gen_network(trustlines[:2])
+        assert community.graph is not old_graph
+        assert community.graph.number_of_edges() == 2
+        assert old_graph.number_of_edges() == len(trustlines)
+        assert old_graph.get_edge_data(B, C)["balance_ab"] == -30
+
+
+def test_same_paths_with_interleaved_updates(communities):
+    rng = random.Random(0)
+    for _ in range(60):
+        user, counter_party = rng.sample(addresses, 2)
+        if rng.random() < 0.3:
+            for community in communities:
+                if community.graph.has_edge(user, counter_party):
+                    community.remove_trustline(user, counter_party)
+        else:
+            creditline_given = rng.randrange(1000)
+            creditline_received = rng.randrange(1000)
+            for community in communities:
+                community.update_trustline(
+                    user, counter_party, creditline_given, creditline_received
+                )
+        community, compact_community = communities
+        source, target = rng.sample(addresses, 2)
+        assert community.find_transfer_path_sender_pays_fees(
+            source, target, 50, timestamp=2000
+        ) == compact_community.find_transfer_path_sender_pays_fees(
+            source, target, 50, timestamp=2000
+        )
+    assert_same_paths(*communities)
+
+
+def test_compact_graph_patches_csr_on_small_changes():
+    graph = CompactGraph()
+    graph.add_edge(A, B)
+    graph.add_edge(B, C)
+    graph.search_view()
+    offsets = graph._offsets
+
+    graph.add_edge(C, D)
+    graph.remove_edge(A, B)
+    graph.add_edge(A, E)
+    graph.remove_edge(C, D)
+
+    assert graph._offsets is offsets
+    assert sorted(graph[B]) == [C]
+    assert sorted(graph[C]) == [B]
+    assert sorted(graph[A]) == [E]
+    assert sorted(graph.search_view().adj[E].items()) == [(A, graph._edge_id(A, E))]
+
+
+def test_compact_graph_merges_overflow_edges(monkeypatch):
+    monkeypatch.setattr("relay.network_graph.compact_graph.min_overflow_edges", 2)
+    graph = CompactGraph()
+    graph.add_edge(A, B)
+    graph.search_view()
+    offsets = graph._offsets
+
+    for neighbor in [C, D, E]:
+        graph.add_edge(A, neighbor)
+    graph.search_view()
+
+    assert graph._offsets is not offsets
+    assert graph._overflow == {}
+    assert sorted(graph[A]) == [B, C, D, E]
@@ -0,0 +1,119 @@
+import itertools
+import random
+
+import networkx as nx
+import pytest
+from tests.unit.network_graph.conftest import addresses
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.network_graph.alg import SearchStatistics
+from relay.network_graph.components import ComponentIndex
+from relay.network_graph.graph import (
+    CurrencyNetworkGraphForTesting as CurrencyNetworkGraph,
+)
+
+A, B, C, D, E, F, G, H = addresses
+
+
+def assert_exact(index, graph):
+    for a, b in itertools.combinations(graph.nodes(), 2):
+        assert index.connected(a, b) == nx.has_path(graph, a, b)
+
+
+def test_build_index():
+    graph = nx.Graph([(A, B), (B, C), (D, E)])
+    graph.add_node(F)
+    index = ComponentIndex(graph)
+    assert index.is_exact
+    assert_exact(index, graph)
+    assert not index.connected(A, H)
+
+
+def test_add_edges():
+    index = ComponentIndex()
+    graph = nx.Graph()
+    rng = random.Random(0)
+    for _ in range(20):
+        a, b = rng.sample(addresses, 2)
+        graph.add_edge(a, b)
+        index.add_edge(a, b)
+        assert_exact(index, graph)
+
+
+def test_removed_edges_keep_components():
+    graph = nx.Graph([(A, B), (B, C), (C, D)])
+    index = ComponentIndex(graph)
+    graph.remove_edge(B, C)
+    index.remove_edge(B, C)
+    assert not index.is_exact
+    # still considered connected, which is safe
+    assert index.connected(A, D)
+    assert_exact(ComponentIndex(graph), graph)
+
+
+@pytest.fixture(params=[False, True])
+def community(request):
+    community = CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=100, compact_graph=request.param
+    )
+    community.gen_network(
+        [
+            Trustline(A, B, 100, 100),
+            Trustline(B, C, 100, 100),
+            Trustline(D, E, 100, 100),
+        ]
+    )
+    return community
+
+
+def test_no_path_between_components(community):
+    assert community.find_transfer_path_sender_pays_fees(A, E, 10) == (0, [])
+    assert community.find_transfer_path_receiver_pays_fees(A, E, 10) == (0, [])
+    assert community.find_maximum_capacity_path(A, E, exact=True) == (0, [])
+    assert community.find_alternative_transfer_paths(A, E, 10, num_paths=3) == []
+    assert community.find_split_transfer_paths(A, E, 10, max_paths=3) == []
+
+
+def test_components_follow_updates(community):
+    community.update_trustline(C, D, 100, 100)
+    assert community.find_transfer_path_sender_pays_fees(A, E, 10)[1] == [
+        A,
+        B,
+        C,
+        D,
+        E,
+    ]
+    community.update_balance(F, G, 5)
+    assert community.find_transfer_path_sender_pays_fees(F, G, 1)[1] == [F, G]
+
+
+def test_components_after_reconcile(community):
+    community.reconcile_network([Trustline(A, B, 100, 100), Trustline(D, E, 100, 100)])
+    assert community._components.is_exact
+    assert not community._components.connected(A, C)
+    assert community.find_transfer_path_sender_pays_fees(A, C, 10) == (0, [])
+
+
+def test_index_rebuilt_after_removed_trustline(community):
+    community.remove_trustline(B, C)
+    stats = SearchStatistics()
+    assert community.find_transfer_path_sender_pays_fees(A, C, 10, stats=stats) == (
+        0,
+        [],
+    )
+    # answered without a search
+    assert stats.nodes_popped == 0
+    assert community._components.is_exact
+    assert not community._components.connected(A, C)
+
+
+def test_index_rebuilt_after_many_removed_edges():
+    graph = nx.path_graph(range(300))
+    index = ComponentIndex(graph)
+    for i in range(2):
+        graph.remove_edge(i, i + 1)
+        index.remove_edge(i, i + 1)
+    assert not index.needs_rebuild(graph.number_of_edges())
+    graph.remove_edge(2, 3)
+    index.remove_edge(2, 3)
+    assert index.needs_rebuild(graph.number_of_edges())
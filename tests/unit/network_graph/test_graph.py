@@ -1,11 +1,16 @@
+import itertools
 import time
 
 import pytest
 from tests.unit.network_graph.conftest import addresses
 
 from relay.blockchain.currency_network_proxy import Trustline
+from relay.concurrency_utils import TimeoutException
+from relay.network_graph import alg
+from relay.network_graph.alg import ExpansionBudgetExceededException, SearchStatistics
 from relay.network_graph.graph import (
     CurrencyNetworkGraphForTesting as CurrencyNetworkGraph,
+    TransferPathRequest,
 )
 from relay.network_graph.payment_path import FeePayer, PaymentPath
 
@@ -946,3 +951,327 @@ def test_update_balance_to_closed_trustlines_remove_from_graph(
     assert complex_community_with_trustlines_and_fees.graph.has_edge(G, H) is False
     assert complex_community_with_trustlines_and_fees.graph.has_node(G)
     assert complex_community_with_trustlines_and_fees.graph.has_node(H) is False
+
+
+def test_find_transfer_paths(complex_community_with_trustlines_and_fees):
+    community = complex_community_with_trustlines_and_fees
+    payment_paths = community.find_transfer_paths(
+        [
+            TransferPathRequest(A, H, 1000),
+            TransferPathRequest(H, A, 1000, fee_payer=FeePayer.RECEIVER),
+            TransferPathRequest(A, H, 1000, max_hops=3),
+        ],
+        timestamp=int(time.time()),
+    )
+    assert payment_paths == [
+        PaymentPath(
+            fee=55, path=[A, B, D, E, F, G, H], value=1000, fee_payer=FeePayer.SENDER
+        ),
+        PaymentPath(
+            fee=50,
+            path=[H, G, F, E, D, B, A],
+            value=1000,
+            fee_payer=FeePayer.RECEIVER,
+        ),
+        PaymentPath(fee=0, path=[], value=1000, fee_payer=FeePayer.SENDER),
+    ]
+
+
+def test_find_transfer_paths_same_as_single_paths(
+    complex_community_with_trustlines_and_fees
+):
+    community = complex_community_with_trustlines_and_fees
+    community.update_balance(B, D, 500, timestamp=1000)
+    community.update_trustline(A, B, 50000, 50000, 1000, 2000)
+    timestamp = 2000000
+    path_requests = [
+        TransferPathRequest(source, target, value, fee_payer)
+        for source in [A, D]
+        for target in [B, H]
+        for value in [100, 2000]
+        for fee_payer in FeePayer
+    ]
+    payment_paths = community.find_transfer_paths(path_requests, timestamp=timestamp)
+    for path_request, payment_path in zip(path_requests, payment_paths):
+        if path_request.fee_payer == FeePayer.SENDER:
+            find_transfer_path = community.find_transfer_path_sender_pays_fees
+        else:
+            find_transfer_path = community.find_transfer_path_receiver_pays_fees
+        fee, path = find_transfer_path(
+            path_request.source,
+            path_request.target,
+            path_request.value,
+            timestamp=timestamp,
+        )
+        assert (payment_path.fee, payment_path.path) == (fee, path)
+
+
+def test_find_transfer_paths_timeout(complex_community_with_trustlines):
+    payment_paths = complex_community_with_trustlines.find_transfer_paths(
+        [TransferPathRequest(A, H, 1000), TransferPathRequest(A, B, 1000)],
+        timestamp=int(time.time()),
+        timeout_per_path=-1,
+    )
+    assert [type(payment_path) for payment_path in payment_paths] == [
+        TimeoutException,
+        TimeoutException,
+    ]
+
+
+def test_find_transfer_paths_expansion_budget(complex_community_with_trustlines):
+    complex_community_with_trustlines.max_expansions = 2
+    payment_paths = complex_community_with_trustlines.find_transfer_paths(
+        [TransferPathRequest(A, H, 1000), TransferPathRequest(A, B, 1000)],
+        timestamp=int(time.time()),
+    )
+    assert isinstance(payment_paths[0], ExpansionBudgetExceededException)
+    assert payment_paths[1].path == [A, B]
+
+
+@pytest.fixture(params=[False, True])
+def interests_community(request):
+    community = CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=100,
+        custom_interests=True,
+        compact_graph=request.param,
+    )
+    return community
+
+
+def assert_same_accounts(community, other_community):
+    assert set(community.users) == set(other_community.users)
+    for user in addresses:
+        for counter_party in addresses:
+            assert community.graph.has_edge(
+                user, counter_party
+            ) == other_community.graph.has_edge(user, counter_party)
+            summary = community.get_account_sum(user, counter_party, timestamp=5000)
+            other_summary = other_community.get_account_sum(
+                user, counter_party, timestamp=5000
+            )
+            assert vars(summary) == vars(other_summary)
+
+
+def test_reconcile_network(interests_community):
+    old_trustlines = [
+        Trustline(A, B, 100, 150, 1, 2, balance=20, m_time=1000),
+        Trustline(B, C, 200, 250, balance=-30),
+        Trustline(C, D, 300, 350),
+        Trustline(D, E, 400, 450, is_frozen=True),
+        Trustline(E, F, 50, 50),
+    ]
+    new_trustlines = [
+        Trustline(A, B, 100, 150, 1, 2, balance=20, m_time=1000),
+        Trustline(B, C, 200, 250, balance=-40, m_time=2000),
+        Trustline(C, D, 300, 0, 0, 5),
+        Trustline(D, E, 400, 450),
+        Trustline(F, G, 10, 0, balance=10, is_frozen=True, m_time=3000),
+        Trustline(G, H, 0, 0, balance=5, m_time=4000),
+        Trustline(A, H),
+    ]
+    interests_community.gen_network(old_trustlines)
+    drift = interests_community.reconcile_network(new_trustlines)
+    assert drift == 6
+    assert interests_community.last_full_sync_drift == 6
+
+    expected_community = CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=100, custom_interests=True
+    )
+    expected_community.gen_network(new_trustlines[:-1])
+    assert_same_accounts(interests_community, expected_community)
+
+    assert interests_community.reconcile_network(new_trustlines) == 0
+
+
+@pytest.mark.parametrize(
+    "complex_community_with_trustlines_and_fees_configurable_balances, source, destination",
+    [
+        ([], A, E),
+        ([(A, B, 49899), (A, C, -50000)], A, B),
+        ([(A, B, -50000 + 12345), (A, C, -50000)], A, B),
+        ([(A, C, 10000), (C, D, 10000)], A, D),
+        ([(B, D, 50000)], A, E),
+        ([(D, E, -49000)], A, E),
+    ],
+    indirect=["complex_community_with_trustlines_and_fees_configurable_balances"],
+)
+def test_exact_capacity_is_maximum(
+    complex_community_with_trustlines_and_fees_configurable_balances,
+    source,
+    destination,
+):
+    community = complex_community_with_trustlines_and_fees_configurable_balances
+    sendable, max_path = community.find_maximum_capacity_path(
+        source, destination, exact=True
+    )
+    assert sendable > 0
+    assert_maximum_path(community, max_path, sendable)
+
+
+def test_exact_capacity_not_lower_than_estimate(
+    complex_community_with_trustlines_and_fees
+):
+    estimate, _ = complex_community_with_trustlines_and_fees.find_maximum_capacity_path(
+        A, E
+    )
+    sendable, max_path = complex_community_with_trustlines_and_fees.find_maximum_capacity_path(
+        A, E, exact=True
+    )
+    assert sendable >= estimate
+    assert max_path == [A, B, D, E]
+
+
+def test_exact_capacity_max_hops(complex_community_with_trustlines_and_fees):
+    assert complex_community_with_trustlines_and_fees.find_maximum_capacity_path(
+        A, E, max_hops=2, exact=True
+    ) == (0, [])
+
+
+def test_exact_capacity_brute_force(community_with_trustlines_and_fees):
+    community_with_trustlines_and_fees.update_balance(B, C, -37)
+    for source, target in [(A, C), (A, E), (E, A), (B, D)]:
+        sendable, max_path = community_with_trustlines_and_fees.find_maximum_capacity_path(
+            source, target, exact=True
+        )
+        brute_force_sendable = max(
+            value
+            for value in range(1000)
+            if community_with_trustlines_and_fees.find_transfer_path_sender_pays_fees(
+                source, target, value
+            )[1]
+        )
+        assert sendable == brute_force_sendable
+
+
+@pytest.mark.parametrize("fee_payer", [FeePayer.SENDER, FeePayer.RECEIVER])
+def test_alternative_transfer_paths(
+    complex_community_with_trustlines_and_fees, fee_payer
+):
+    community = complex_community_with_trustlines_and_fees
+    payment_paths = community.find_alternative_transfer_paths(
+        A, E, 1000, fee_payer=fee_payer, num_paths=5
+    )
+    assert [payment_path.path for payment_path in payment_paths] == [
+        [A, B, D, E],
+        [A, C, D, E],
+    ]
+    if fee_payer == FeePayer.SENDER:
+        first_path = community.find_transfer_path_sender_pays_fees(A, E, 1000)
+    else:
+        first_path = community.find_transfer_path_receiver_pays_fees(A, E, 1000)
+    assert (payment_paths[0].fee, payment_paths[0].path) == first_path
+
+
+def test_alternative_transfer_paths_sorted_by_fees(
+    complex_community_with_trustlines_and_fees
+):
+    community = complex_community_with_trustlines_and_fees
+    # make the path over B more expensive, by using up the balance that makes
+    # it free of fees
+    community.update_balance(B, D, -20000)
+    community.update_balance(A, C, 20000)
+    payment_paths = community.find_alternative_transfer_paths(A, D, 1000, num_paths=5)
+    assert [payment_path.path for payment_path in payment_paths] == [
+        [A, C, D],
+        [A, B, D],
+    ]
+    assert payment_paths[0].fee <= payment_paths[1].fee
+
+
+def test_alternative_transfer_paths_respect_max_hops(
+    complex_community_with_trustlines_and_fees
+):
+    payment_paths = complex_community_with_trustlines_and_fees.find_alternative_transfer_paths(
+        A, D, 1000, num_paths=5, max_hops=1
+    )
+    assert payment_paths == []
+
+
+def test_expansion_budget_exceeded(complex_community_with_trustlines):
+    complex_community_with_trustlines.max_expansions = 2
+    with pytest.raises(ExpansionBudgetExceededException):
+        complex_community_with_trustlines.find_transfer_path_sender_pays_fees(
+            A, E, 10
+        )
+
+
+def test_expansion_budget_sufficient(complex_community_with_trustlines):
+    complex_community_with_trustlines.max_expansions = 1000
+    cost, path = complex_community_with_trustlines.find_transfer_path_sender_pays_fees(
+        A, E, 10
+    )
+    assert path
+
+
+def test_search_statistics_of_single_query(complex_community_with_trustlines):
+    stats = SearchStatistics()
+    complex_community_with_trustlines.find_transfer_path_sender_pays_fees(
+        A, E, 10, max_hops=1, stats=stats
+    )
+    assert stats.queries == 1
+    assert stats.nodes_popped > 0
+    assert stats.rejected_edges["max_hops"] > 0
+    assert complex_community_with_trustlines.search_statistics is None
+
+
+def test_search_statistics_of_graph(complextrustlines):
+    community = CurrencyNetworkGraph(collect_statistics=True)
+    community.gen_network(complextrustlines)
+    community.find_transfer_path_sender_pays_fees(A, E, 10)
+    community.find_maximum_capacity_path(A, E)
+    community.freeze_trustline(A, B)
+    community.find_transfer_path_receiver_pays_fees(A, B, 10)
+    stats = community.search_statistics
+    assert stats.queries == 3
+    assert stats.searches == 3
+    assert stats.edges_relaxed > 0
+    assert stats.rejected_edges["frozen"] > 0
+
+
+@pytest.fixture(params=[False, True])
+def yielding_community(request, complextrustlines):
+    community = CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=100, compact_graph=request.param
+    )
+    community.gen_network(complextrustlines)
+    community.yield_every = 1
+    return community
+
+
+def find_batch_paths(community):
+    return community.find_transfer_paths(
+        [TransferPathRequest(A, H, 1000), TransferPathRequest(H, A, 1000)],
+        timestamp=int(time.time()),
+    )
+
+
+def test_batch_paths_restart_after_graph_change(yielding_community, monkeypatch):
+    """another greenlet uses up the capacity from F to G after the search
+    for A to H has already looked at the trustline"""
+    community = yielding_community
+    sleeps = itertools.count(1)
+
+    def sleep(seconds):
+        if next(sleeps) == 3:
+            community.update_balance(F, G, -49500)
+
+    monkeypatch.setattr(alg.gevent, "sleep", sleep)
+    payment_paths = find_batch_paths(community)
+
+    community.yield_every = None
+    assert payment_paths == find_batch_paths(community)
+
+
+def test_paths_without_yielding_after_restarts(yielding_community, monkeypatch):
+    community = yielding_community
+    balances = itertools.count(1)
+
+    def sleep(seconds):
+        community.update_balance(D, E, next(balances))
+
+    monkeypatch.setattr(alg.gevent, "sleep", sleep)
+    cost, path = community.find_transfer_path_sender_pays_fees(A, H, 1000)
+
+    community.yield_every = None
+    assert (cost, path) == community.find_transfer_path_sender_pays_fees(A, H, 1000)
+    assert not community._yielding_disabled
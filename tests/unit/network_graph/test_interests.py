@@ -4,7 +4,12 @@ import pytest
 from tests.unit.network_graph.conftest import addresses
 
 from relay.blockchain.currency_network_proxy import Trustline
-from relay.network_graph.graph import Account, NetworkGraphConfig
+from relay.network_graph import trustline_data
+from relay.network_graph.graph import (
+    Account,
+    NetworkGraphConfig,
+    balance_with_interests_snapshot,
+)
 from relay.network_graph.graph_constants import (
     balance_ab,
     creditline_ab,
@@ -15,6 +20,7 @@ from relay.network_graph.graph_constants import (
 )
 from relay.network_graph.interests import (
     DELTA_TIME_MINIMAL_ALLOWED_VALUE,
+    balance_with_interests,
     calculate_interests,
 )
 
@@ -366,3 +372,42 @@ def test_calculate_interests_delta_time_out_of_bounds():
             internal_interest_rate=1000,
             delta_time_in_seconds=DELTA_TIME_MINIMAL_ALLOWED_VALUE - 1,
         )
+
+
+def test_balance_with_interests_delta_time_out_of_bounds_without_interests():
+    with pytest.raises(ValueError):
+        balance_with_interests(
+            balance=1000,
+            internal_interest_rate_positive_balance=0,
+            internal_interest_rate_negative_balance=0,
+            delta_time_in_seconds=DELTA_TIME_MINIMAL_ALLOWED_VALUE - 1,
+        )
+
+
+@pytest.mark.parametrize("balance", [-123456789, -1, 0, 1, 987654321])
+@pytest.mark.parametrize("interest_rates", [(0, 0), (0, 1000), (300, 7), (1, 0)])
+def test_balance_with_interests_snapshot_cache(balance, interest_rates):
+    data = {
+        creditline_ab: 0,
+        creditline_ba: 0,
+        interest_ab: interest_rates[0],
+        interest_ba: interest_rates[1],
+        m_time: 1000,
+        balance_ab: balance,
+    }
+    timestamp = 1000 + 3 * SECONDS_PER_YEAR + 17
+    expected = {
+        (user, counter_party): balance_with_interests_snapshot(
+            trustline_data, data, user, counter_party, timestamp
+        )
+        for user, counter_party in [(A, B), (B, A)]
+    }
+    for first, second in [(A, B), (B, A)]:
+        balance_cache: dict = {}
+        for user, counter_party in [(first, second), (second, first)]:
+            assert (
+                balance_with_interests_snapshot(
+                    trustline_data, data, user, counter_party, timestamp, balance_cache
+                )
+                == expected[user, counter_party]
+            )
@@ -0,0 +1,191 @@
+import itertools
+import math
+import random
+
+import networkx as nx
+import pytest
+from tests.unit.network_graph.conftest import addresses
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.network_graph.graph import (
+    CurrencyNetworkGraphForTesting as CurrencyNetworkGraph,
+)
+from relay.network_graph.landmarks import HopLandmarks
+
+A, B, C, D, E, F, G, H = addresses
+
+
+def random_trustlines(seed, num_nodes=30, num_trustlines=70):
+    rng = random.Random(seed)
+    nodes = ["0x{:040x}".format(i) for i in range(num_nodes)]
+    trustlines = {}
+    while len(trustlines) < num_trustlines:
+        user, counter_party = sorted(rng.sample(nodes, 2))
+        trustlines[user, counter_party] = Trustline(
+            user,
+            counter_party,
+            rng.choice([0, 50, 100, 1000]),
+            rng.choice([0, 50, 100, 1000]),
+            balance=rng.randint(-50, 50),
+            is_frozen=rng.random() < 0.05,
+        )
+    return nodes, list(trustlines.values())
+
+
+@pytest.fixture(params=[0, 1, 2])
+def seed(request):
+    return request.param
+
+
+@pytest.fixture(params=[0, 100])
+def capacity_imbalance_fee_divisor(request):
+    # without fees there are many paths with the same cost
+    return request.param
+
+
+@pytest.fixture(params=[False, True])
+def compact_graph(request):
+    return request.param
+
+
+def test_lower_bound_is_not_higher_than_hops(seed):
+    nodes, trustlines = random_trustlines(seed, num_trustlines=35)
+    graph = nx.Graph()
+    graph.add_nodes_from(nodes)
+    graph.add_edges_from((t.user, t.counter_party) for t in trustlines)
+    graph.remove_nodes_from([node for node in nodes if graph.degree(node) == 0])
+    landmarks = HopLandmarks(graph, 4)
+
+    hops = dict(nx.all_pairs_shortest_path_length(graph))
+    for node, target in itertools.permutations(graph.nodes(), 2):
+        lower_bound = landmarks.lower_bound(node, target)
+        if target in hops[node]:
+            assert lower_bound <= hops[node][target]
+        else:
+            assert lower_bound == math.inf
+
+
+def test_landmarks_chosen_farthest():
+    graph = nx.path_graph([A, B, C, D, E])
+    graph.add_edge(C, F)
+    landmarks = HopLandmarks(graph, 2)
+    assert landmarks.landmarks[0] == C
+    assert landmarks.lower_bound(A, E) == 4
+
+
+def test_landmarks_in_every_component():
+    graph = nx.Graph([(A, B), (B, C), (D, E)])
+    landmarks = HopLandmarks(graph, 2)
+    assert landmarks.lower_bound(A, D) == math.inf
+    assert landmarks.lower_bound(D, E) == 1
+
+
+def assert_same_paths(community, goal_directed_community, nodes, timestamp=0):
+    for source, target in itertools.permutations(nodes, 2):
+        for value in [1, 60]:
+            for max_hops in [None, 3]:
+                for method in [
+                    "find_transfer_path_sender_pays_fees",
+                    "find_transfer_path_receiver_pays_fees",
+                ]:
+                    kwargs = dict(
+                        source=source,
+                        target=target,
+                        value=value,
+                        max_hops=max_hops,
+                        timestamp=timestamp,
+                    )
+                    assert getattr(community, method)(**kwargs) == getattr(
+                        goal_directed_community, method
+                    )(**kwargs)
+
+
+@pytest.fixture
+def communities(seed, capacity_imbalance_fee_divisor, compact_graph):
+    nodes, trustlines = random_trustlines(seed)
+    result = []
+    for num_landmarks in [0, 3]:
+        community = CurrencyNetworkGraph(
+            capacity_imbalance_fee_divisor=capacity_imbalance_fee_divisor,
+            compact_graph=compact_graph,
+            num_landmarks=num_landmarks,
+        )
+        community.gen_network(trustlines)
+        result.append(community)
+    return nodes, result
+
+
+def test_goal_directed_same_paths(communities):
+    nodes, (community, goal_directed_community) = communities
+    assert_same_paths(community, goal_directed_community, nodes[:12])
+
+
+def test_goal_directed_same_paths_after_updates(communities):
+    nodes, (community, goal_directed_community) = communities
+    # compute the landmarks before the updates
+    goal_directed_community.find_transfer_path_sender_pays_fees(nodes[0], nodes[1])
+    for c in [community, goal_directed_community]:
+        c.update_trustline(nodes[0], nodes[29], 1000, 1000)
+        c.update_balance(nodes[3], nodes[28], 10)
+        for trustline in list(c.graph.edges(nodes[5])):
+            c.remove_trustline(*trustline)
+    assert_same_paths(community, goal_directed_community, nodes[:6] + nodes[27:])
+
+
+def test_goal_directed_no_path():
+    community = CurrencyNetworkGraph(num_landmarks=2)
+    community.gen_network(
+        [Trustline(A, B, 100, 100), Trustline(C, D, 100, 100), Trustline(D, E, 1, 1)]
+    )
+    assert community.find_transfer_path_sender_pays_fees(A, D, 10) == (0, [])
+    assert community.find_transfer_path_sender_pays_fees(C, E, 10) == (0, [])
+    assert community.find_transfer_path_sender_pays_fees(A, H, 10) == (0, [])
+    assert community.find_transfer_path_sender_pays_fees(C, E, 1) == (0, [C, D, E])
+
+
+def test_lower_bound_is_not_higher_than_hops_after_changes(seed):
+    rng = random.Random(seed)
+    nodes, trustlines = random_trustlines(seed, num_trustlines=35)
+    graph = nx.Graph((t.user, t.counter_party) for t in trustlines)
+    landmarks = HopLandmarks(graph, 4)
+    for _ in range(40):
+        u, v = rng.sample(nodes, 2)
+        if graph.has_edge(u, v):
+            graph.remove_edge(u, v)
+            continue
+        if not landmarks.add_edge(graph, u, v):
+            graph.add_edge(u, v)
+            landmarks = HopLandmarks(graph, 4)
+            continue
+        graph.add_edge(u, v)
+
+        # removed trustlines can only make the bounds lower
+        hops = dict(nx.all_pairs_shortest_path_length(graph))
+        for node, target in itertools.permutations(graph.nodes(), 2):
+            if target in hops[node]:
+                assert landmarks.lower_bound(node, target) <= hops[node][target]
+
+
+def test_landmarks_kept_for_trustlines_not_shortening_paths():
+    community = CurrencyNetworkGraph(num_landmarks=2, path_cache_size=10)
+    community.gen_network(
+        [Trustline(*pair, 100, 100) for pair in [(A, B), (B, C), (C, D), (D, E)]]
+    )
+    community.find_transfer_path_sender_pays_fees(A, B, 10)
+    landmarks = community._landmarks
+
+    community.update_trustline(E, F, 100, 100)
+    community.update_trustline(F, G, 100, 100)
+
+    assert community._landmarks is landmarks
+    assert community.path_cache.size == 1
+    assert landmarks.lower_bound(G, A) == 4
+    assert community.find_transfer_path_sender_pays_fees(G, A, 10) == (
+        0,
+        [G, F, E, D, C, B, A],
+    )
+
+    community.update_trustline(A, E, 100, 100)
+
+    assert community._landmarks is None
+    assert community.path_cache.size == 0
@@ -0,0 +1,207 @@
+import itertools
+
+import pytest
+from tests.unit.network_graph.conftest import addresses
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.network_graph.graph import (
+    CurrencyNetworkGraphForTesting as CurrencyNetworkGraph,
+)
+from relay.network_graph.path_cache import PathCache
+
+A, B, C, D, E, F, G, H = addresses
+
+
+@pytest.fixture
+def trustlines():
+    return [
+        Trustline(A, B, 100, 150),
+        Trustline(B, C, 200, 250, balance=-30),
+        Trustline(C, D, 300, 350),
+        Trustline(A, D, 10, 10),
+        Trustline(E, F, 500, 500),
+        Trustline(F, G, 500, 500),
+    ]
+
+
+@pytest.fixture
+def communities(trustlines):
+    """a community without and one with a path cache"""
+    result = []
+    for path_cache_size in [0, 1000]:
+        community = CurrencyNetworkGraph(
+            capacity_imbalance_fee_divisor=100, path_cache_size=path_cache_size
+        )
+        community.gen_network(trustlines)
+        result.append(community)
+    return result
+
+
+def find_all_paths(community):
+    return [
+        find_transfer_path(source, target, value)
+        for source, target in itertools.permutations(addresses, 2)
+        for value in [5, 100]
+        for find_transfer_path in [
+            community.find_transfer_path_sender_pays_fees,
+            community.find_transfer_path_receiver_pays_fees,
+        ]
+    ]
+
+
+def assert_same_paths(communities):
+    community, cached_community = communities
+    paths = find_all_paths(community)
+    assert find_all_paths(cached_community) == paths
+    # a second time to get the results from the cache
+    assert find_all_paths(cached_community) == paths
+
+
+def test_path_cache_lru():
+    cache = PathCache(2)
+    cache.put(1, "a", [A, B])
+    cache.put(2, "b", [B, C])
+    assert cache.get(1) == "a"
+    cache.put(3, "c", [D])
+    assert cache.get(2) is None
+    assert cache.get(1) == "a"
+    assert cache.get(3) == "c"
+    assert (cache.hits, cache.misses, cache.evictions) == (3, 1, 1)
+
+
+def test_path_cache_invalidate_trustline():
+    cache = PathCache(10)
+    cache.put(1, "a", [A, B])
+    cache.put(2, "b", [B, C])
+    cache.put(3, "c", [D, E])
+    cache.invalidate_trustline(C, D)
+    assert cache.get(1) == "a"
+    assert cache.get(2) is None
+    assert cache.get(3) is None
+    assert cache.invalidations == 2
+    assert cache.size == 1
+
+
+def test_path_cache_disabled():
+    cache = PathCache(0)
+    cache.put(1, "a", [A])
+    assert cache.get(1) is None
+    assert cache.size == 0
+
+
+def test_cached_paths(communities):
+    assert_same_paths(communities)
+    _, cached_community = communities
+    assert cached_community.path_cache.hits > 0
+
+
+def test_cached_paths_after_updates(communities):
+    assert_same_paths(communities)
+    for community in communities:
+        community.update_balance(A, B, -50)
+        community.update_trustline(D, E, 1000, 1000)
+        community.freeze_trustline(F, G)
+    assert_same_paths(communities)
+    for community in communities:
+        community.remove_trustline(A, D)
+        community.update_trustline(B, C, 0, 0)
+        community.mediated_transfer(C, E, 10)
+    assert_same_paths(communities)
+
+
+def test_cached_paths_after_gen_network(communities, trustlines):
+    assert_same_paths(communities)
+    for community in communities:
+        community.gen_network(trustlines[1:])
+    assert_same_paths(communities)
+
+
+def test_unrelated_update_keeps_cached_path(communities):
+    _, community = communities
+    assert community.find_transfer_path_sender_pays_fees(A, C, 10)[1] == [A, B, C]
+    community.update_balance(E, F, 10)
+    community.find_transfer_path_sender_pays_fees(A, C, 10)
+    assert community.path_cache.hits == 1
+    assert community.path_cache.invalidations == 0
+    community.update_balance(C, D, 10)
+    community.find_transfer_path_sender_pays_fees(A, C, 10)
+    assert community.path_cache.hits == 1
+    assert community.path_cache.invalidations == 1
+
+
+def test_cached_path_is_not_shared(communities):
+    _, community = communities
+    community.find_transfer_path_sender_pays_fees(A, C, 10)[1].append(H)
+    assert community.find_transfer_path_sender_pays_fees(A, C, 10)[1] == [A, B, C]
+
+
+def test_no_path_invalidated_by_new_trustline(communities):
+    _, community = communities
+    assert community.find_transfer_path_sender_pays_fees(A, H, 10) == (0, [])
+    community.update_trustline(D, H, 100, 100)
+    assert community.find_transfer_path_sender_pays_fees(A, H, 10)[1][-2:] == [D, H]
+
+
+def test_path_cache_ignores_results_of_outdated_searches():
+    cache = PathCache(10)
+    version = cache.version
+    cache.invalidate_trustline(A, B)
+    cache.put(1, "a", [C], version=version)
+    assert cache.get(1) is None
+
+    version = cache.version
+    cache.put(1, "a", [C], version=version)
+    assert cache.get(1) == "a"
+
+
+def symmetric_trustline(a, b):
+    user, counter_party = sorted([a, b])
+    return Trustline(user, counter_party, 100, 100)
+
+
+def test_cached_path_invalidated_by_trustline_of_unexpanded_nodes():
+    # without fees the goal directed search stops as soon as the estimated
+    # number of hops exceeds the one of the path found
+    community = CurrencyNetworkGraph(path_cache_size=1000, num_landmarks=8)
+    community.gen_network(
+        [
+            symmetric_trustline(A, B),
+            symmetric_trustline(B, C),
+            symmetric_trustline(C, G),
+            symmetric_trustline(G, D),
+            symmetric_trustline(A, E),
+            symmetric_trustline(H, D),
+        ]
+    )
+    assert community.find_transfer_path_sender_pays_fees(A, D, 10)[1] == [
+        A,
+        B,
+        C,
+        G,
+        D,
+    ]
+    # E and H are too far away from the other end of the path to be expanded
+    # until they get a trustline
+    community.update_trustline(E, H, 100, 100)
+    assert community.find_transfer_path_sender_pays_fees(A, D, 10)[1] == [A, E, H, D]
+
+
+def test_reached_nodes_include_unexpanded_nodes():
+    community = CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=100, path_cache_size=1000, num_landmarks=8
+    )
+    community.gen_network(
+        [
+            symmetric_trustline(A, B),
+            symmetric_trustline(B, C),
+            symmetric_trustline(A, E),
+            symmetric_trustline(E, F),
+            symmetric_trustline(F, G),
+            symmetric_trustline(G, C),
+        ]
+    )
+    assert community.find_transfer_path_sender_pays_fees(A, C, 10)[1] == [A, B, C]
+    # a higher capacity between E and F does not make a cheaper path, but the
+    # search may depend on it without expanding E
+    community.update_trustline(F, E, 200, 200)
+    assert community.path_cache.invalidations == 1
@@ -0,0 +1,157 @@
+import pytest
+from tests.unit.network_graph.conftest import addresses
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.network_graph.graph import (
+    CurrencyNetworkGraphForTesting as CurrencyNetworkGraph,
+)
+from relay.network_graph.payment_path import FeePayer
+
+A, B, C, D, E, F, G, H = addresses
+
+
+@pytest.fixture(params=[False, True])
+def compact_graph(request):
+    return request.param
+
+
+def create_community(trustlines, compact_graph, capacity_imbalance_fee_divisor=100):
+    community = CurrencyNetworkGraph(
+        capacity_imbalance_fee_divisor=capacity_imbalance_fee_divisor,
+        compact_graph=compact_graph,
+    )
+    community.gen_network(trustlines)
+    return community
+
+
+@pytest.fixture
+def parallel_paths_community(compact_graph):
+    """two paths from A to E, each able to carry about 100"""
+    return create_community(
+        [
+            Trustline(A, B, 0, 1000),
+            Trustline(B, E, 0, 100),
+            Trustline(A, C, 0, 1000),
+            Trustline(C, E, 0, 100),
+        ],
+        compact_graph,
+    )
+
+
+@pytest.fixture
+def shared_trustline_community(compact_graph):
+    """two paths from A to E, sharing the trustline between A and B"""
+    return create_community(
+        [
+            Trustline(A, B, 0, 100),
+            Trustline(B, C, 0, 1000),
+            Trustline(C, E, 0, 1000),
+            Trustline(B, D, 0, 1000),
+            Trustline(D, E, 0, 1000),
+        ],
+        compact_graph,
+    )
+
+
+def assert_transferable(community, payment_paths):
+    """do the transfers along the paths and check their fees"""
+    for payment_path in payment_paths:
+        community.transfer_path(payment_path.path, payment_path.value, payment_path.fee)
+
+
+def test_single_path_is_enough(parallel_paths_community):
+    payment_paths = parallel_paths_community.find_split_transfer_paths(
+        A, E, 50, max_paths=3
+    )
+    assert len(payment_paths) == 1
+    assert payment_paths[0].value == 50
+
+
+def test_split_over_two_paths(parallel_paths_community):
+    payment_paths = parallel_paths_community.find_split_transfer_paths(
+        A, E, 150, max_paths=3
+    )
+    assert len(payment_paths) == 2
+    assert sum(payment_path.value for payment_path in payment_paths) == 150
+    assert {tuple(payment_path.path) for payment_path in payment_paths} == {
+        (A, B, E),
+        (A, C, E),
+    }
+    assert_transferable(parallel_paths_community, payment_paths)
+
+
+def test_split_not_enough_paths(parallel_paths_community):
+    assert (
+        parallel_paths_community.find_split_transfer_paths(A, E, 150, max_paths=1) == []
+    )
+
+
+def test_split_not_enough_capacity(parallel_paths_community):
+    assert (
+        parallel_paths_community.find_split_transfer_paths(A, E, 250, max_paths=5) == []
+    )
+
+
+def test_split_shared_trustline(shared_trustline_community):
+    # both paths use the trustline between A and B, which can only carry 100
+    assert (
+        shared_trustline_community.find_split_transfer_paths(A, E, 120, max_paths=5)
+        == []
+    )
+    payment_paths = shared_trustline_community.find_split_transfer_paths(
+        A, E, 97, max_paths=5
+    )
+    assert sum(payment_path.value for payment_path in payment_paths) == 97
+    assert_transferable(shared_trustline_community, payment_paths)
+
+
+def test_split_max_fees(parallel_paths_community):
+    payment_paths = parallel_paths_community.find_split_transfer_paths(
+        A, E, 150, max_paths=3
+    )
+    sum_fees = sum(payment_path.fee for payment_path in payment_paths)
+    assert sum_fees > 0
+    assert (
+        parallel_paths_community.find_split_transfer_paths(
+            A, E, 150, max_paths=3, max_fees=sum_fees - 1
+        )
+        == []
+    )
+    assert (
+        parallel_paths_community.find_split_transfer_paths(
+            A, E, 150, max_paths=3, max_fees=sum_fees
+        )
+        == payment_paths
+    )
+
+
+def test_split_max_hops(parallel_paths_community):
+    assert (
+        parallel_paths_community.find_split_transfer_paths(
+            A, E, 150, max_paths=3, max_hops=1
+        )
+        == []
+    )
+
+
+def test_split_receiver_pays(parallel_paths_community):
+    payment_paths = parallel_paths_community.find_split_transfer_paths(
+        A, E, 150, fee_payer=FeePayer.RECEIVER, max_paths=3
+    )
+    assert len(payment_paths) == 2
+    assert sum(payment_path.value for payment_path in payment_paths) == 150
+    for payment_path in payment_paths:
+        assert payment_path.fee_payer == FeePayer.RECEIVER
+        assert payment_path.fee > 0
+
+
+def test_split_does_not_change_graph(parallel_paths_community):
+    dump = parallel_paths_community.dump()
+    parallel_paths_community.find_split_transfer_paths(A, E, 150, max_paths=3)
+    assert parallel_paths_community.dump() == dump
+
+
+def test_split_unknown_user(parallel_paths_community):
+    assert (
+        parallel_paths_community.find_split_transfer_paths(A, H, 10, max_paths=3) == []
+    )
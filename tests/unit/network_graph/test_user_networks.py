@@ -0,0 +1,62 @@
+import pytest
+from tests.unit.network_graph.conftest import addresses
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.network_graph.graph import CurrencyNetworkGraph
+from relay.network_graph.user_networks import UserNetworksIndex
+
+A, B, C, D, E, F, G, H = addresses
+NETWORK_1 = "0x" + "1" * 40
+NETWORK_2 = "0x" + "2" * 40
+
+
+@pytest.fixture()
+def index():
+    return UserNetworksIndex()
+
+
+@pytest.fixture(params=[False, True])
+def networks(request, index):
+    network_1 = CurrencyNetworkGraph(compact_graph=request.param)
+    network_2 = CurrencyNetworkGraph(compact_graph=request.param)
+    network_1.gen_network([Trustline(A, B, 100, 100)])
+    network_1.track_users(index, NETWORK_1)
+    network_2.track_users(index, NETWORK_2)
+    network_2.gen_network([Trustline(B, C, 100, 100)])
+    return network_1, network_2
+
+
+def test_index_after_gen_network(index, networks):
+    assert index.get_networks(A) == {NETWORK_1}
+    assert index.get_networks(B) == {NETWORK_1, NETWORK_2}
+    assert index.get_networks(C) == {NETWORK_2}
+    assert index.get_networks(D) == set()
+
+
+def test_index_follows_updates(index, networks):
+    network_1, network_2 = networks
+    network_1.update_trustline(C, D, 100, 100)
+    network_2.update_balance(D, E, 10)
+    assert index.get_networks(C) == {NETWORK_1, NETWORK_2}
+    assert index.get_networks(D) == {NETWORK_1, NETWORK_2}
+    assert index.get_networks(E) == {NETWORK_2}
+
+
+def test_index_follows_removed_trustlines(index, networks):
+    network_1, network_2 = networks
+    network_1.update_trustline(B, D, 100, 100)
+    network_1.remove_trustline(A, B)
+    assert index.get_networks(A) == set()
+    assert index.get_networks(B) == {NETWORK_1, NETWORK_2}
+    # closing the trustline removes it
+    network_2.update_trustline(B, C, 0, 0)
+    assert index.get_networks(B) == {NETWORK_1}
+    assert index.get_networks(C) == set()
+
+
+def test_index_follows_regenerated_network(index, networks):
+    network_1, _ = networks
+    network_1.gen_network([Trustline(A, E, 100, 100)])
+    assert index.get_networks(A) == {NETWORK_1}
+    assert index.get_networks(B) == {NETWORK_2}
+    assert index.get_networks(E) == {NETWORK_1}
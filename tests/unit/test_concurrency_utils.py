@@ -1,7 +1,12 @@
 import gevent
 import pytest
 
-from relay.concurrency_utils import TimeoutException, joinall, synchronized
+from relay.concurrency_utils import (
+    CachedValue,
+    TimeoutException,
+    joinall,
+    synchronized,
+)
 
 
 def test_success():
@@ -109,3 +114,40 @@ def test_synchronized_method():
     gevent.joinall(greenlets, raise_error=True)
 
     assert lst == list(range(4))
+
+
+def test_cached_value():
+    fetched = []
+
+    def fetch():
+        fetched.append(len(fetched))
+        return len(fetched)
+
+    cached_value = CachedValue(ttl=10)
+    assert cached_value.get(fetch) == 1
+    assert cached_value.get(fetch) == 1
+    cached_value.invalidate()
+    assert cached_value.get(fetch) == 2
+    assert fetched == [0, 1]
+
+
+def test_cached_value_expires():
+    cached_value = CachedValue(ttl=0)
+    assert cached_value.get(lambda: 1) == 1
+    assert cached_value.get(lambda: 2) == 2
+
+
+def test_cached_value_fetched_once_by_greenlets():
+    fetched = []
+
+    def fetch():
+        fetched.append(1)
+        gevent.sleep(0.01)
+        return 42
+
+    cached_value = CachedValue(ttl=10)
+    greenlets = [gevent.spawn(cached_value.get, fetch) for i in range(4)]
+    gevent.joinall(greenlets, raise_error=True)
+
+    assert [greenlet.value for greenlet in greenlets] == [42] * 4
+    assert fetched == [1]
@@ -0,0 +1,611 @@
+import gevent
+import psycopg2
+import psycopg2.extensions
+import psycopg2.pool
+import pytest
+
+from relay import ethindex_db
+from relay.blockchain import currency_network_events, exchange_events
+from relay.blockchain.currency_network_proxy import CurrencyNetworkProxy, Trustline
+from relay.blockchain.events import EventsPage
+from relay.ethindex_db import (
+    ConnectionPool,
+    EthindexDB,
+    explain_events_query,
+    get_trustlines_or_fallback,
+    get_user_events_of_contracts,
+    select_user_event_types,
+)
+
+NETWORK_1 = "0x" + "1" * 40
+NETWORK_2 = "0x" + "2" * 40
+EXCHANGE = "0x" + "3" * 40
+USER = "0x" + "4" * 40
+OTHER_USER = "0x" + "5" * 40
+THIRD_USER = "0x" + "6" * 40
+
+
+class FakeCursor:
+    def __init__(self, conn, name=None):
+        self.conn = conn
+        self.name = name
+        self.itersize = 2000
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        if self.conn.broken:
+            raise psycopg2.OperationalError("server closed the connection")
+        self.conn.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        self.conn.queries.append((query, params))
+
+    def fetchall(self):
+        if "DISTINCT ON" in self.conn.queries[-1][0]:
+            return self.conn.latest_events.get(self.conn.queries[-1][1][1], [])
+        return self.conn.rows
+
+    def fetchone(self):
+        if self.conn.queries[-1][0].startswith("EXPLAIN"):
+            return {"QUERY PLAN": [{"Plan": {"Node Type": "Limit"}}]}
+        return {"last_block_number": self.conn.last_block_number}
+
+    def __iter__(self):
+        return iter(self.conn.rows)
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.broken = False
+        self.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+        self.queries = []
+        self.rows = []
+        # rows of the latest event per pair of users by event name
+        self.latest_events = {}
+        self.last_block_number = 100
+        self.cursor_names = []
+
+    def cursor(self, name=None):
+        self.cursor_names.append(name)
+        return FakeCursor(self, name)
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+    def rollback(self):
+        if self.broken:
+            raise psycopg2.OperationalError("server closed the connection")
+        self.rollbacks += 1
+        self.transaction_status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.rollback()
+
+    def events_queries(self):
+        return [query for query in self.queries if "FROM events" in query[0]]
+
+
+@pytest.fixture()
+def connections():
+    return []
+
+
+@pytest.fixture()
+def connect(connections):
+    def connect(dsn):
+        conn = FakeConnection()
+        connections.append(conn)
+        return conn
+
+    return connect
+
+
+def test_pool_reuses_connections(connect, connections):
+    pool = ConnectionPool(connect=connect)
+    for _ in range(3):
+        with pool.connection() as conn:
+            pass
+    assert connections == [conn]
+    assert pool.num_idle == 1
+
+
+def test_pool_limits_connections(connect, connections):
+    pool = ConnectionPool(max_size=2, timeout=0.01, connect=connect)
+    with pool.connection():
+        with pool.connection():
+            with pytest.raises(psycopg2.pool.PoolError):
+                with pool.connection():
+                    pass
+    assert len(connections) == 2
+
+
+def test_pool_waits_for_connection(connect, connections):
+    pool = ConnectionPool(max_size=1, connect=connect)
+
+    def use_connection():
+        with pool.connection():
+            gevent.sleep(0.01)
+
+    gevent.joinall([gevent.spawn(use_connection) for _ in range(3)], raise_error=True)
+    assert len(connections) == 1
+
+
+def test_pool_closes_idle_connections(connect, connections):
+    pool = ConnectionPool(idle_timeout=0, connect=connect)
+    with pool.connection() as first_conn:
+        pass
+    with pool.connection() as second_conn:
+        pass
+    assert first_conn is not second_conn
+    assert first_conn.closed
+
+
+def test_pool_replaces_broken_connections(connect, connections):
+    pool = ConnectionPool(health_check_interval=0, connect=connect)
+    with pool.connection() as first_conn:
+        pass
+    first_conn.broken = True
+    with pool.connection() as second_conn:
+        pass
+    assert first_conn is not second_conn
+    assert first_conn.closed
+
+
+def test_pool_ends_open_transactions(connect, connections):
+    pool = ConnectionPool(connect=connect)
+    with pytest.raises(ValueError):
+        with pool.connection() as conn:
+            conn.cursor().execute("SELECT 1")
+            raise ValueError()
+    assert conn.rollbacks == 1
+    assert pool.num_idle == 1
+
+
+def test_pool_drops_closed_connections(connect, connections):
+    pool = ConnectionPool(connect=connect)
+    with pool.connection() as conn:
+        conn.close()
+    assert pool.num_idle == 0
+
+
+def event_row(event_name, address, block_number, args):
+    return {
+        "transactionHash": "0x" + "ab" * 32,
+        "blockNumber": block_number,
+        "address": address,
+        "event": event_name,
+        "args": args,
+        "blockHash": "0x" + "cd" * 32,
+        "transactionIndex": 0,
+        "logIndex": 0,
+        "timestamp": 1000,
+    }
+
+
+@pytest.fixture()
+def conn():
+    ethindex_db._current_blocknumber_cache.invalidate()
+    return FakeConnection()
+
+
+@pytest.fixture()
+def conn_pool(conn):
+    return ConnectionPool(connect=lambda dsn: conn)
+
+
+def currency_network_ethindex(conn_pool, address):
+    return EthindexDB(
+        conn_pool,
+        address=address,
+        standard_event_types=currency_network_events.standard_event_types,
+        event_builders=currency_network_events.event_builders,
+        from_to_types=currency_network_events.from_to_types,
+    )
+
+
+def test_get_all_contract_events_in_one_query(conn_pool, conn):
+    conn.rows = [
+        event_row("Transfer", NETWORK_1, 3, {"_from": USER, "_to": OTHER_USER}),
+        event_row(
+            "TrustlineUpdate", NETWORK_1, 4, {"_creditor": OTHER_USER, "_debtor": USER}
+        ),
+    ]
+    ethindex = currency_network_ethindex(conn_pool, NETWORK_1)
+    events = ethindex.get_all_network_events(user_address=USER, from_block=2)
+
+    [(query, params)] = conn.events_queries()
+    assert params[:2] == (2, NETWORK_1)
+    assert params.count(USER) == 2 * len(currency_network_events.standard_event_types)
+    assert [event.type for event in events] == ["Transfer", "TrustlineUpdate"]
+    assert all(event.user == USER for event in events)
+    assert events[0].status == "confirmed"
+
+
+def exchange_ethindex(conn_pool):
+    return EthindexDB(
+        conn_pool,
+        address=EXCHANGE,
+        standard_event_types=exchange_events.standard_event_types,
+        event_builders=exchange_events.event_builders,
+        from_to_types=exchange_events.from_to_types,
+    )
+
+
+def test_user_events_of_contracts_in_one_query(conn_pool, conn):
+    conn.rows = [
+        event_row("Transfer", NETWORK_2, 3, {"_from": USER, "_to": OTHER_USER}),
+        event_row(
+            "LogFill",
+            EXCHANGE,
+            5,
+            {"maker": OTHER_USER, "taker": USER, "orderHash": "0x" + "ef" * 32},
+        ),
+    ]
+    events = get_user_events_of_contracts(
+        [
+            (currency_network_ethindex(conn_pool, NETWORK_1), ["Transfer"]),
+            (currency_network_ethindex(conn_pool, NETWORK_2), ["Transfer"]),
+            (exchange_ethindex(conn_pool), exchange_events.standard_event_types),
+        ],
+        USER,
+        from_block=2,
+    )
+
+    [(query, params)] = conn.events_queries()
+    assert params[0] == 2
+    for address in (NETWORK_1, NETWORK_2, EXCHANGE):
+        assert address in params
+    assert [type(event) for event in events] == [
+        currency_network_events.TransferEvent,
+        exchange_events.LogFillEvent,
+    ]
+    assert events[0].network_address == NETWORK_2
+    assert all(event.user == USER for event in events)
+
+
+@pytest.fixture()
+def user_event_selectors(conn_pool):
+    network_ethindex = currency_network_ethindex(conn_pool, NETWORK_1)
+    return [
+        (network_ethindex, network_ethindex.event_types),
+        (exchange_ethindex(conn_pool), exchange_events.standard_event_types),
+    ]
+
+
+def test_select_all_user_event_types(user_event_selectors):
+    assert [
+        event_types for _, event_types in select_user_event_types(user_event_selectors)
+    ] == [
+        currency_network_events.standard_event_types,
+        exchange_events.standard_event_types,
+    ]
+
+
+@pytest.mark.parametrize(
+    "type, address, args",
+    [
+        ("Transfer", NETWORK_1, {"_from": USER, "_to": OTHER_USER}),
+        (
+            "LogFill",
+            EXCHANGE,
+            {"maker": OTHER_USER, "taker": USER, "orderHash": "0x" + "ef" * 32},
+        ),
+    ],
+)
+def test_typed_user_events_only_of_contracts_with_type(
+    conn_pool, conn, user_event_selectors, type, address, args
+):
+    conn.rows = [event_row(type, address, 3, args)]
+    events = get_user_events_of_contracts(
+        select_user_event_types(user_event_selectors, type), USER
+    )
+
+    [(query, params)] = conn.events_queries()
+    assert address in params
+    assert (EXCHANGE if address == NETWORK_1 else NETWORK_1) not in params
+    assert params.count(type) == 1
+    assert [event.type for event in events] == [type]
+
+
+def test_typed_user_events_of_no_contracts_with_type(
+    conn_pool, conn, user_event_selectors
+):
+    assert select_user_event_types(user_event_selectors, "Approval") == []
+
+
+def test_user_events_of_no_contracts(conn_pool, conn):
+    assert get_user_events_of_contracts([], USER) == []
+    assert conn.queries == []
+
+
+def test_current_blocknumber_is_cached(conn_pool, conn):
+    ethindex = currency_network_ethindex(conn_pool, NETWORK_1)
+    ethindex.get_all_network_events(user_address=USER)
+    ethindex.get_all_network_events(user_address=OTHER_USER)
+
+    assert len(conn.events_queries()) == 2
+    assert len([query for query in conn.queries if "from sync" in query[0]]) == 1
+
+
+def test_events_page_is_selected_in_query(conn_pool, conn):
+    ethindex = currency_network_ethindex(conn_pool, NETWORK_1)
+    ethindex.get_all_network_events(
+        user_address=USER, page=EventsPage(after=(3, 1, 2), to_block=10, limit=5)
+    )
+
+    [(query, params)] = conn.events_queries()
+    assert "(blockNumber, transactionIndex, logIndex) > (%s, %s, %s)" in query
+    assert "LIMIT %s" in query
+    assert params[-5:] == (3, 1, 2, 10, 5)
+    assert "events" in conn.cursor_names
+
+
+def test_explain_events_query(conn_pool, conn):
+    ethindex = currency_network_ethindex(conn_pool, NETWORK_1)
+    plan = explain_events_query(
+        conn_pool,
+        ethindex.user_contract_events_query(["Transfer"], USER),
+        EventsPage(limit=10),
+    )
+
+    [(query, params)] = conn.queries
+    assert query.startswith("EXPLAIN (FORMAT JSON) SELECT")
+    assert params[-1] == 10
+    assert plan == [{"Plan": {"Node Type": "Limit"}}]
+
+
+class FakeCurrencyNetwork:
+    """keeps the accounts of a currency network like the contract does and
+    the events it emits, so that the trustlines read from the events can be
+    compared with the ones read from the contract"""
+
+    def __init__(self):
+        # account of a pair of users, seen from the smaller address
+        self.accounts = {}
+        self.events = []
+
+    def _account(self, a, b):
+        return self.accounts.setdefault(
+            tuple(sorted((a, b))),
+            dict(creditlines=[0, 0], interests=[0, 0], is_frozen=False, m_time=0),
+        )
+
+    def _emit(self, event_name, args, timestamp=1000):
+        self.events.append(
+            dict(
+                event_row(event_name, NETWORK_1, len(self.events), args),
+                timestamp=timestamp,
+            )
+        )
+
+    def update_trustline(
+        self, creditor, debtor, given, received, interest_given=0, interest_received=0
+    ):
+        account = self._account(creditor, debtor)
+        i = 0 if creditor < debtor else 1
+        account["creditlines"][i], account["creditlines"][1 - i] = given, received
+        account["interests"][i] = interest_given
+        account["interests"][1 - i] = interest_received
+        self._emit(
+            "TrustlineUpdate",
+            {
+                "_creditor": creditor,
+                "_debtor": debtor,
+                "_creditlineGiven": given,
+                "_creditlineReceived": received,
+                "_interestRateGiven": interest_given,
+                "_interestRateReceived": interest_received,
+                "_isFrozen": False,
+            },
+        )
+
+    def update_balance(self, _from, _to, value, timestamp):
+        """set the balance seen from _from to value"""
+        account = self._account(_from, _to)
+        account["balance"] = value if _from < _to else -value
+        account["m_time"] = timestamp
+        self._emit(
+            "BalanceUpdate", {"_from": _from, "_to": _to, "_value": value}, timestamp
+        )
+
+    def latest_events(self):
+        """the rows the DISTINCT ON queries select from the events"""
+        from_to_types = currency_network_events.from_to_types
+        latest = {}
+        for row in self.events:
+            _from, _to = from_to_types[row["event"]]
+            pair = frozenset((row["args"][_from], row["args"][_to]))
+            latest[row["event"], pair] = row
+        result = {}
+        for (event_name, _), row in sorted(
+            latest.items(), key=lambda item: sorted(item[0][1])
+        ):
+            result.setdefault(event_name, []).append(
+                {"args": row["args"], "timestamp": row["timestamp"]}
+            )
+        return result
+
+    def proxy(self):
+        """a CurrencyNetworkProxy reading the accounts"""
+        proxy = CurrencyNetworkProxy.__new__(CurrencyNetworkProxy)
+        proxy._proxy = FakeContract(self)
+        return proxy
+
+
+class FakeContract:
+    def __init__(self, network):
+        self.functions = self
+        self.network = network
+
+    def _call(self, value):
+        return type("Call", (), {"call": lambda _: value})()
+
+    def _open_accounts(self):
+        # closed trustlines are removed from the friends
+        return {
+            pair: account
+            for pair, account in self.network.accounts.items()
+            if account["creditlines"] != [0, 0] or account.get("balance", 0) != 0
+        }
+
+    def getUsers(self):
+        return self._call(
+            sorted({user for pair in self._open_accounts() for user in pair})
+        )
+
+    def getFriends(self, user):
+        return self._call(
+            [b if a == user else a for a, b in self._open_accounts() if user in (a, b)]
+        )
+
+    def getAccount(self, a, b):
+        account = self.network._account(a, b)
+        i = 0 if a < b else 1
+        sign = 1 if a < b else -1
+        return self._call(
+            [
+                account["creditlines"][i],
+                account["creditlines"][1 - i],
+                account["interests"][i],
+                account["interests"][1 - i],
+                account["is_frozen"],
+                account["m_time"],
+                sign * account.get("balance", 0),
+            ]
+        )
+
+
+def assert_trustlines_read_from_events(network, conn_pool, conn):
+    conn.latest_events = network.latest_events()
+    _, trustlines = currency_network_ethindex(conn_pool, NETWORK_1).get_trustlines()
+    assert sorted(trustlines) == sorted(network.proxy().gen_graph_representation())
+    return trustlines
+
+
+@pytest.mark.parametrize("creditor, debtor", [(USER, OTHER_USER), (OTHER_USER, USER)])
+def test_trustlines_match_contract(conn_pool, conn, creditor, debtor):
+    network = FakeCurrencyNetwork()
+    network.update_trustline(creditor, debtor, 100, 200, 1, 2)
+    network.update_trustline(creditor, debtor, 300, 400, 3, 4)
+    network.update_balance(creditor, debtor, 50, timestamp=1234)
+    network.update_trustline(creditor, THIRD_USER, 10, 20)
+
+    trustlines = assert_trustlines_read_from_events(network, conn_pool, conn)
+
+    assert (
+        Trustline(
+            USER,
+            OTHER_USER,
+            *((300, 400, 3, 4) if creditor == USER else (400, 300, 4, 3)),
+            is_frozen=False,
+            m_time=1234,
+            balance=50 if creditor == USER else -50,
+        )
+        in trustlines
+    )
+    trustline_queries = [
+        query for query, params in conn.queries if "DISTINCT ON" in query
+    ]
+    assert "LEAST(args->>'_creditor', args->>'_debtor')" in trustline_queries[0]
+    assert "GREATEST(args->>'_from', args->>'_to')" in trustline_queries[1]
+
+
+@pytest.mark.parametrize("_from, _to", [(USER, OTHER_USER), (OTHER_USER, USER)])
+def test_trustlines_use_latest_balance(conn_pool, conn, _from, _to):
+    network = FakeCurrencyNetwork()
+    network.update_trustline(USER, OTHER_USER, 100, 200)
+    network.update_balance(_from, _to, -30, timestamp=1100)
+    network.update_balance(_to, _from, 20, timestamp=1200)
+
+    [trustline] = assert_trustlines_read_from_events(network, conn_pool, conn)
+
+    assert trustline.balance == (20 if _to == USER else -20)
+    assert trustline.m_time == 1200
+
+
+def test_closed_trustlines_are_left_out(conn_pool, conn):
+    network = FakeCurrencyNetwork()
+    network.update_trustline(USER, OTHER_USER, 100, 200)
+    network.update_balance(USER, OTHER_USER, 50, timestamp=1100)
+    network.update_trustline(USER, THIRD_USER, 100, 200)
+    network.update_balance(OTHER_USER, USER, 0, timestamp=1200)
+    network.update_trustline(OTHER_USER, USER, 0, 0)
+
+    [trustline] = assert_trustlines_read_from_events(network, conn_pool, conn)
+
+    assert {trustline.user, trustline.counter_party} == {USER, THIRD_USER}
+
+
+def test_trustlines_read_in_one_transaction(conn_pool, conn):
+    network = FakeCurrencyNetwork()
+    network.update_trustline(USER, OTHER_USER, 100, 200)
+    conn.latest_events = network.latest_events()
+    conn.last_block_number = 118
+
+    block_number, trustlines = currency_network_ethindex(
+        conn_pool, NETWORK_1
+    ).get_trustlines()
+
+    assert block_number == 118
+    assert trustlines == [Trustline(USER, OTHER_USER, 100, 200)]
+    queries = [query for query, params in conn.queries]
+    assert queries[0] == "SET TRANSACTION ISOLATION LEVEL REPEATABLE READ"
+    assert ["DISTINCT ON" in query for query in queries[1:3]] == [True, True]
+    assert "from sync" in queries[3]
+    # the transaction is only ended once
+    assert conn.rollbacks == 1
+
+
+def node_trustlines():
+    return 120, [Trustline(USER, OTHER_USER, 1, 2)]
+
+
+def test_full_sync_trustlines_from_ethindex(conn_pool, conn):
+    network = FakeCurrencyNetwork()
+    network.update_trustline(USER, OTHER_USER, 100, 200)
+    conn.latest_events = network.latest_events()
+    conn.last_block_number = 118
+
+    block_number, trustlines = get_trustlines_or_fallback(
+        currency_network_ethindex(conn_pool, NETWORK_1),
+        lambda: 120,
+        node_trustlines,
+        max_lag=2,
+    )
+
+    assert block_number == 118
+    assert trustlines == [Trustline(USER, OTHER_USER, 100, 200)]
+
+
+def test_full_sync_trustlines_from_node_if_ethindex_lags(conn_pool, conn):
+    conn.last_block_number = 117
+
+    result = get_trustlines_or_fallback(
+        currency_network_ethindex(conn_pool, NETWORK_1),
+        lambda: 120,
+        node_trustlines,
+        max_lag=2,
+    )
+
+    assert result == node_trustlines()
+
+
+def test_full_sync_trustlines_from_node_if_database_fails(conn_pool, conn):
+    conn.broken = True
+
+    result = get_trustlines_or_fallback(
+        currency_network_ethindex(conn_pool, NETWORK_1), lambda: 100, node_trustlines
+    )
+
+    assert result == node_trustlines()
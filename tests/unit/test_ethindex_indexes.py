@@ -0,0 +1,106 @@
+import pytest
+
+from relay.blockchain import currency_network_events, unw_eth_events
+from relay.ethindex_db import ConnectionPool
+from relay.ethindex_indexes import (
+    EventsIndex,
+    check_indexes,
+    create_indexes,
+    events_indexes,
+    get_events_indexes,
+    get_missing_indexes,
+)
+
+
+class FakeCursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, query, params=None):
+        self.conn.statements.append((query, self.conn.autocommit))
+
+    def fetchall(self):
+        return [{"name": name, "valid": valid} for name, valid in self.conn.indexes]
+
+
+class FakeConnection:
+    def __init__(self, indexes):
+        self.indexes = indexes
+        self.statements = []
+        self.autocommit = False
+        self.closed = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return 0
+
+    def rollback(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+
+def fake_pool(indexes):
+    conn = FakeConnection(indexes)
+    return ConnectionPool(connect=lambda dsn: conn), conn
+
+
+def test_events_indexes_cover_from_to_types():
+    indexes = get_events_indexes(
+        [currency_network_events.from_to_types, unw_eth_events.from_to_types]
+    )
+    assert EventsIndex("Transfer", "_from") in indexes
+    assert EventsIndex("Transfer", "src") in indexes
+    assert EventsIndex("Deposit", "dst") in indexes
+    assert len(indexes) == len(set(indexes))
+    assert set(events_indexes) >= set(indexes)
+
+
+def test_events_index_statement():
+    index = EventsIndex("Transfer", "_from")
+    assert index.name == "relay_events_transfer__from"
+    statement = index.create_statement()
+    assert "CONCURRENTLY IF NOT EXISTS relay_events_transfer__from" in statement
+    assert "(args->>'_from')" in statement
+    assert "WHERE eventName='Transfer'" in statement
+
+
+def test_missing_indexes():
+    transfer_from = EventsIndex("Transfer", "_from")
+    transfer_to = EventsIndex("Transfer", "_to")
+    deposit = EventsIndex("Deposit", "dst")
+    conn_pool, _ = fake_pool([(transfer_from.name, True), (transfer_to.name, False)])
+    assert get_missing_indexes(conn_pool, [transfer_from, transfer_to, deposit]) == [
+        transfer_to,
+        deposit,
+    ]
+
+
+def test_create_indexes_outside_of_transaction():
+    conn_pool, conn = fake_pool([])
+    create_indexes(conn_pool, [EventsIndex("Transfer", "_from")])
+    assert [autocommit for _, autocommit in conn.statements] == [True, True]
+    assert conn.statements[0][0].startswith("DROP INDEX CONCURRENTLY IF EXISTS")
+    assert not conn.autocommit
+
+
+@pytest.mark.parametrize("create", [False, True])
+def test_check_indexes(create):
+    conn_pool, conn = fake_pool([])
+    check_indexes(conn_pool, create=create)
+    num_created = len(
+        [statement for statement, _ in conn.statements if "CREATE INDEX" in statement]
+    )
+    assert num_created == (len(events_indexes) if create else 0)
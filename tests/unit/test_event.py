@@ -1,3 +1,5 @@
+import base64
+
 import pytest
 
 from relay.blockchain.currency_network_events import (
@@ -6,6 +8,13 @@ from relay.blockchain.currency_network_events import (
     TrustlineUpdateEvent,
     TrustlineUpdateEventType,
 )
+from relay.blockchain.events import (
+    BlockchainEvent,
+    EventsPage,
+    decode_event_cursor,
+    encode_event_cursor,
+    paginate_events,
+)
 
 
 @pytest.fixture()
@@ -71,3 +80,46 @@ def test_transfer_event(web3_event_transfer, test_extra_data):
     assert event.status == "pending"
     assert event.direction == "sent"
     assert event.extra_data == test_extra_data
+
+
+def blockchain_event(block_number, log_index):
+    return BlockchainEvent(
+        {
+            "blockNumber": block_number,
+            "transactionIndex": 0,
+            "logIndex": log_index,
+            "transactionHash": "0x1234",
+        },
+        10,
+        123456,
+    )
+
+
+def test_event_cursor_round_trip():
+    event = blockchain_event(5, 2)
+    assert event.key == (5, 0, 2)
+    assert decode_event_cursor(event.cursor) == (5, 0, 2)
+    assert decode_event_cursor(encode_event_cursor((1, 2, 3))) == (1, 2, 3)
+
+
+@pytest.mark.parametrize(
+    "cursor", ["", "abc", base64.urlsafe_b64encode(b"1.2").decode()]
+)
+def test_decode_invalid_event_cursor(cursor):
+    with pytest.raises(ValueError):
+        decode_event_cursor(cursor)
+
+
+def test_paginate_events():
+    pending_event = blockchain_event(None, 0)
+    events = [blockchain_event(6, 0), pending_event] + [
+        blockchain_event(5, log_index) for log_index in range(3)
+    ]
+
+    page = paginate_events(events, EventsPage(limit=3))
+    assert [event.key for event in page] == [(5, 0, 0), (5, 0, 1), (5, 0, 2)]
+    page = paginate_events(events, EventsPage(after=page[-1].key))
+    assert [event.key for event in page] == [(6, 0, 0)]
+    page = paginate_events(events, EventsPage(to_block=5))
+    assert [event.key for event in page] == [(5, 0, 0), (5, 0, 1), (5, 0, 2)]
+    assert paginate_events(events, EventsPage())[-1] is pending_event
@@ -0,0 +1,130 @@
+import psycopg2
+import pytest
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.concurrency_utils import TimeoutException
+from relay.graph_snapshot import (
+    InvalidSnapshotException,
+    load_snapshot,
+    read_snapshot,
+    write_snapshot,
+)
+from relay.network_graph.graph import CurrencyNetworkGraph
+
+A, B, C, D, E = ["0x{:040X}".format(i) for i in range(1, 6)]
+
+
+@pytest.fixture
+def trustlines():
+    return [
+        Trustline(A, B, 100, 150, 1, 2, m_time=1000, balance=-50),
+        Trustline(B, C, 2 ** 70, 0, is_frozen=True, balance=-(2 ** 69)),
+        Trustline(C, D, 0, 0, 20, 0, m_time=1500, balance=2 ** 69),
+        Trustline(D, E, 300, 350),
+    ]
+
+
+@pytest.fixture(params=[False, True])
+def graph(request, trustlines):
+    graph = CurrencyNetworkGraph(compact_graph=request.param)
+    graph.gen_network(trustlines)
+    return graph
+
+
+@pytest.fixture
+def snapshot_path(tmp_path):
+    return str(tmp_path / "network.snapshot")
+
+
+def test_read_written_snapshot(graph, trustlines, snapshot_path):
+    write_snapshot(snapshot_path, graph, 1234)
+    snapshot = read_snapshot(snapshot_path)
+    assert snapshot.block_number == 1234
+    assert sorted(snapshot.trustlines) == sorted(trustlines)
+
+
+def test_empty_snapshot(snapshot_path):
+    write_snapshot(snapshot_path, CurrencyNetworkGraph(), 0)
+    assert read_snapshot(snapshot_path) == (0, [])
+
+
+def test_snapshot_restores_graph(graph, snapshot_path):
+    write_snapshot(snapshot_path, graph, 1)
+    restored_graph = CurrencyNetworkGraph()
+    restored_graph.gen_network(read_snapshot(snapshot_path).trustlines)
+    assert restored_graph.dump() == graph.dump()
+    for user in [A, C]:
+        assert (
+            restored_graph.get_account_sum(user, timestamp=2000).balance
+            == graph.get_account_sum(user, timestamp=2000).balance
+        )
+
+
+@pytest.mark.parametrize("content", [b"", b"TLGRAPH", b"x" * 100])
+def test_invalid_snapshot(snapshot_path, content):
+    with open(snapshot_path, "wb") as f:
+        f.write(content)
+    with pytest.raises(InvalidSnapshotException):
+        read_snapshot(snapshot_path)
+
+
+def test_truncated_snapshot(graph, snapshot_path):
+    write_snapshot(snapshot_path, graph, 1)
+    with open(snapshot_path, "rb") as f:
+        content = f.read()
+    with open(snapshot_path, "wb") as f:
+        f.write(content[:-1])
+    with pytest.raises(InvalidSnapshotException):
+        read_snapshot(snapshot_path)
+
+
+def test_invalid_address(snapshot_path):
+    graph = CurrencyNetworkGraph()
+    graph.gen_network([Trustline("0x0A", "0x0B", 100, 100)])
+    with pytest.raises(ValueError):
+        write_snapshot(snapshot_path, graph, 1)
+
+
+def apply_balance(graph, event):
+    graph.update_balance(*event)
+
+
+def test_load_snapshot_applies_events_since(graph, snapshot_path):
+    write_snapshot(snapshot_path, graph, 1234)
+    from_blocks = []
+
+    def get_events_since(block_number):
+        from_blocks.append(block_number)
+        return [(A, B, 20, 2000), (D, E, -10, 2000)]
+
+    loaded_graph = CurrencyNetworkGraph()
+    assert load_snapshot(snapshot_path, loaded_graph, get_events_since, apply_balance)
+    assert from_blocks == [1234]
+    assert loaded_graph.get_balance_with_interests(A, B, 2000) == 20
+    assert loaded_graph.get_balance_with_interests(D, E, 2000) == -10
+    assert set(loaded_graph.users) == set(graph.users)
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        TimeoutException("Could not finish all jobs before the timeout"),
+        psycopg2.OperationalError("could not connect to server"),
+        ConnectionError("node not available"),
+    ],
+)
+def test_load_snapshot_without_events_since(graph, snapshot_path, error):
+    write_snapshot(snapshot_path, graph, 1234)
+
+    def get_events_since(block_number):
+        raise error
+
+    loaded_graph = CurrencyNetworkGraph()
+    assert not load_snapshot(
+        snapshot_path, loaded_graph, get_events_since, apply_balance
+    )
+    assert loaded_graph.users == []
+
+
+def test_load_missing_snapshot(snapshot_path):
+    loaded_graph = CurrencyNetworkGraph()
+    assert not load_snapshot(snapshot_path, loaded_graph, None, apply_balance)
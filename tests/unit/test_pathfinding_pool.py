@@ -0,0 +1,171 @@
+import pytest
+
+from relay.blockchain.currency_network_proxy import Trustline
+from relay.concurrency_utils import TimeoutException
+from relay.network_graph.alg import ExpansionBudgetExceededException, SearchStatistics
+from relay.network_graph.graph import CurrencyNetworkGraph, TransferPathRequest
+from relay.network_graph.payment_path import FeePayer
+from relay.pathfinding_pool import (
+    PathfindingPool,
+    PathfindingWorkerError,
+    PooledCurrencyNetworkGraph,
+    _Worker,
+)
+
+NETWORK = "0x" + "1" * 40
+A, B, C, D, E = ["0x{:040X}".format(i) for i in range(1, 6)]
+
+
+@pytest.fixture()
+def trustlines():
+    return [
+        Trustline(A, B, 100, 150),
+        Trustline(B, C, 200, 250, balance=-30),
+        Trustline(C, D, 300, 350),
+        Trustline(A, D, 10, 10),
+    ]
+
+
+@pytest.fixture()
+def pool():
+    pool = PathfindingPool(2, timeout=10)
+    yield pool
+    pool.close()
+
+
+@pytest.fixture()
+def graphs(pool, trustlines):
+    """a graph searching with the pool and the same graph searching itself"""
+    pooled_graph = PooledCurrencyNetworkGraph(
+        pool, NETWORK, capacity_imbalance_fee_divisor=100
+    )
+    graph = CurrencyNetworkGraph(capacity_imbalance_fee_divisor=100)
+    for g in (pooled_graph, graph):
+        g.gen_network(trustlines)
+    return pooled_graph, graph
+
+
+def search_paths(graph):
+    return [
+        graph.find_transfer_path_sender_pays_fees(A, D, 50),
+        graph.find_transfer_path_receiver_pays_fees(A, D, 50),
+        graph.find_maximum_capacity_path(A, D),
+        graph.close_trustline_path_triangulation(0, B, C),
+    ]
+
+
+def test_pooled_graph_finds_same_paths(graphs):
+    pooled_graph, graph = graphs
+    assert search_paths(pooled_graph) == search_paths(graph)
+
+
+def test_pooled_graph_forwards_updates(graphs):
+    pooled_graph, graph = graphs
+    for g in graphs:
+        g.update_balance(A, B, -50)
+        g.update_trustline(B, E, 100, 100)
+        g.update_trustline(D, E, 100, 100)
+        g.remove_trustline(A, D)
+    assert search_paths(pooled_graph) == search_paths(graph)
+    assert pooled_graph.find_transfer_path_sender_pays_fees(A, E, 10)[1] == [A, B, E]
+
+
+def test_pooled_graph_answers_other_queries_itself(graphs):
+    pooled_graph, graph = graphs
+    assert pooled_graph.users == graph.users
+    assert pooled_graph.get_account_sum(A).balance == graph.get_account_sum(A).balance
+
+
+def test_pool_replaces_stopped_worker(pool, graphs):
+    pooled_graph, graph = graphs
+    stopped_worker = pool.workers[0]
+    stopped_worker.process.kill()
+    stopped_worker.process.wait()
+    for _ in range(len(pool.workers) + 1):
+        assert search_paths(pooled_graph) == search_paths(graph)
+    assert stopped_worker not in pool.workers
+    assert len(pool.workers) == 2
+
+
+def kill_workers_on_query(monkeypatch, number_of_kills):
+    """let the next queries stop their worker instead of being searched"""
+    kills = []
+    send = _Worker.send
+
+    def send_or_kill(worker, message):
+        if message[0] == "query" and len(kills) < number_of_kills:
+            kills.append(worker)
+            worker.process.kill()
+        else:
+            send(worker, message)
+
+    monkeypatch.setattr(_Worker, "send", send_or_kill)
+    return kills
+
+
+def test_pool_searches_again_if_worker_stops_while_searching(pool, graphs, monkeypatch):
+    pooled_graph, graph = graphs
+    kills = kill_workers_on_query(monkeypatch, 1)
+    assert pooled_graph.find_transfer_path_sender_pays_fees(
+        A, D, 50
+    ) == graph.find_transfer_path_sender_pays_fees(A, D, 50)
+    assert len(kills) == 1
+    assert kills[0] not in pool.workers
+
+
+def test_pool_raises_if_workers_stop_while_searching(pool, graphs, monkeypatch):
+    pooled_graph, _ = graphs
+    kills = kill_workers_on_query(monkeypatch, 2)
+    with pytest.raises(PathfindingWorkerError):
+        pooled_graph.find_transfer_path_sender_pays_fees(A, D, 50)
+    assert len(kills) == 2
+
+
+def test_pool_timeout(pool, graphs):
+    pooled_graph, _ = graphs
+    with pytest.raises(TimeoutException):
+        pooled_graph.find_transfer_path_sender_pays_fees(A, D, 50, deadline=0)
+
+
+def test_pooled_graph_collects_search_statistics(pool, trustlines):
+    pooled_graph = PooledCurrencyNetworkGraph(pool, NETWORK, collect_statistics=True)
+    pooled_graph.gen_network(trustlines)
+    stats = SearchStatistics()
+    pooled_graph.find_transfer_path_sender_pays_fees(A, D, 50, stats=stats)
+    assert stats.queries == 1
+    assert stats.nodes_popped > 0
+    pooled_graph.find_maximum_capacity_path(A, D)
+    assert pooled_graph.search_statistics.queries == 2
+
+
+def test_pooled_graph_searches_batch_in_one_query(pool, graphs, monkeypatch):
+    pooled_graph, graph = graphs
+    path_requests = [
+        TransferPathRequest(A, D, 50),
+        TransferPathRequest(D, A, 20, fee_payer=FeePayer.RECEIVER),
+        TransferPathRequest(A, E, 10),
+    ]
+    queries = []
+    query = pool.query
+
+    def counting_query(address, method_name, *args, **kwargs):
+        queries.append(method_name)
+        return query(address, method_name, *args, **kwargs)
+
+    monkeypatch.setattr(pool, "query", counting_query)
+    payment_paths = pooled_graph.find_transfer_paths(
+        path_requests, timestamp=1000, timeout_per_path=5
+    )
+
+    assert queries == ["find_transfer_paths"]
+    assert payment_paths == graph.find_transfer_paths(path_requests, timestamp=1000)
+
+
+def test_pooled_batch_reports_failed_searches(pool, trustlines):
+    pooled_graph = PooledCurrencyNetworkGraph(pool, NETWORK, max_expansions=2)
+    pooled_graph.gen_network(trustlines)
+    payment_paths = pooled_graph.find_transfer_paths(
+        [TransferPathRequest(A, C, 50), TransferPathRequest(A, B, 50)], timestamp=1000
+    )
+    assert isinstance(payment_paths[0], ExpansionBudgetExceededException)
+    assert payment_paths[1].path == [A, B]